@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+import dataclasses
+import datetime
+import json
+import os
+import pathlib
+
+import numpy
+import pandas
+
+INDEX_FILE = "index.json"
+
+# timestamps are nanoseconds since the epoch, UTC
+FIELDS = {
+    "timestamp": numpy.dtype("int64"),
+    "open": numpy.dtype("float64"),
+    "high": numpy.dtype("float64"),
+    "low": numpy.dtype("float64"),
+    "close": numpy.dtype("float64"),
+    "adj_close": numpy.dtype("float64"),
+    "volume": numpy.dtype("int64"),
+}
+
+# rows reserved after a ticker's data so daily appends rarely move it
+MIN_HEADROOM = 256
+
+
+def as_epoch_ns(value: datetime.datetime | str | int) -> int:
+    """Naive values are taken as UTC"""
+    if isinstance(value, (int, numpy.integer)):
+        return int(value)
+    timestamp = pandas.Timestamp(value)
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.tz_localize("UTC")
+    return timestamp.as_unit("ns").value
+
+
+@dataclasses.dataclass
+class Slot:
+    offset: int
+    length: int
+    capacity: int
+
+
+@dataclasses.dataclass(frozen=True)
+class PriceSeries:
+    """Views into the store's memory-mapped columns, nothing is copied"""
+
+    timestamp: numpy.ndarray
+    open: numpy.ndarray
+    high: numpy.ndarray
+    low: numpy.ndarray
+    close: numpy.ndarray
+    adj_close: numpy.ndarray
+    volume: numpy.ndarray
+
+    def __len__(self) -> int:
+        return len(self.timestamp)
+
+    @property
+    def datetimes(self) -> numpy.ndarray:
+        return self.timestamp.view("datetime64[ns]")
+
+    def as_columns(self) -> dict[str, numpy.ndarray]:
+        return {field: getattr(self, field) for field in FIELDS}
+
+
+class PriceStore(object):
+    """
+    Daily prices as one memory-mapped file per field, each ticker's rows kept
+    contiguous and sorted by timestamp so `get_series` can return slices of
+    the mapping.
+
+    Every ticker owns a slot with some headroom past its rows; appends are
+    written in place and a ticker only moves to the end of the files once its
+    slot is full. The space it leaves behind is reclaimed by `compact`.
+    Changes are visible to readers opening the store after `flush`.
+    """
+
+    def __init__(self, directory: str | os.PathLike, writable: bool = False) -> None:
+        self.directory = pathlib.Path(directory)
+        self.writable = writable
+        index_path = self.directory / INDEX_FILE
+        if writable and not index_path.exists():
+            self.directory.mkdir(parents=True, exist_ok=True)
+            index = {"size": 0, "end": 0, "codes": {}}
+        else:
+            index = json.loads(index_path.read_text())
+        # allocated rows, and rows up to the end of the last slot
+        self.size = index["size"]
+        self.end = index["end"]
+        self.slots = {code: Slot(*slot) for code, slot in index["codes"].items()}
+        self.columns = self._map()
+
+    def _path(self, field: str) -> pathlib.Path:
+        return self.directory / f"{field}.bin"
+
+    def _map(self) -> dict[str, numpy.ndarray]:
+        if not self.size:
+            return self.empty_columns()
+        return {
+            field: numpy.memmap(
+                self._path(field),
+                dtype=dtype,
+                mode="r+" if self.writable else "r",
+                shape=(self.size,),
+            )
+            for field, dtype in FIELDS.items()
+        }
+
+    @staticmethod
+    def empty_columns() -> dict[str, numpy.ndarray]:
+        return {field: numpy.empty(0, dtype) for field, dtype in FIELDS.items()}
+
+    @property
+    def codes(self) -> list[str]:
+        return sorted(self.slots)
+
+    def __contains__(self, code: str) -> bool:
+        return code in self.slots
+
+    def latest(self, code: str) -> datetime.datetime | None:
+        slot = self.slots.get(code)
+        if slot is None or not slot.length:
+            return None
+        last = self.columns["timestamp"][slot.offset + slot.length - 1]
+        return pandas.Timestamp(int(last), tz="UTC").to_pydatetime()
+
+    def get_series(
+        self,
+        code: str,
+        start: datetime.datetime | str | None = None,
+        end: datetime.datetime | str | None = None,
+    ) -> PriceSeries:
+        """Prices of `code` from `start` up to, but excluding, `end`"""
+        slot = self.slots[code]
+        timestamps = self.columns["timestamp"][slot.offset : slot.offset + slot.length]
+        low = 0 if start is None else timestamps.searchsorted(as_epoch_ns(start))
+        high = slot.length if end is None else timestamps.searchsorted(as_epoch_ns(end))
+        return PriceSeries(
+            **{
+                field: column[slot.offset + low : slot.offset + high]
+                for field, column in self.columns.items()
+            }
+        )
+
+    def _grow(self, rows: int) -> None:
+        size = max(rows, 2 * self.size, 1024)
+        for field, dtype in FIELDS.items():
+            if self.size:
+                self.columns[field].flush()
+            with open(self._path(field), "ab") as file:
+                file.truncate(size * dtype.itemsize)
+        self.size = size
+        self.columns = self._map()
+
+    def _allocate(self, rows: int) -> Slot:
+        capacity = rows + max(rows // 2, MIN_HEADROOM)
+        if self.end + capacity > self.size:
+            self._grow(self.end + capacity)
+        slot = Slot(self.end, 0, capacity)
+        self.end += capacity
+        return slot
+
+    def append(
+        self,
+        code: str,
+        columns: dict[str, numpy.ndarray],
+        replace_from: datetime.datetime | None = None,
+    ) -> None:
+        """
+        Add rows sorted by timestamp to `code`. Stored rows from `replace_from`,
+        or else from the first new row, onwards are replaced.
+        """
+        if not self.writable:
+            raise PermissionError(f"{self.directory} is opened read only")
+        new_rows = len(columns["timestamp"])
+        if replace_from is not None:
+            cut = as_epoch_ns(replace_from)
+        elif new_rows:
+            cut = int(columns["timestamp"][0])
+        else:
+            return None
+
+        slot = self.slots.get(code)
+        if slot is None and not new_rows:
+            return None
+        kept = 0
+        if slot is not None:
+            timestamps = self.columns["timestamp"][
+                slot.offset : slot.offset + slot.length
+            ]
+            kept = int(timestamps.searchsorted(cut))
+        if slot is None or kept + new_rows > slot.capacity:
+            moved = self._allocate(kept + new_rows)
+            if slot is not None:
+                for column in self.columns.values():
+                    column[moved.offset : moved.offset + kept] = column[
+                        slot.offset : slot.offset + kept
+                    ]
+            slot = moved
+
+        start = slot.offset + kept
+        for field, column in self.columns.items():
+            column[start : start + new_rows] = columns[field]
+        slot.length = kept + new_rows
+        self.slots[code] = slot
+
+    def flush(self) -> None:
+        for column in self.columns.values():
+            if isinstance(column, numpy.memmap):
+                column.flush()
+        index = {
+            "size": self.size,
+            "end": self.end,
+            "codes": {
+                code: dataclasses.astuple(slot) for code, slot in self.slots.items()
+            },
+        }
+        temp_path = self.directory / f"{INDEX_FILE}.tmp"
+        temp_path.write_text(json.dumps(index))
+        os.replace(temp_path, self.directory / INDEX_FILE)
+
+    def compact(self) -> None:
+        """Rewrite the files without the space left behind by moved tickers"""
+        compacted = PriceStore(self.directory / "compact", writable=True)
+        for code in self.codes:
+            series = self.get_series(code)
+            compacted.append(code, series.as_columns())
+        compacted.flush()
+        for field in FIELDS:
+            if compacted.size:
+                os.replace(compacted._path(field), self._path(field))
+            else:
+                self._path(field).unlink(missing_ok=True)
+        os.replace(compacted.directory / INDEX_FILE, self.directory / INDEX_FILE)
+        compacted.directory.rmdir()
+        self.__init__(self.directory, writable=self.writable)
@@ -4,6 +4,7 @@ import enum
 import functools
 import sys
 
+import numpy
 import pydantic
 
 BigInt = sys.maxsize
@@ -38,7 +39,10 @@ class StepCharge:
     def cost(self, value: float) -> float:
         if not self.contains(value):
             return 0
+        return self.charge(value)
 
+    def charge(self, value: float) -> float:
+        """Cost of `value`, assuming it is within the step"""
         match self.rate_type:
             case RateType.Fixed:
                 return self.rate
@@ -64,4 +68,40 @@ class CostSchema(pydantic.BaseModel):
     def total(self, value: float) -> float:
         for step in self.steps:
             if step.contains(value):
-                return step.cost(value)
+                return step.charge(value)
+
+    @functools.cached_property
+    def brackets(self) -> tuple[numpy.ndarray, ...]:
+        """Lower and upper bounds, rates and whether relative, sorted by bounds"""
+        steps = sorted(self.steps)
+        return (
+            numpy.array([step.lower for step in steps], dtype="float64"),
+            numpy.array([step.true_upper for step in steps], dtype="float64"),
+            numpy.array([step.rate for step in steps], dtype="float64"),
+            numpy.array([step.rate_type == RateType.Relative for step in steps]),
+        )
+
+    def total_many(self, values: numpy.ndarray) -> numpy.ndarray:
+        """Vectorised `total`, values not within any step cost NaN"""
+        values = numpy.asarray(values, dtype="float64")
+        lowers, uppers, rates, relative = self.brackets
+        # first step whose upper bound is >= value
+        index = numpy.minimum(uppers.searchsorted(values), len(uppers) - 1)
+        within = (lowers[index] < values) & (values <= uppers[index])
+        costs = numpy.where(
+            relative[index], round_cents(values * rates[index]), rates[index]
+        )
+        return numpy.where(within, costs, numpy.nan)
+
+
+def round_cents(values: numpy.ndarray) -> numpy.ndarray:
+    """
+    `round(value, 2)` over an array. numpy rounds the scaled binary value, so
+    near half a cent it can disagree with `round`, which rounds the exact
+    decimal value; those few are rounded by `round` itself.
+    """
+    scaled = values * 100
+    rounded = numpy.rint(scaled) / 100
+    ties = numpy.flatnonzero(numpy.abs(scaled - numpy.floor(scaled) - 0.5) < 1e-6)
+    rounded.flat[ties] = [round(value, 2) for value in values.flat[ties]]
+    return rounded
@@ -1,15 +1,168 @@
 import abc
+import dataclasses
+import io
+import itertools
+import struct
+from typing import Iterable, Iterator
 
+import numpy
 import pandas as pd
 from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Model
 from sqlalchemy import create_engine
 
 
+@dataclasses.dataclass
+class LoadCounts:
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    deleted: int = 0
+
+    def __add__(self, other: "LoadCounts") -> "LoadCounts":
+        return LoadCounts(
+            **{
+                field.name: getattr(self, field.name) + getattr(other, field.name)
+                for field in dataclasses.fields(self)
+            }
+        )
+
+
+# rows written per statement by the ORM loaders
+ORM_BATCH_ROWS = 10000
+
+
+def iter_model_batches(
+    django_model: type[Model], dfs: Iterable[pd.DataFrame], batch_size: int
+) -> Iterator[list[Model]]:
+    """
+    The rows of `dfs` as model instances, `batch_size` at a time across
+    frames, so that many small frames still make few statements.
+    """
+    batch = []
+    for df in dfs:
+        for start in range(0, len(df), batch_size):
+            batch.extend(
+                django_model(**record)
+                for record in df.iloc[start : start + batch_size].to_dict(
+                    orient="records"
+                )
+            )
+            while len(batch) >= batch_size:
+                yield batch[:batch_size]
+                batch = batch[batch_size:]
+    if batch:
+        yield batch
+
+
+def bulk_create_frames(
+    django_model: type[Model],
+    dfs: Iterable[pd.DataFrame],
+    batch_size: int = ORM_BATCH_ROWS,
+) -> int:
+    """
+    `bulk_create` the rows of `dfs`, building at most `batch_size` model
+    instances at a time.
+    """
+    rows = 0
+    for pending_records in iter_model_batches(django_model, dfs, batch_size):
+        django_model.objects.bulk_create(pending_records)
+        rows += len(pending_records)
+    return rows
+
+
+def bulk_upsert_frames(
+    django_model: type[Model],
+    dfs: Iterable[pd.DataFrame],
+    unique_fields: Iterable[str],
+    batch_size: int = ORM_BATCH_ROWS,
+) -> LoadCounts:
+    """
+    Upsert the rows of `dfs` with the ORM, `batch_size` rows at a time. The
+    stored rows sharing their `unique_fields` are read first, so that only
+    new and changed rows are written, with `bulk_create(update_conflicts)`.
+    """
+    unique_fields = list(unique_fields)
+    meta = django_model._meta
+    key_fields = [meta.get_field(field) for field in unique_fields]
+    value_fields = [
+        field
+        for field in meta.concrete_fields
+        if not field.primary_key and field not in key_fields
+    ]
+    connection = connections[django_model.objects.db]
+
+    def prepared(instance: Model, fields: list) -> tuple:
+        # compare values as they would be saved, e.g. decimals once rounded
+        return tuple(
+            field.get_db_prep_save(getattr(instance, field.attname), connection)
+            for field in fields
+        )
+
+    counts = LoadCounts()
+    for records in iter_model_batches(django_model, dfs, batch_size):
+        # a superset of the stored rows sharing a key with the batch
+        stored = {
+            prepared(instance, key_fields): prepared(instance, value_fields)
+            for instance in django_model.objects.filter(
+                **{
+                    f"{field.attname}__in": {
+                        getattr(record, field.attname) for record in records
+                    }
+                    for field in key_fields
+                }
+            ).only(*(field.attname for field in key_fields + value_fields))
+        }
+        pending = []
+        for record in records:
+            values = stored.get(prepared(record, key_fields))
+            if values is None:
+                counts.inserted += 1
+            elif values != prepared(record, value_fields):
+                counts.updated += 1
+            else:
+                counts.unchanged += 1
+                continue
+            pending.append(record)
+        if pending:
+            django_model.objects.bulk_create(
+                pending,
+                update_conflicts=True,
+                unique_fields=unique_fields,
+                update_fields=[field.name for field in value_fields],
+            )
+    return counts
+
+
 class Adaptor(abc.ABC):
     @abc.abstractmethod
     def export(self, table_name: str, df: pd.DataFrame) -> None:
         ...
 
+    def export_model(
+        self, django_model: type[Model], dfs: Iterable[pd.DataFrame]
+    ) -> int:
+        """
+        Persist normalised price frames into the table backing `django_model`.
+        Defaults to the ORM's bulk_create, adaptors may override it with a
+        faster path. Returns the number of rows inserted.
+        """
+        return bulk_create_frames(django_model, dfs)
+
+    def upsert_model(
+        self,
+        django_model: type[Model],
+        dfs: Iterable[pd.DataFrame],
+        unique_fields: Iterable[str],
+    ) -> LoadCounts:
+        """
+        Insert new rows and update rows whose values changed, matching existing
+        rows on `unique_fields`. Defaults to the ORM, adaptors may override it
+        with a faster path.
+        """
+        return bulk_upsert_frames(django_model, dfs, unique_fields)
+
 
 class PostGresDjangoAdaptor(Adaptor):
     @classmethod
@@ -43,3 +196,335 @@ class PostGresDjangoAdaptor(Adaptor):
 
     def export(self, table_name: str, df: pd.DataFrame) -> None:
         df.to_sql(table_name, self.engine, if_exists="append", index=False)
+
+
+PG_EPOCH = pd.Timestamp("2000-01-01", tz="UTC")
+COPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+COPY_TRAILER = struct.pack(">h", -1)
+
+
+def binary_column(series: pd.Series) -> tuple[str, numpy.ndarray]:
+    """
+    Postgres type of `series` and its values in COPY binary (big-endian)
+    representation. Strings are returned as a fixed-width bytes array.
+    """
+    if isinstance(series.dtype, pd.DatetimeTZDtype):
+        micros = (series - PG_EPOCH) // pd.Timedelta(microseconds=1)
+        return "timestamptz", micros.to_numpy(">i8")
+    if series.dtype.kind == "M":
+        micros = (series - PG_EPOCH.tz_localize(None)) // pd.Timedelta(microseconds=1)
+        return "timestamp", micros.to_numpy(">i8")
+    if series.dtype.kind == "f":
+        return "float8", series.to_numpy(">f8")
+    if series.dtype.kind in "iu":
+        return "int8", series.to_numpy(">i8")
+    if series.dtype.kind == "b":
+        return "bool", series.to_numpy("?")
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # encode each category once
+        categories = numpy.char.encode(series.cat.categories.to_numpy(str), "utf-8")
+        return "text", categories[series.cat.codes.to_numpy()]
+    return "text", numpy.char.encode(series.to_numpy(str), "utf-8")
+
+
+def binary_rows(df: pd.DataFrame) -> bytes:
+    """
+    Encode `df` as COPY binary tuples (without header/trailer). Rows are
+    grouped by the byte length of their text values so each group can be laid
+    out as one fixed-width structured array.
+    """
+    values = [binary_column(df[column])[1] for column in df.columns]
+    text_lengths = [
+        numpy.char.str_len(column) for column in values if column.dtype.kind == "S"
+    ]
+    if text_lengths:
+        keys = numpy.stack(text_lengths, axis=1)
+        group_keys, groups = numpy.unique(keys, axis=0, return_inverse=True)
+        groups = groups.reshape(-1)
+    else:
+        group_keys, groups = numpy.empty((1, 0), dtype=int), None
+
+    chunks = []
+    for group, lengths in enumerate(group_keys):
+        mask = slice(None) if groups is None else groups == group
+        lengths = iter(lengths)
+        dtype = [("count", ">i2")]
+        widths = []
+        for i, column in enumerate(values):
+            if column.dtype.kind == "S":
+                width = int(next(lengths))
+                column_dtype = f"S{width}" if width else "V0"
+            else:
+                width = column.dtype.itemsize
+                column_dtype = column.dtype
+            widths.append(width)
+            dtype += [(f"length_{i}", ">i4"), (f"value_{i}", column_dtype)]
+        group_values = [column[mask] for column in values]
+        rows = numpy.empty(len(group_values[0]), dtype=dtype)
+        rows["count"] = len(values)
+        for i, (width, column) in enumerate(zip(widths, group_values)):
+            rows[f"length_{i}"] = width
+            if width:
+                rows[f"value_{i}"] = column
+        chunks.append(rows.tobytes())
+    return b"".join(chunks)
+
+
+class _BinaryFrameStream(io.RawIOBase):
+    """
+    File-like object rendering a stream of frames in COPY binary format on
+    demand, so `COPY ... FROM STDIN` consumes them without the whole payload
+    ever being materialised in memory.
+    """
+
+    def __init__(self, dfs: Iterable[pd.DataFrame]) -> None:
+        self._chunks = self._render(dfs)
+        self._buffer = b""
+        self._offset = 0
+        self.rows = 0
+
+    def _render(self, dfs: Iterable[pd.DataFrame]) -> Iterator[bytes]:
+        yield COPY_HEADER
+        for df in dfs:
+            if df.empty:
+                continue
+            self.rows += len(df)
+            yield binary_rows(df)
+        yield COPY_TRAILER
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        while size < 0 or len(self._buffer) - self._offset < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer = self._buffer[self._offset :] + chunk
+            self._offset = 0
+        end = (
+            len(self._buffer)
+            if size < 0
+            else min(self._offset + size, len(self._buffer))
+        )
+        data = self._buffer[self._offset : end]
+        self._offset = end
+        return data
+
+
+class PostGresCopyAdaptor(Adaptor):
+    """
+    Loads frames with binary `COPY ... FROM STDIN` into a temporary staging
+    table and moves them into the target table with a single
+    `INSERT ... SELECT`, letting postgres cast staging types (float8, int8)
+    into the target's column types.
+
+    Runs on Django's own connection, so the load joins any transaction the
+    caller has open (e.g. the delete in `update_prices`).
+    """
+
+    copy_buffer_size = 1 << 20
+    # rows upserted per transaction, so a refresh never holds one transaction
+    # for the whole universe
+    upsert_chunk_rows = 500_000
+
+    @classmethod
+    def from_django_settings(cls, using: str = "default") -> "PostGresCopyAdaptor":
+        return cls(using=using)
+
+    def __init__(self, using: str = "default") -> None:
+        self.using = using
+
+    @staticmethod
+    def _staging_table_name(table_name: str) -> str:
+        return f"_staging_{table_name}"
+
+    def copy_into_staging(
+        self, cursor, table_name: str, dfs: Iterable[pd.DataFrame]
+    ) -> tuple[str, dict[str, str], int]:
+        """
+        COPY `dfs` into a fresh temporary table, typed after the first
+        non-empty frame. Returns the staging table, its column types and the
+        number of rows copied.
+        """
+        dfs = iter(dfs)
+        first = next((df for df in dfs if not df.empty), None)
+        if first is None:
+            return "", {}, 0
+        column_types = {
+            column: binary_column(first[column].iloc[:1])[0] for column in first.columns
+        }
+        staging_table = self._staging_table_name(table_name)
+        column_definitions = ", ".join(
+            f'"{column}" {pg_type}' for column, pg_type in column_types.items()
+        )
+        cursor.execute(f'DROP TABLE IF EXISTS "{staging_table}"')
+        cursor.execute(
+            f'CREATE TEMPORARY TABLE "{staging_table}" ({column_definitions}) '
+            "ON COMMIT DROP"
+        )
+        stream = _BinaryFrameStream(itertools.chain([first], dfs))
+        cursor.copy_expert(
+            f'COPY "{staging_table}" FROM STDIN WITH (FORMAT binary)',
+            stream,
+            self.copy_buffer_size,
+        )
+        return staging_table, column_types, stream.rows
+
+    @staticmethod
+    def staging_select_list(column_types: dict[str, str]) -> str:
+        # float columns carry missing values as NaN, which postgres would keep
+        # as a NaN numeric instead of NULL
+        return ", ".join(
+            f"NULLIF(\"{column}\", 'NaN')" if pg_type == "float8" else f'"{column}"'
+            for column, pg_type in column_types.items()
+        )
+
+    def copy_frames(self, table_name: str, dfs: Iterable[pd.DataFrame]) -> int:
+        with transaction.atomic(using=self.using):
+            with connections[self.using].cursor() as cursor:
+                staging_table, column_types, rows = self.copy_into_staging(
+                    cursor, table_name, dfs
+                )
+                if not rows:
+                    return 0
+                column_list = ", ".join(f'"{column}"' for column in column_types)
+                cursor.execute(
+                    f'INSERT INTO "{table_name}" ({column_list}) '
+                    f"SELECT {self.staging_select_list(column_types)} "
+                    f'FROM "{staging_table}"'
+                )
+                cursor.execute(f'DROP TABLE "{staging_table}"')
+        return rows
+
+    def upsert_frames(
+        self,
+        table_name: str,
+        dfs: Iterable[pd.DataFrame],
+        conflict_columns: Iterable[str],
+    ) -> LoadCounts:
+        """
+        `INSERT ... ON CONFLICT DO UPDATE` the staged rows, only touching rows
+        whose values differ from the stored ones.
+        """
+        conflict_columns = list(conflict_columns)
+        with transaction.atomic(using=self.using):
+            with connections[self.using].cursor() as cursor:
+                staging_table, column_types, rows = self.copy_into_staging(
+                    cursor, table_name, dfs
+                )
+                if not rows:
+                    return LoadCounts()
+                conflict_list = ", ".join(f'"{column}"' for column in conflict_columns)
+                column_list = ", ".join(f'"{column}"' for column in column_types)
+                update_columns = [
+                    column for column in column_types if column not in conflict_columns
+                ]
+                assignments = ", ".join(
+                    f'"{column}" = EXCLUDED."{column}"' for column in update_columns
+                )
+                stored = ", ".join(f'target."{column}"' for column in update_columns)
+                excluded = ", ".join(
+                    f'EXCLUDED."{column}"' for column in update_columns
+                )
+                upsert = (
+                    f'INSERT INTO "{table_name}" AS target ({column_list}) '
+                    f"SELECT * FROM source "
+                    f"ON CONFLICT ({conflict_list}) DO UPDATE SET {assignments} "
+                    f"WHERE ({stored}) IS DISTINCT FROM ({excluded}) "
+                )
+                source = (
+                    f"SELECT DISTINCT ON ({conflict_list}) "
+                    f"{self.staging_select_list(column_types)} "
+                    f'FROM "{staging_table}"'
+                )
+                if self.is_partitioned(cursor, table_name):
+                    # xmax can't be returned from a partitioned table, count
+                    # the conflicting rows beforehand instead
+                    cursor.execute(
+                        f"WITH source AS ({source}), "
+                        f"existing AS (SELECT count(*) AS rows FROM source "
+                        f'JOIN "{table_name}" USING ({conflict_list})), '
+                        f"upserted AS ({upsert} RETURNING 1) "
+                        f"SELECT (SELECT count(*) FROM source), "
+                        f"(SELECT count(*) FROM source) - (SELECT rows FROM existing), "
+                        f"count(*) - (SELECT count(*) FROM source) "
+                        f"+ (SELECT rows FROM existing) "
+                        f"FROM upserted"
+                    )
+                else:
+                    cursor.execute(
+                        f"WITH source AS ({source}), "
+                        f"upserted AS ({upsert} RETURNING (xmax = 0) AS inserted) "
+                        f"SELECT "
+                        f"  (SELECT count(*) FROM source), "
+                        f"  count(*) FILTER (WHERE inserted), "
+                        f"  count(*) FILTER (WHERE NOT inserted) "
+                        f"FROM upserted"
+                    )
+                total, inserted, updated = cursor.fetchone()
+                cursor.execute(f'DROP TABLE "{staging_table}"')
+        return LoadCounts(
+            inserted=inserted, updated=updated, unchanged=total - inserted - updated
+        )
+
+    @staticmethod
+    def is_partitioned(cursor, table_name: str) -> bool:
+        cursor.execute(
+            "SELECT relkind = 'p' FROM pg_class WHERE oid = %s::regclass",
+            [f'"{table_name}"'],
+        )
+        return cursor.fetchone()[0]
+
+    def export(self, table_name: str, df: pd.DataFrame) -> None:
+        self.copy_frames(table_name, [df])
+
+    @staticmethod
+    def model_columns(django_model: type[Model], df: pd.DataFrame) -> pd.DataFrame:
+        """Rename frame columns from model field names to db column names"""
+        return df.rename(
+            columns={
+                column: django_model._meta.get_field(column).column
+                for column in df.columns
+            }
+        )
+
+    def export_model(
+        self, django_model: type[Model], dfs: Iterable[pd.DataFrame]
+    ) -> int:
+        return self.copy_frames(
+            django_model._meta.db_table,
+            (self.model_columns(django_model, df) for df in dfs),
+        )
+
+    def upsert_model(
+        self,
+        django_model: type[Model],
+        dfs: Iterable[pd.DataFrame],
+        unique_fields: Iterable[str],
+    ) -> LoadCounts:
+        conflict_columns = [
+            django_model._meta.get_field(field).column for field in unique_fields
+        ]
+        counts = LoadCounts()
+        for chunk in chunk_frames(dfs, self.upsert_chunk_rows):
+            counts += self.upsert_frames(
+                django_model._meta.db_table,
+                (self.model_columns(django_model, df) for df in chunk),
+                conflict_columns,
+            )
+        return counts
+
+
+def chunk_frames(
+    dfs: Iterable[pd.DataFrame], max_rows: int
+) -> Iterator[list[pd.DataFrame]]:
+    chunk, rows = [], 0
+    for df in dfs:
+        chunk.append(df)
+        rows += len(df)
+        if rows >= max_rows:
+            yield chunk
+            chunk, rows = [], 0
+    if chunk:
+        yield chunk
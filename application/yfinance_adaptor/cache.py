@@ -0,0 +1,266 @@
+from __future__ import annotations
+
+import dataclasses
+import datetime
+import hashlib
+import json
+import os
+import pathlib
+from typing import Callable
+
+import pandas
+
+INDUSTRY_TIMEZONE = "Australia/Melbourne"
+# cached bars within this window before the last one are refetched, in case
+# they were revised
+REVISION_WINDOW = datetime.timedelta(days=7)
+
+# fetch(tickers, start) -> wide yfinance frame
+Fetcher = Callable[[list[str], pandas.Timestamp], pandas.DataFrame]
+
+
+class CacheMiss(Exception):
+    """Raised in replay only mode when a download is not fully cached"""
+
+
+def as_cache_timestamp(value: str | datetime.datetime) -> pandas.Timestamp:
+    """Cached frames are indexed by naive exchange-local timestamps"""
+    timestamp = pandas.Timestamp(value)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.tz_convert(INDUSTRY_TIMEZONE).tz_localize(None)
+    return timestamp
+
+
+def complete_bars_end(
+    interval: str, now: datetime.datetime | None = None
+) -> pandas.Timestamp:
+    """
+    The end of the last complete bar of `interval` as of `now`, as a cache
+    timestamp. Bars still in progress are not cached.
+    """
+    now = as_cache_timestamp(now or datetime.datetime.now(datetime.timezone.utc))
+    if interval.endswith("m"):
+        return now.floor(f"{interval[:-1]}min")
+    if interval.endswith("h"):
+        return now.floor(interval)
+    return now.floor("D")
+
+
+def split_by_ticker(
+    df: pandas.DataFrame, tickers: list[str]
+) -> dict[str, pandas.DataFrame]:
+    """Split a wide yfinance frame into one frame of plain field columns per ticker"""
+    if not isinstance(df.columns, pandas.MultiIndex):
+        return {tickers[0]: df.dropna(how="all")}
+    frames = {}
+    for ticker in dict.fromkeys(df.columns.get_level_values(1)):
+        frames[ticker] = df.xs(ticker, axis=1, level=1).dropna(how="all")
+    return frames
+
+
+def join_tickers(frames: dict[str, pandas.DataFrame]) -> pandas.DataFrame:
+    """Inverse of `split_by_ticker`: `(field, ticker)` columns, union of dates"""
+    if not frames:
+        return pandas.DataFrame()
+    fields = list(
+        dict.fromkeys(field for df in frames.values() for field in df.columns)
+    )
+    joined = pandas.concat(frames, axis=1).swaplevel(axis=1)
+    return joined.reindex(
+        columns=pandas.MultiIndex.from_product([fields, list(frames)])
+    )
+
+
+@dataclasses.dataclass
+class CacheEntry:
+    ticker: str
+    start: pandas.Timestamp
+    end: pandas.Timestamp
+    fetched_at: datetime.datetime
+
+    def serialize(self) -> dict:
+        return {
+            "ticker": self.ticker,
+            "start": self.start.isoformat(),
+            "end": self.end.isoformat(),
+            "fetched_at": self.fetched_at.isoformat(),
+        }
+
+    @classmethod
+    def deserialize(cls, data: dict) -> "CacheEntry":
+        return cls(
+            ticker=data["ticker"],
+            start=pandas.Timestamp(data["start"]),
+            end=pandas.Timestamp(data["end"]),
+            fetched_at=datetime.datetime.fromisoformat(data["fetched_at"]),
+        )
+
+
+class DownloadCache(object):
+    """
+    On-disk cache of yfinance downloads, one Parquet file per ticker and
+    download options (interval, adjustments, ...), named by the hash of those.
+
+    A request whose range is covered by the cached one is served from disk.
+    Requests without an end run up to the last complete bar, so repeating
+    one within the same bar is a hit. If only a prefix is cached, the tail
+    from the last cached bar is downloaded and merged in, along with the
+    cached bars of the requested range within `revision_window` before it,
+    e.g. the revision window `update_prices` asks for again. Entries older
+    than `ttl` are evicted, as are the least recently used ones once the
+    cache grows past `max_bytes`. In `replay_only` mode nothing is
+    downloaded and uncovered requests raise `CacheMiss`.
+    """
+
+    def __init__(
+        self,
+        directory: str | os.PathLike,
+        ttl: datetime.timedelta | None = None,
+        max_bytes: int | None = None,
+        replay_only: bool = False,
+        revision_window: datetime.timedelta = REVISION_WINDOW,
+    ) -> None:
+        self.directory = pathlib.Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.replay_only = replay_only
+        self.revision_window = revision_window
+
+    @staticmethod
+    def key(ticker: str, options: dict) -> str:
+        content = json.dumps({"ticker": ticker, **options}, sort_keys=True)
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    def _paths(self, key: str) -> tuple[pathlib.Path, pathlib.Path]:
+        return self.directory / f"{key}.parquet", self.directory / f"{key}.json"
+
+    def _is_expired(self, entry: CacheEntry) -> bool:
+        return self.ttl is not None and (
+            datetime.datetime.now() - entry.fetched_at > self.ttl
+        )
+
+    def load(self, key: str) -> tuple[CacheEntry, pandas.DataFrame] | None:
+        data_path, meta_path = self._paths(key)
+        if not (data_path.exists() and meta_path.exists()):
+            return None
+        entry = CacheEntry.deserialize(json.loads(meta_path.read_text()))
+        if self._is_expired(entry):
+            self._remove(key)
+            return None
+        # mark as recently used for size based eviction
+        os.utime(meta_path)
+        return entry, pandas.read_parquet(data_path)
+
+    def store(self, key: str, entry: CacheEntry, df: pandas.DataFrame) -> None:
+        data_path, meta_path = self._paths(key)
+        df.to_parquet(data_path)
+        meta_path.write_text(json.dumps(entry.serialize()))
+
+    def _remove(self, key: str) -> None:
+        for path in self._paths(key):
+            path.unlink(missing_ok=True)
+
+    def evict(self) -> None:
+        entries = []
+        for meta_path in self.directory.glob("*.json"):
+            key = meta_path.stem
+            entry = CacheEntry.deserialize(json.loads(meta_path.read_text()))
+            if self._is_expired(entry):
+                self._remove(key)
+                continue
+            size = sum(
+                path.stat().st_size for path in self._paths(key) if path.exists()
+            )
+            entries.append((meta_path.stat().st_mtime, key, size))
+
+        if self.max_bytes is None:
+            return None
+        total = sum(size for _, _, size in entries)
+        for _, key, size in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._remove(key)
+            total -= size
+
+    @staticmethod
+    def cache_options(spec) -> dict:
+        """Download options that change the data of a ticker"""
+        options = spec.serialize()
+        return {
+            name: options[name]
+            for name in (
+                "interval",
+                "actions",
+                "auto_adjust",
+                "back_adjust",
+                "repair",
+                "prepost",
+                "rounding",
+                "keepna",
+            )
+        }
+
+    def download(self, tickers: list[str], spec, fetch: Fetcher) -> pandas.DataFrame:
+        """
+        Serve `tickers` for the `spec` range, fetching only what is not cached.
+        """
+        options = self.cache_options(spec)
+        start = as_cache_timestamp(spec.start)
+        end = (
+            as_cache_timestamp(spec.end)
+            if spec.end
+            else complete_bars_end(spec.interval.value)
+        )
+
+        frames = {}
+        cached = {}
+        # tickers to download grouped by where their download starts
+        pending: dict[pandas.Timestamp, list[str]] = {}
+        for ticker in tickers:
+            key = self.key(ticker, options)
+            hit = self.load(key)
+            if hit is not None and hit[0].start <= start:
+                entry, df = hit
+                if entry.end >= end:
+                    frames[ticker] = df[(df.index >= start) & (df.index < end)]
+                    continue
+                cached[ticker] = (entry, df)
+                # the last cached bar may have been incomplete, and the bars
+                # requested before it revised, fetch them again
+                last_cached = df.index.max() if len(df) else entry.end
+                fetch_start = min(
+                    last_cached, max(start, last_cached - self.revision_window)
+                )
+                pending.setdefault(fetch_start, []).append(ticker)
+            else:
+                pending.setdefault(start, []).append(ticker)
+
+        if pending and self.replay_only:
+            missing = sorted(ticker for batch in pending.values() for ticker in batch)
+            raise CacheMiss(f"Not cached for {start} -> {end}: {missing}")
+
+        fetched_at = datetime.datetime.now()
+        for fetch_start, batch in pending.items():
+            fetched = split_by_ticker(fetch(batch, fetch_start), batch)
+            for ticker in batch:
+                fresh = fetched.get(
+                    ticker, pandas.DataFrame(index=pandas.DatetimeIndex([]))
+                )
+                fresh = fresh[fresh.index < end]
+                if ticker in cached:
+                    entry, df = cached[ticker]
+                    merged = pandas.concat([df[df.index < fetch_start], fresh])
+                    entry_start = entry.start
+                else:
+                    merged, entry_start = fresh, start
+                self.store(
+                    self.key(ticker, options),
+                    CacheEntry(ticker, entry_start, end, fetched_at),
+                    merged,
+                )
+                frames[ticker] = merged[merged.index >= start]
+
+        if pending:
+            self.evict()
+        return join_tickers({ticker: frames[ticker] for ticker in tickers})
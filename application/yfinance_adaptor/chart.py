@@ -0,0 +1,299 @@
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+import datetime
+import json
+import random
+import threading
+
+import aiohttp
+import numpy
+import pandas
+
+from . import cache as cache_
+
+CHART_URL = "https://query2.finance.yahoo.com/v8/finance/chart/{ticker}"
+
+# chart response indicator -> yfinance column
+QUOTE_FIELDS = {
+    "open": "Open",
+    "high": "High",
+    "low": "Low",
+    "close": "Close",
+    "volume": "Volume",
+}
+FIELDS = ["Adj Close", "Close", "High", "Low", "Open", "Volume"]
+# the corporate action columns of yf.download with `actions=True`
+ACTION_FIELDS = ["Dividends", "Stock Splits"]
+# bars of these intervals are dated at exchange-local midnight, like yfinance
+DAILY_INTERVALS = {"1d", "5d", "1wk", "1mo", "3mo"}
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class ChartError(Exception):
+    """Raised for a ticker the chart endpoint has no data for"""
+
+
+@dataclasses.dataclass
+class ChartResult:
+    # `(field, ticker)` columns by naive exchange-local dates, like yf.download
+    frame: pandas.DataFrame
+    # ticker -> why it has no data
+    errors: dict[str, str] = dataclasses.field(default_factory=dict)
+    # response bodies received, retries included
+    bytes_downloaded: int = 0
+
+
+def as_epoch_seconds(value: str | datetime.datetime) -> int:
+    timestamp = pandas.Timestamp(value)
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.tz_localize("UTC")
+    return int(timestamp.timestamp())
+
+
+def _event_values(
+    events: dict, index: pandas.DatetimeIndex, timezone: str, interval: str, value
+) -> numpy.ndarray:
+    """Values of chart `events` aligned on the bars of `index`, 0 elsewhere"""
+    values = numpy.zeros(len(index))
+    if not events:
+        return values
+    dates = pandas.to_datetime(
+        [int(event["date"]) for event in events.values()], unit="s", utc=True
+    ).tz_convert(timezone)
+    if interval in DAILY_INTERVALS:
+        dates = dates.normalize()
+    positions = index.get_indexer(dates.tz_localize(None))
+    found = positions >= 0
+    values[positions[found]] = numpy.array(
+        [value(event) for event in events.values()], dtype="float64"
+    )[found]
+    return values
+
+
+def parse_chart(
+    payload: dict, interval: str = "1d", actions: bool = False
+) -> pandas.DataFrame:
+    """
+    Plain field columns frame of one ticker's chart response, with the
+    dividends and splits of `actions` like yf.download
+    """
+    chart = payload["chart"]
+    if chart.get("error") or not chart.get("result"):
+        error = chart.get("error") or {}
+        raise ChartError(error.get("description") or "No data")
+    result = chart["result"][0]
+    timestamps = result.get("timestamp") or []
+    quote = result["indicators"]["quote"][0]
+
+    index = pandas.to_datetime(
+        numpy.asarray(timestamps, dtype="int64"), unit="s", utc=True
+    )
+    timezone = result["meta"].get("exchangeTimezoneName", "UTC")
+    index = index.tz_convert(timezone)
+    if interval in DAILY_INTERVALS:
+        index = index.normalize()
+    index = index.tz_localize(None)
+
+    columns = {
+        column: numpy.asarray(quote.get(field) or [None] * len(index), dtype="float64")
+        for field, column in QUOTE_FIELDS.items()
+    }
+    adjclose = result["indicators"].get("adjclose")
+    columns["Adj Close"] = (
+        numpy.asarray(adjclose[0]["adjclose"], dtype="float64")
+        if adjclose
+        else columns["Close"]
+    )
+    frame = pandas.DataFrame(columns, index=index)[FIELDS]
+    if actions:
+        events = result.get("events") or {}
+        frame["Dividends"] = _event_values(
+            events.get("dividends"),
+            index,
+            timezone,
+            interval,
+            lambda event: event["amount"],
+        )
+        frame["Stock Splits"] = _event_values(
+            events.get("splits"),
+            index,
+            timezone,
+            interval,
+            lambda event: event["numerator"] / event["denominator"],
+        )
+    # a trailing live bar can share its date with the last daily one
+    return frame[~frame.index.duplicated(keep="last")]
+
+
+class ChartClient(object):
+    """
+    Fetch Yahoo chart data for many tickers over one pooled keep-alive
+    session, at most `concurrency` requests in flight. Throttled, failed and
+    timed out requests are retried up to `max_retries` times with jittered
+    exponential backoff; tickers that still fail are reported in
+    `ChartResult.errors` instead of failing the whole download.
+
+    The session lives as long as the client, on an event loop of its own
+    started by the first fetch, so that the shards of a download, fetched
+    from any thread, share its connections. `close` it once done.
+    """
+
+    def __init__(
+        self,
+        url: str = CHART_URL,
+        concurrency: int = 8,
+        max_retries: int = 4,
+        backoff: float = 0.5,
+        max_backoff: float = 30.0,
+        timeout: float = 30.0,
+    ) -> None:
+        self.url = url
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self._session: aiohttp.ClientSession | None = None
+        self._semaphore: asyncio.Semaphore | None = None
+
+    def __enter__(self) -> "ChartClient":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def _run(self, coroutine):
+        """Run `coroutine` on the client's event loop, waiting for its result"""
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=self._loop.run_forever, name="chart-client", daemon=True
+                )
+                self._thread.start()
+            loop = self._loop
+        return asyncio.run_coroutine_threadsafe(coroutine, loop).result()
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # only called on the client's event loop, which the session is bound to
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.concurrency),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._session
+
+    def close(self) -> None:
+        """Close the pooled connections and stop the client's event loop"""
+        with self._lock:
+            if self._loop is None:
+                return None
+            if self._session is not None:
+                asyncio.run_coroutine_threadsafe(
+                    self._session.close(), self._loop
+                ).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+            self._loop = self._thread = self._session = self._semaphore = None
+
+    def retry_delay(self, attempt: int) -> float:
+        delay = min(self.max_backoff, self.backoff * 2**attempt)
+        return random.uniform(delay / 2, delay)
+
+    async def fetch_ticker(
+        self,
+        session: aiohttp.ClientSession,
+        semaphore: asyncio.Semaphore,
+        ticker: str,
+        params: dict,
+        actions: bool = False,
+        received: list[int] | None = None,
+    ) -> pandas.DataFrame:
+        attempt = 0
+        while True:
+            async with semaphore:
+                try:
+                    async with session.get(
+                        self.url.format(ticker=ticker), params=params
+                    ) as response:
+                        body = await response.read()
+                        if received is not None:
+                            received.append(len(body))
+                        if response.status not in RETRY_STATUSES:
+                            try:
+                                payload = json.loads(body)
+                            except ValueError:
+                                raise ChartError(f"HTTP {response.status}")
+                            return parse_chart(payload, params["interval"], actions)
+                        error = f"HTTP {response.status}"
+                except (aiohttp.ClientError, asyncio.TimeoutError) as exception:
+                    error = repr(exception)
+            if attempt >= self.max_retries:
+                raise ChartError(f"Gave up after {attempt + 1} attempts: {error}")
+            await asyncio.sleep(self.retry_delay(attempt))
+            attempt += 1
+
+    async def fetch_async(
+        self,
+        tickers: list[str],
+        start: str | datetime.datetime,
+        end: str | datetime.datetime | None = None,
+        interval: str = "1d",
+        actions: bool = False,
+    ) -> ChartResult:
+        """`fetch` on the client's event loop"""
+        params = {
+            "period1": as_epoch_seconds(start),
+            "period2": as_epoch_seconds(end or datetime.datetime.now()),
+            "interval": interval,
+            "includeAdjustedClose": "true",
+            "events": "div,splits",
+        }
+        session = self._get_session()
+        received = []
+        outcomes = await asyncio.gather(
+            *(
+                self.fetch_ticker(
+                    session, self._semaphore, ticker, params, actions, received
+                )
+                for ticker in tickers
+            ),
+            return_exceptions=True,
+        )
+
+        frames = {}
+        errors = {}
+        for ticker, outcome in zip(tickers, outcomes):
+            if isinstance(outcome, ChartError):
+                errors[ticker] = str(outcome)
+                outcome = pandas.DataFrame(
+                    columns=FIELDS + (ACTION_FIELDS if actions else []),
+                    index=pandas.DatetimeIndex([]),
+                    dtype="float64",
+                )
+            elif isinstance(outcome, BaseException):
+                raise outcome
+            frames[ticker] = outcome
+        return ChartResult(
+            frame=cache_.join_tickers(frames),
+            errors=errors,
+            bytes_downloaded=sum(received),
+        )
+
+    def fetch(
+        self,
+        tickers: list[str],
+        start: str | datetime.datetime,
+        end: str | datetime.datetime | None = None,
+        interval: str = "1d",
+        actions: bool = False,
+    ) -> ChartResult:
+        return self._run(self.fetch_async(tickers, start, end, interval, actions))
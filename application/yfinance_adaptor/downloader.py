@@ -1,83 +1,231 @@
 from __future__ import annotations
 
 import datetime
+import threading
 import urllib.parse as urlparse
+from typing import Iterable, Iterator, Literal
 
+import numpy
 import pandas
 import pydantic as p
 import yfinance as yf
 
 from django.db.models import Model
+from utils import metrics as metrics_
+from utils.query_budget import QueryBudget
 
-from . import adaptors, enums
+from . import adaptors, chart, enums, pipeline
+from . import cache as cache_
 
 
-def get_database_ready_df(df: pandas.DataFrame, ticker: str) -> pandas.DataFrame:
-    company_id = ticker.replace(".AX", "")
-    mapper = {
-        "Adj Close": "adj_close",
-        "High": "high",
-        "Low": "low",
-        "Open": "open",
-        "Close": "close",
-        "Volume": "volume",
-    }
-    replacement_columns = ["timestamp"] + [
-        mapper[column] for column in df.columns.get_level_values(0)
-    ]
-    if isinstance(df.index, pandas.Index):
-        df.index = pandas.DatetimeIndex(df.index)
-    df.index = df.index.tz_localize("Australia/Melbourne")
-    df.reset_index(inplace=True)
-    df.columns = replacement_columns
-    company_id_column = [company_id for _ in range(len(df))]
-    df["company_id"] = company_id_column
-    # if any of the open/close/high/low/volume is nan
-    # then the data is useless
-    df = df[df.open.notnull()]
-    df = df[df.close.notnull()]
-    df = df[df.high.notnull()]
-    df = df[df.low.notnull()]
-    df = df[df.volume.notnull()]
-    # fix adj_close
-    adj_close = df["adj_close"]
-    adj_close = adj_close.where(
-        adj_close.notnull(), df["close"]  # replace nan adj_close with close
+COLUMN_MAPPER = {
+    "Adj Close": "adj_close",
+    "High": "high",
+    "Low": "low",
+    "Open": "open",
+    "Close": "close",
+    "Volume": "volume",
+}
+# if any of these is nan then the data is useless
+REQUIRED_COLUMNS = ["open", "close", "high", "low", "volume"]
+# corporate action fields downloaded with `actions=True` -> action kind
+ACTION_MAPPER = {
+    "Dividends": "dividend",
+    "Stock Splits": "split",
+}
+
+
+def _as_multi_index(
+    df: pandas.DataFrame, tickers: list[str] | None
+) -> pandas.DataFrame:
+    if isinstance(df.columns, pandas.MultiIndex):
+        return df
+    return df.set_axis(
+        pandas.MultiIndex.from_product([df.columns, tickers[:1]]), axis=1
     )
-    # replace ridiculous values (extreme small or extreme large)
-    # with close
-    adj_close = adj_close.where(
-        adj_close >= 0.001,
-        df["close"],
+
+
+def _normalise(
+    df: pandas.DataFrame,
+    tickers: list[str] | None,
+    compact: bool = False,
+    price_dtype: str = "float64",
+) -> tuple[pandas.DataFrame, numpy.ndarray]:
+    df = _as_multi_index(df, tickers)
+    fields = list(dict.fromkeys(df.columns.get_level_values(0)))
+    if not set(fields) <= set(COLUMN_MAPPER):
+        fields = [field for field in fields if field in COLUMN_MAPPER]
+        df = df[fields]
+    frame_tickers = list(dict.fromkeys(df.columns.get_level_values(1)))
+    n_dates, n_fields, n_tickers = len(df), len(fields), len(frame_tickers)
+
+    full_columns = pandas.MultiIndex.from_product([fields, frame_tickers])
+    if not df.columns.equals(full_columns):
+        df = df.reindex(columns=full_columns)
+    # pandas stores each column's values contiguously, so for a single-block
+    # frame this is a view: one row per field, ticker-major dates along it
+    wide = numpy.ascontiguousarray(df.to_numpy(dtype="float64").T).reshape(
+        n_fields, n_tickers * n_dates
     )
-    adj_close = adj_close.where(
-        adj_close < df["close"] * 20,
-        df["close"],
+    columns = [COLUMN_MAPPER[field] for field in fields]
+    valid = numpy.ones(n_tickers * n_dates, dtype=bool)
+    for column in REQUIRED_COLUMNS:
+        valid &= ~numpy.isnan(wide[columns.index(column)])
+    # the only copy of the price data: the valid rows, column by column
+    values = numpy.empty((n_fields, int(valid.sum())), dtype="float64")
+    for i in range(n_fields):
+        values[i] = wide[i][valid]
+    rows_per_ticker = valid.reshape(n_tickers, n_dates).sum(axis=1)
+
+    if "adj_close" in columns:
+        # fix adj_close: replace nan and ridiculous values (extreme small or
+        # extreme large) with close
+        adj_close = values[columns.index("adj_close")]
+        close = values[columns.index("close")]
+        with numpy.errstate(invalid="ignore"):
+            insane = ~((adj_close >= 0.001) & (adj_close < close * 20))
+        numpy.copyto(adj_close, close, where=insane)
+
+    index = pandas.DatetimeIndex(df.index).tz_localize("Australia/Melbourne")
+    utc_timestamps = index.tz_convert("UTC").tz_localize(None).values
+    company_ids = [ticker.replace(".AX", "") for ticker in frame_tickers]
+    timestamps = numpy.broadcast_to(utc_timestamps, (n_tickers, n_dates))[
+        valid.reshape(n_tickers, n_dates)
+    ]
+
+    if compact:
+        normalised = pandas.DataFrame(
+            {
+                "timestamp": pandas.DatetimeIndex(timestamps).as_unit("ns").asi8,
+                **{
+                    column: values[i].astype(
+                        "int64" if column == "volume" else price_dtype, copy=False
+                    )
+                    for i, column in enumerate(columns)
+                },
+                "company_id": pandas.Categorical.from_codes(
+                    numpy.repeat(
+                        numpy.arange(n_tickers, dtype="int32"), rows_per_ticker
+                    ),
+                    categories=company_ids,
+                ),
+            },
+            copy=False,
+        )
+        return normalised, rows_per_ticker
+
+    normalised = pandas.DataFrame(values.T, columns=columns, copy=False)
+    normalised.insert(
+        0,
+        "timestamp",
+        pandas.DatetimeIndex(timestamps).tz_localize("UTC").tz_convert(index.tz),
     )
-    df["adj_close"] = adj_close
-    return df
+    normalised["company_id"] = pandas.Series(company_ids).repeat(rows_per_ticker).array
+    return normalised, rows_per_ticker
+
+
+def to_database_frame(df: pandas.DataFrame) -> pandas.DataFrame:
+    """
+    Expand the epoch timestamps of a compact frame for the database, at the
+    sink. Categorical keys and float32 prices are written as they are.
+    """
+    if df["timestamp"].dtype.kind != "i":
+        return df
+    return df.assign(timestamp=pandas.to_datetime(df["timestamp"], unit="ns", utc=True))
+
+
+def normalise_yf_dataframe(
+    df: pandas.DataFrame,
+    tickers: list[str] | None = None,
+    compact: bool = False,
+    price_dtype: str = "float64",
+) -> pandas.DataFrame:
+    """
+    Reshape a wide yfinance frame, `(field, ticker)` columns by date rows, into
+    one long frame of database ready rows in a single pass: ticker-major, with
+    `timestamp`, the renamed fields and `company_id` columns.
+
+    A frame with plain field columns is taken as the data of `tickers[0]`.
+
+    A `compact` frame has int64 epoch nanosecond UTC timestamps, `price_dtype`
+    prices, int64 volumes and a categorical `company_id`; `to_database_frame`
+    converts it for the database.
+    """
+    return _normalise(df, tickers, compact, price_dtype)[0]
+
+
+def get_database_ready_df(df: pandas.DataFrame, ticker: str) -> pandas.DataFrame:
+    return normalise_yf_dataframe(df, [ticker])
 
 
 def handle_yf_dataframes(
-    df: pandas.DataFrame, tickers: list[str]
+    df: pandas.DataFrame,
+    tickers: list[str],
+    compact: bool = False,
+    price_dtype: str = "float64",
 ) -> list[pandas.DataFrame]:
-    if not isinstance(df.columns, pandas.MultiIndex) and len(tickers) == 1:
-        return [get_database_ready_df(df, tickers[0])]
+    """Normalise a wide yfinance frame into one frame per ticker"""
+    normalised, rows_per_ticker = _normalise(df, tickers, compact, price_dtype)
+    # rows are ticker-major, so each ticker is one contiguous block
+    bounds = numpy.concatenate([[0], numpy.cumsum(rows_per_ticker)])
+    return [normalised.iloc[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
 
-    columns_by_tickers = {}
-    for name, ticker in df.columns:
-        columns_by_tickers.setdefault(ticker, []).append((name, ticker))
 
-    dfs = []
-    for ticker, column_names in columns_by_tickers.items():
-        dfs.append(get_database_ready_df(df.filter(column_names, axis=1), ticker))
-    return dfs
+def normalise_yf_actions(
+    df: pandas.DataFrame, tickers: list[str] | None = None
+) -> pandas.DataFrame:
+    """
+    Long frame of the dividends and splits in a yfinance frame downloaded with
+    `actions=True`: `company_id`, `timestamp`, `kind` and `value`, the amount
+    per share or the split ratio.
+    """
+    df = _as_multi_index(df, tickers)
+    index = pandas.DatetimeIndex(df.index).tz_localize("Australia/Melbourne")
+    actions = []
+    for field, ticker in df.columns:
+        if field not in ACTION_MAPPER:
+            continue
+        values = df[(field, ticker)].to_numpy(dtype="float64")
+        happened = numpy.nan_to_num(values) != 0
+        actions.append(
+            pandas.DataFrame(
+                {
+                    "company_id": ticker.replace(".AX", ""),
+                    "timestamp": index[happened],
+                    "kind": ACTION_MAPPER[field],
+                    "value": values[happened],
+                }
+            )
+        )
+    if not actions:
+        return pandas.DataFrame(columns=["company_id", "timestamp", "kind", "value"])
+    return pandas.concat(actions, ignore_index=True)
+
+
+# statements of a COPY load: a savepoint, the staging table and the insert
+COPY_CHUNK_QUERIES = 7
+
+# tickers downloaded per shard unless a batch size is given
+DEFAULT_BATCH_SIZE = 50
+
+PIPELINE_FIELDS = {
+    "batch_size",
+    "concurrency",
+    "max_pending_batches",
+    "compact",
+    "price_dtype",
+}
+
+# yf.download collects its results in module level state, concurrent calls
+# would mix up each other's frames
+_YF_DOWNLOAD_LOCK = threading.Lock()
 
 
 class YahooFinanceDownloadSpec(p.BaseModel):
     tickers: str | list[str]
     start: str | datetime.datetime = "1900-01-01"
-    end: str | datetime.datetime = datetime.datetime.now()
+    # up to now when not given
+    end: str | datetime.datetime | None = None
     actions: bool = False
     threads: bool = True
     ignore_tz: bool = True
@@ -94,6 +242,15 @@ class YahooFinanceDownloadSpec(p.BaseModel):
     proxy: str | None = None
     rounding: bool = False
     timeout: float | None = None
+    # pipeline options, not passed to yfinance. Tickers are downloaded in
+    # shards of `batch_size` on `concurrency` workers, at most
+    # `max_pending_batches` normalised shards waiting for the sink.
+    batch_size: int = p.Field(default=DEFAULT_BATCH_SIZE, gt=0)
+    concurrency: int = p.Field(default=1, gt=0)
+    max_pending_batches: int = p.Field(default=2, gt=0)
+    # normalise into compact frames, see `normalise_yf_dataframe`
+    compact: bool = False
+    price_dtype: Literal["float64", "float32"] = "float64"
 
     @p.field_validator("start", "end")
     @classmethod
@@ -121,7 +278,7 @@ class YahooFinanceDownloadSpec(p.BaseModel):
         return value
 
     def serialize(self) -> dict:
-        data = super().model_dump()
+        data = super().model_dump(exclude=PIPELINE_FIELDS)
         data["group_by"] = data["group_by"].value
         data["period"] = data["period"].value
         data["interval"] = data["interval"].value
@@ -129,15 +286,29 @@ class YahooFinanceDownloadSpec(p.BaseModel):
 
 
 class YFDownloader(object):
+    # rows handed to the adaptor at a time by `export` and `upsert`
+    export_chunk_rows = 100_000
+
     def __init__(
         self,
         tickers: str | list[str],
         adaptor: adaptors.Adaptor | None = None,
+        cache: cache_.DownloadCache | None = None,
+        client: chart.ChartClient | None = None,
+        metrics: metrics_.Metrics | None = None,
         **kwargs,
     ) -> None:
         self.adaptor = adaptor
+        self.cache = cache
+        # fetch through the chart endpoint instead of `yf.download`
+        self.client = client
+        # records the download and normalise stages if given
+        self.metrics = metrics or metrics_.Metrics()
+        # ticker -> why the chart client got no data for it
+        self.errors: dict[str, str] = {}
+        # corporate actions of the downloaded tickers, with `actions=True`
+        self.actions: list[pandas.DataFrame] = []
         self.spec = YahooFinanceDownloadSpec(tickers=tickers, **kwargs)
-        self._downloaded: list[pandas.DataFrame] | None = None
 
     @property
     def tickers(self) -> list[str]:
@@ -148,23 +319,105 @@ class YFDownloader(object):
         )
 
     def download(self) -> pandas.DataFrame:
-        return yf.download(**self.spec.serialize())
-
-    def get_dfs(self) -> list[pandas.DataFrame]:
-        if self._downloaded is None:
-            self._downloaded = self.download()
-        return handle_yf_dataframes(self._downloaded, self.tickers)
-
-    def export(self, django_model: Model) -> None:
-        # table_has_inited = django_model.objects.exists()
-        objects = []
-        for df in self.get_dfs():
-            company_ids = df["company_id"].unique().tolist()
-            if not len(company_ids):
-                continue
-            # print(company_ids)
-            pending_records = []
-            for record in df.to_dict(orient="records"):
-                pending_records.append(django_model(**record))
-            if pending_records:
-                django_model.objects.bulk_create(pending_records, batch_size=10000)
+        return self.download_tickers(self.tickers)
+
+    def download_tickers(self, tickers: list[str]) -> pandas.DataFrame:
+        if self.cache is not None:
+            spec = self.spec.model_copy(update={"tickers": tickers})
+            return self.cache.download(tickers, spec, self.fetch)
+        return self.fetch(tickers)
+
+    def fetch(
+        self, tickers: list[str], start: str | datetime.datetime | None = None
+    ) -> pandas.DataFrame:
+        update = {"tickers": tickers}
+        if start is not None:
+            update["start"] = start
+        spec = self.spec.model_copy(update=update)
+        with self.metrics.stage("download") as stage:
+            if self.client is not None:
+                result = self.client.fetch(
+                    tickers, spec.start, spec.end, spec.interval.value, spec.actions
+                )
+                self.errors.update(result.errors)
+                frame = result.frame
+                stage.add(bytes_downloaded=result.bytes_downloaded)
+            else:
+                with _YF_DOWNLOAD_LOCK:
+                    frame = yf.download(**spec.serialize())
+            if "Close" in frame.columns.get_level_values(0):
+                stage.add(rows=int(frame["Close"].notna().to_numpy().sum()))
+            return frame
+
+    def _handle_download(
+        self, df: pandas.DataFrame, tickers: list[str]
+    ) -> list[pandas.DataFrame]:
+        with self.metrics.stage("normalise") as stage:
+            if self.spec.actions:
+                self.actions.append(normalise_yf_actions(df, tickers))
+            dfs = handle_yf_dataframes(
+                df, tickers, self.spec.compact, self.spec.price_dtype
+            )
+            stage.add(rows=sum(len(df) for df in dfs))
+            return dfs
+
+    def download_batch(self, tickers: list[str]) -> list[pandas.DataFrame]:
+        return self._handle_download(self.download_tickers(tickers), tickers)
+
+    def iter_batches(self) -> Iterator[list[pandas.DataFrame]]:
+        """
+        Download and normalise the tickers shard by shard on a worker pool,
+        yielding each shard's frames as soon as it is ready.
+        """
+        return pipeline.run_sharded(
+            pipeline.shard(self.tickers, self.spec.batch_size),
+            self.download_batch,
+            concurrency=self.spec.concurrency,
+            max_pending=self.spec.max_pending_batches,
+        )
+
+    def get_dfs(self) -> Iterator[pandas.DataFrame]:
+        """
+        Normalised frames, one ticker at a time. Tickers are downloaded shard
+        by shard and each frame is let go of once yielded, so only a few
+        shards are held in memory however many tickers there are.
+        """
+        for batch in self.iter_batches():
+            batch.reverse()
+            while batch:
+                yield batch.pop()
+
+    def _chunk_budget(self) -> QueryBudget:
+        # a read and a write for each ORM batch of the chunk, which covers
+        # the fixed number of statements of the COPY loader too
+        batches = -(-self.export_chunk_rows // adaptors.ORM_BATCH_ROWS)
+        return QueryBudget(
+            max(2 * batches, COPY_CHUNK_QUERIES), name="YFDownloader chunk"
+        )
+
+    def _chunks(self) -> Iterator[list[pandas.DataFrame]]:
+        frames = map(to_database_frame, self.get_dfs())
+        return adaptors.chunk_frames(frames, self.export_chunk_rows)
+
+    def export(self, django_model: type[Model]) -> int:
+        """Write the frames to the adaptor in chunks of `export_chunk_rows`"""
+        rows = 0
+        for chunk in self._chunks():
+            with self._chunk_budget():
+                if self.adaptor is None:
+                    rows += adaptors.bulk_create_frames(django_model, chunk)
+                else:
+                    rows += self.adaptor.export_model(django_model, chunk)
+        return rows
+
+    def upsert(
+        self, django_model: type[Model], unique_fields: Iterable[str]
+    ) -> adaptors.LoadCounts:
+        """Upsert the frames through the adaptor in chunks of `export_chunk_rows`"""
+        if self.adaptor is None:
+            raise ValueError("Upserting prices requires an adaptor")
+        counts = adaptors.LoadCounts()
+        for chunk in self._chunks():
+            with self._chunk_budget():
+                counts += self.adaptor.upsert_model(django_model, chunk, unique_fields)
+        return counts
@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import queue
+import threading
+from typing import Callable, Iterable, Iterator, TypeVar
+
+Shard = TypeVar("Shard")
+Result = TypeVar("Result")
+
+_DONE = object()
+
+
+class _Failure:
+    def __init__(self, error: BaseException) -> None:
+        self.error = error
+
+
+def shard(items: list[Shard], size: int) -> list[list[Shard]]:
+    return [items[i : i + size] for i in range(0, len(items), size)]
+
+
+def run_sharded(
+    shards: Iterable[Shard],
+    work: Callable[[Shard], Result],
+    concurrency: int = 1,
+    max_pending: int = 2,
+) -> Iterator[Result]:
+    """
+    Run `work` over `shards` on `concurrency` worker threads, yielding results
+    in completion order.
+
+    Finished results wait in a queue holding at most `max_pending` of them;
+    workers block until the consumer catches up, so no more than
+    `concurrency + max_pending` results are alive at any time however many
+    shards there are. An exception raised by `work` stops the workers and is
+    re-raised to the consumer.
+    """
+    shards = iter(shards)
+    shards_lock = threading.Lock()
+    results: queue.Queue = queue.Queue(maxsize=max_pending)
+    stop = threading.Event()
+
+    def next_shard():
+        with shards_lock:
+            return next(shards, _DONE)
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                results.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def worker() -> None:
+        try:
+            while not stop.is_set():
+                item = next_shard()
+                if item is _DONE:
+                    break
+                if not put(work(item)):
+                    break
+        except BaseException as error:  # handed over to the consumer
+            put(_Failure(error))
+        finally:
+            put(_DONE)
+
+    workers = [
+        threading.Thread(target=worker, daemon=True) for _ in range(max(concurrency, 1))
+    ]
+    for thread in workers:
+        thread.start()
+
+    try:
+        running = len(workers)
+        while running:
+            item = results.get()
+            if item is _DONE:
+                running -= 1
+            elif isinstance(item, _Failure):
+                raise item.error
+            else:
+                yield item
+    finally:
+        stop.set()
+        for thread in workers:
+            thread.join()
@@ -0,0 +1,50 @@
+"""
+Time a daily rebalanced backtest over a synthetic close panel.
+
+    python -m benchmarks.backtest --tickers 500 --days 5040
+"""
+import argparse
+import os
+import time
+
+import django
+import numpy
+import pandas
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "asx.settings")
+django.setup()
+
+from domain import backtest  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tickers", type=int, default=500)
+    parser.add_argument("--days", type=int, default=20 * 252)
+    parser.add_argument("--every", type=int, default=5, help="Rebalance period")
+    args = parser.parse_args()
+
+    generator = numpy.random.default_rng(0)
+    returns = generator.normal(0.0003, 0.02, (args.days, args.tickers))
+    closes = pandas.DataFrame(
+        10 * numpy.exp(numpy.cumsum(returns, axis=0)),
+        index=pandas.bdate_range("2000-01-03", periods=args.days, tz="UTC"),
+        columns=[f"B{i:04d}" for i in range(args.tickers)],
+    )
+    momentum = closes.pct_change(20).iloc[:: args.every]
+    weights = backtest.weights_from_signals(
+        momentum.sub(momentum.median(axis=1), axis=0)
+    )
+
+    start = time.perf_counter()
+    result = backtest.backtest(closes, weights, initial_cash=10_000_000)
+    elapsed = time.perf_counter() - start
+    print(
+        f"{args.days} days x {args.tickers} tickers, {len(weights)} rebalances: "
+        f"{elapsed:.2f}s, final equity {result.equity.iloc[-1]:,.0f}, "
+        f"costs {result.costs.sum():,.0f}"
+    )
+
+
+if __name__ == "__main__":
+    main()
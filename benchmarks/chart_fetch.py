@@ -0,0 +1,56 @@
+"""
+Tickers per second of the asyncio chart client against the yf.download path.
+
+Against the local stub (default) only the chart client can be measured, at
+increasing concurrency; `--yahoo` downloads real ASX tickers with both.
+
+    python -m benchmarks.chart_fetch --tickers 200 --latency 0.05
+    python -m benchmarks.chart_fetch --yahoo --tickers 50
+"""
+import argparse
+import time
+
+import yfinance as yf
+
+from application.yfinance_adaptor import chart
+from benchmarks import chart_stub, synthetic
+
+START = "2023-01-01"
+END = "2024-01-01"
+
+
+def rate(tickers: list[str], fetch) -> float:
+    start = time.perf_counter()
+    fetch(tickers)
+    return len(tickers) / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tickers", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--yahoo", action="store_true")
+    args = parser.parse_args()
+
+    if args.yahoo:
+        tickers = ["BHP.AX", "CBA.AX", "CSL.AX", "NAB.AX", "WBC.AX", "ANZ.AX"]
+        tickers = (tickers * (args.tickers // len(tickers) + 1))[: args.tickers]
+        yf_rate = rate(tickers, lambda t: yf.download(t, START, END, progress=False))
+        print(f"yf.download: {yf_rate:.1f} tickers/s")
+        with chart.ChartClient(concurrency=16) as client:
+            client_rate = rate(tickers, lambda t: client.fetch(t, START, END))
+        print(f"chart client: {client_rate:.1f} tickers/s")
+        return None
+
+    tickers = [f"{code}.AX" for code in synthetic.synthetic_codes(args.tickers)]
+    with chart_stub.ChartStubServer(latency=args.latency) as server:
+        for concurrency in (1, 8, 32):
+            with chart.ChartClient(url=server.url, concurrency=concurrency) as client:
+                client_rate = rate(
+                    tickers, lambda t, client=client: client.fetch(t, START, END)
+                )
+            print(f"concurrency {concurrency:>3}: {client_rate:.1f} tickers/s")
+
+
+if __name__ == "__main__":
+    main()
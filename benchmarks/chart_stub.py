@@ -0,0 +1,123 @@
+"""
+Local stand-in for Yahoo's chart endpoint, serving deterministic synthetic
+daily bars over keep-alive connections.
+"""
+import http.server
+import json
+import threading
+import time
+import urllib.parse
+import zlib
+
+import numpy
+
+DAY = 86_400
+
+
+class ChartStubHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def setup(self) -> None:
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self) -> None:
+        url = urllib.parse.urlparse(self.path)
+        ticker = url.path.rsplit("/", 1)[-1]
+        params = dict(urllib.parse.parse_qsl(url.query))
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            failures = server.failures.get(ticker, 0)
+            if failures:
+                server.failures[ticker] = failures - 1
+        if server.latency:
+            time.sleep(server.latency)
+
+        if failures:
+            self.respond(503, {"error": "unavailable"})
+        elif ticker in server.missing:
+            self.respond(
+                404,
+                {
+                    "chart": {
+                        "result": None,
+                        "error": {"code": "Not Found", "description": "No data found"},
+                    }
+                },
+            )
+        else:
+            self.respond(
+                200,
+                chart_payload(ticker, int(params["period1"]), int(params["period2"])),
+            )
+
+    def respond(self, status: int, payload: dict) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def chart_payload(ticker: str, period1: int, period2: int) -> dict:
+    first_day = -(-period1 // DAY)
+    timestamps = numpy.arange(first_day, period2 // DAY + 1) * DAY
+    timestamps = timestamps[timestamps < period2]
+    generator = numpy.random.default_rng(zlib.crc32(ticker.encode()))
+    close = numpy.round(10 + generator.random(len(timestamps)), 3)
+    return {
+        "chart": {
+            "result": [
+                {
+                    "meta": {"symbol": ticker, "exchangeTimezoneName": "UTC"},
+                    "timestamp": timestamps.tolist(),
+                    "indicators": {
+                        "quote": [
+                            {
+                                "open": close.tolist(),
+                                "high": (close + 0.5).tolist(),
+                                "low": (close - 0.5).tolist(),
+                                "close": close.tolist(),
+                                "volume": [1000] * len(timestamps),
+                            }
+                        ],
+                        "adjclose": [{"adjclose": close.tolist()}],
+                    },
+                }
+            ],
+            "error": None,
+        }
+    }
+
+
+class ChartStubServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency: float = 0.0, missing=(), failures=None) -> None:
+        super().__init__(("127.0.0.1", 0), ChartStubHandler)
+        self.latency = latency
+        self.missing = set(missing)
+        # ticker -> number of 503 responses before serving it
+        self.failures = dict(failures or {})
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.connections = 0
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v8/finance/chart/{{ticker}}"
+
+    def __enter__(self) -> "ChartStubServer":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,47 @@
+"""
+Bytes per row and normalisation time of the default and compact normalised
+price frames.
+
+    python -m benchmarks.compact_frames --tickers 2000 --days 2500
+"""
+import argparse
+import time
+
+from application.yfinance_adaptor import downloader
+from benchmarks import synthetic
+
+LAYOUTS = {
+    "default": {},
+    "compact": {"compact": True},
+    "compact float32": {"compact": True, "price_dtype": "float32"},
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tickers", type=int, default=2000)
+    parser.add_argument("--days", type=int, default=2500)
+    args = parser.parse_args()
+
+    codes = synthetic.synthetic_codes(args.tickers)
+    tickers = [f"{code}.AX" for code in codes]
+    frame = synthetic.synthetic_yf_frame(codes, args.days)
+    print(f"input: {frame.shape[0]} dates x {len(tickers)} tickers")
+
+    baseline = None
+    for name, options in LAYOUTS.items():
+        start = time.perf_counter()
+        normalised = downloader.normalise_yf_dataframe(frame, tickers, **options)
+        elapsed = time.perf_counter() - start
+        per_row = normalised.memory_usage(deep=True).sum() / len(normalised)
+        baseline = baseline or per_row
+        print(
+            f"{name:>16}: {per_row:6.1f} bytes/row ({per_row / baseline:.0%}), "
+            f"{len(normalised) * per_row / 2**20:,.0f} MiB, "
+            f"normalised in {elapsed:.2f}s"
+        )
+        del normalised
+
+
+if __name__ == "__main__":
+    main()
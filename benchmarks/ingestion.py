@@ -0,0 +1,199 @@
+"""
+Time each stage of the price refresh over a synthetic universe, and compare
+the run against a saved baseline.
+
+    python -m benchmarks.ingestion --tickers 2000 --days 10080 \
+        --output ingestion.json --baseline baseline.json
+
+Each stage records wall time, rows per second and the peak of the memory it
+allocated on top of what was held when it started, traced by `tracemalloc`
+(which slows the stages down alike). The export stage runs
+`YFDownloader.export` as `update_prices` does, downloading and normalising
+the frames again on its way. With `--baseline`, stages slower or larger than
+the baseline by more than `--tolerance` are reported and the exit status is 1.
+
+Runs against the database configured in `asx.settings`; the synthetic
+companies it creates are removed afterwards.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from typing import Callable
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "asx.settings")
+django.setup()
+
+from application.yfinance_adaptor import adaptors, cache, downloader  # noqa: E402
+from data import models  # noqa: E402
+from domain import operations  # noqa: E402
+
+from benchmarks import synthetic  # noqa: E402
+
+LOADERS = {
+    "bulk_create": adaptors.PostGresDjangoAdaptor,
+    "copy": adaptors.PostGresCopyAdaptor,
+}
+
+
+class StageTimer(object):
+    def __init__(self) -> None:
+        self.stages: dict[str, dict] = {}
+
+    def run(
+        self,
+        name: str,
+        function: Callable,
+        rows: int | None = None,
+        count: Callable = len,
+    ):
+        """Run `function`, recording the stage. `rows` defaults to `count(result)`"""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        held, _ = tracemalloc.get_traced_memory()
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        if rows is None:
+            rows = count(result)
+        self.stages[name] = {
+            "seconds": elapsed,
+            "rows": rows,
+            "rows_per_second": rows / elapsed if elapsed else None,
+            "peak_mib": (peak - held) / 2**20,
+        }
+        print(
+            f"{name:>24}: {elapsed:8.2f}s {rows:>12,} rows "
+            f"({self.stages[name]['rows_per_second'] or 0:,.0f} rows/s), "
+            f"peak {self.stages[name]['peak_mib']:,.0f} MiB"
+        )
+        return result
+
+
+def run(tickers: int, days: int, loader: str = "copy") -> dict:
+    codes = synthetic.synthetic_codes(tickers, prefix="BENCH")
+    yf_tickers = [f"{code}.AX" for code in codes]
+    industry, _ = models.IndustryGroup.objects.get_or_create(name="Benchmark")
+    models.Company.objects.bulk_create(
+        [
+            models.Company(trading_code=code, name=code, industry=industry)
+            for code in codes
+        ],
+        ignore_conflicts=True,
+    )
+    adaptor = LOADERS[loader].from_django_settings()
+    # the synthetic frame stands in for yf.download
+    fetcher = downloader.YFDownloader(tickers=yf_tickers, adaptor=adaptor)
+    fetcher.fetch = lambda tickers, start=None: synthetic.synthetic_yf_frame(
+        codes, days
+    )
+
+    timer = StageTimer()
+    try:
+        frame = timer.run("download", fetcher.download, rows=tickers * days)
+        dfs = timer.run(
+            "handle_yf_dataframes",
+            lambda: downloader.handle_yf_dataframes(frame, yf_tickers),
+            count=lambda dfs: sum(len(df) for df in dfs),
+        )
+        rows = sum(len(df) for df in dfs)
+        by_ticker = cache.split_by_ticker(frame, yf_tickers)
+        timer.run(
+            "get_database_ready_df",
+            lambda: [
+                downloader.get_database_ready_df(df, ticker)
+                for ticker, df in by_ticker.items()
+            ],
+            rows=rows,
+        )
+        timer.run(
+            "export",
+            lambda: fetcher.export(models.PriceRecord),
+            count=lambda inserted: inserted,
+        )
+        timer.run(
+            "organise_active_periods",
+            lambda: operations.bulk_organise_active_periods(codes),
+            rows=tickers,
+        )
+    finally:
+        models.PriceRecord.objects.filter(company_id__in=codes).delete()
+        models.Company.objects.filter(trading_code__in=codes).delete()
+
+    return {
+        "meta": {
+            "tickers": tickers,
+            "days": days,
+            "loader": loader,
+            "python": platform.python_version(),
+            "run_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        },
+        "stages": timer.stages,
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float = 0.2) -> list[str]:
+    """Regressions of `results` against `baseline`, beyond `tolerance`"""
+    regressions = []
+    for name, stage in results["stages"].items():
+        base = baseline["stages"].get(name)
+        if base is None:
+            continue
+        for metric in ("seconds", "peak_mib"):
+            # baselines from before a metric was recorded lack it
+            if metric not in base:
+                continue
+            if stage[metric] > base[metric] * (1 + tolerance):
+                regressions.append(
+                    f"{name} {metric}: {stage[metric]:,.2f} "
+                    f"vs {base[metric]:,.2f} in the baseline"
+                )
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--tickers", type=int, default=200)
+    parser.add_argument("--days", type=int, default=2500)
+    parser.add_argument("--loader", choices=sorted(LOADERS), default="copy")
+    parser.add_argument("--output", type=str, help="Save the results as JSON here")
+    parser.add_argument("--baseline", type=str, help="JSON results to compare with")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="Relative slowdown or growth tolerated before a regression",
+    )
+    args = parser.parse_args()
+
+    results = run(args.tickers, args.days, args.loader)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        if baseline["meta"]["tickers"] != args.tickers or (
+            baseline["meta"]["days"] != args.days
+        ):
+            print("warning: the baseline was run at a different scale")
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"regression: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Compare the vectorised yfinance frame normaliser against the previous
+per-ticker implementation, in wall time and peak traced allocation.
+
+    python -m benchmarks.normalise --tickers 2000 --days 10000
+"""
+import argparse
+import time
+import tracemalloc
+
+import pandas
+
+from application.yfinance_adaptor import downloader
+from benchmarks import synthetic
+
+
+def _legacy_database_ready_df(df: pandas.DataFrame, ticker: str) -> pandas.DataFrame:
+    company_id = ticker.replace(".AX", "")
+    replacement_columns = ["timestamp"] + [
+        downloader.COLUMN_MAPPER[column] for column in df.columns.get_level_values(0)
+    ]
+    df.index = pandas.DatetimeIndex(df.index).tz_localize("Australia/Melbourne")
+    df.reset_index(inplace=True)
+    df.columns = replacement_columns
+    df["company_id"] = [company_id for _ in range(len(df))]
+    df = df[df.open.notnull()]
+    df = df[df.close.notnull()]
+    df = df[df.high.notnull()]
+    df = df[df.low.notnull()]
+    df = df[df.volume.notnull()]
+    adj_close = df["adj_close"]
+    adj_close = adj_close.where(adj_close.notnull(), df["close"])
+    adj_close = adj_close.where(adj_close >= 0.001, df["close"])
+    adj_close = adj_close.where(adj_close < df["close"] * 20, df["close"])
+    df["adj_close"] = adj_close
+    return df
+
+
+def legacy_handle_yf_dataframes(
+    df: pandas.DataFrame, tickers: list[str]
+) -> list[pandas.DataFrame]:
+    columns_by_tickers = {}
+    for name, ticker in df.columns:
+        columns_by_tickers.setdefault(ticker, []).append((name, ticker))
+    return [
+        _legacy_database_ready_df(df.filter(column_names, axis=1), ticker)
+        for ticker, column_names in columns_by_tickers.items()
+    ]
+
+
+def measure(function, *args) -> tuple[float, int, object]:
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tickers", type=int, default=2000)
+    parser.add_argument("--days", type=int, default=2500)
+    args = parser.parse_args()
+
+    codes = synthetic.synthetic_codes(args.tickers)
+    tickers = [f"{code}.AX" for code in codes]
+    frame = synthetic.synthetic_yf_frame(codes, args.days)
+    print(f"input: {frame.shape[0]} dates x {len(tickers)} tickers")
+
+    legacy_time, legacy_peak, legacy = measure(
+        legacy_handle_yf_dataframes, frame.copy(), tickers
+    )
+    new_time, new_peak, new = measure(downloader.handle_yf_dataframes, frame, tickers)
+
+    for old_df, new_df in zip(legacy, new):
+        pandas.testing.assert_frame_equal(
+            old_df.reset_index(drop=True), new_df.reset_index(drop=True)
+        )
+    for name, elapsed, peak in [
+        ("legacy", legacy_time, legacy_peak),
+        ("vectorised", new_time, new_peak),
+    ]:
+        print(f"{name:>12}: {elapsed:.2f}s, peak {peak / 2**20:,.0f} MiB")
+    print(
+        f"speedup {legacy_time / new_time:.1f}x, "
+        f"peak allocation {new_peak / legacy_peak:.0%} of legacy"
+    )
+
+
+if __name__ == "__main__":
+    main()
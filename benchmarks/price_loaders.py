@@ -0,0 +1,85 @@
+"""
+Compare PriceRecord ingestion throughput of the available loaders.
+
+    python -m benchmarks.price_loaders --tickers 200 --days 2500
+
+Runs against the database configured in `asx.settings`; the synthetic
+companies it creates are removed afterwards.
+"""
+
+import argparse
+import os
+import time
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "asx.settings")
+django.setup()
+
+from application.yfinance_adaptor import adaptors, downloader  # noqa: E402
+from data import models  # noqa: E402
+
+from benchmarks import synthetic  # noqa: E402
+
+
+def _load_bulk_create(dfs) -> None:
+    adaptors.bulk_create_frames(models.PriceRecord, dfs)
+
+
+def _load_to_sql(dfs) -> None:
+    adaptor = adaptors.PostGresDjangoAdaptor.from_django_settings()
+    for df in dfs:
+        adaptor.export(models.PriceRecord._meta.db_table, df)
+
+
+def _load_copy(dfs) -> None:
+    adaptors.PostGresCopyAdaptor.from_django_settings().export_model(
+        models.PriceRecord, dfs
+    )
+
+
+LOADERS = {
+    "bulk_create": _load_bulk_create,
+    "to_sql": _load_to_sql,
+    "copy": _load_copy,
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tickers", type=int, default=100)
+    parser.add_argument("--days", type=int, default=2500)
+    parser.add_argument(
+        "--loaders", type=str, default=",".join(LOADERS), help="Comma separated"
+    )
+    args = parser.parse_args()
+
+    codes = synthetic.synthetic_codes(args.tickers, prefix="BENCH")
+    industry, _ = models.IndustryGroup.objects.get_or_create(name="Benchmark")
+    models.Company.objects.bulk_create(
+        [
+            models.Company(trading_code=code, name=code, industry=industry)
+            for code in codes
+        ],
+        ignore_conflicts=True,
+    )
+    frame = synthetic.synthetic_yf_frame(codes, args.days)
+    tickers = [f"{code}.AX" for code in codes]
+    try:
+        for name in args.loaders.split(","):
+            dfs = downloader.handle_yf_dataframes(frame.copy(), tickers)
+            rows = sum(len(df) for df in dfs)
+            start = time.perf_counter()
+            LOADERS[name](dfs)
+            elapsed = time.perf_counter() - start
+            print(
+                f"{name:>12}: {rows} rows in {elapsed:.2f}s "
+                f"({rows / elapsed:,.0f} rows/s)"
+            )
+            models.PriceRecord.objects.filter(company_id__in=codes).delete()
+    finally:
+        models.Company.objects.filter(trading_code__in=codes).delete()
+
+
+if __name__ == "__main__":
+    main()
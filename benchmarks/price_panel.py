@@ -0,0 +1,87 @@
+"""
+Compare reading a dates x tickers close panel through the ORM with
+`queries.get_price_panel`.
+
+    python -m benchmarks.price_panel --tickers 500 --days 2520
+
+Runs against the database configured in `asx.settings`; the synthetic
+companies it creates are removed afterwards.
+"""
+
+import argparse
+import os
+import time
+
+import django
+import pandas
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "asx.settings")
+django.setup()
+
+from application.yfinance_adaptor import adaptors, downloader  # noqa: E402
+from data import models  # noqa: E402
+
+from benchmarks import synthetic  # noqa: E402
+from domain import queries  # noqa: E402
+
+
+def _read_values(codes: list[str]) -> pandas.DataFrame:
+    rows = pandas.DataFrame(
+        list(
+            models.PriceRecord.objects.filter(company_id__in=codes).values(
+                "timestamp", "company_id", "close"
+            )
+        )
+    )
+    rows["close"] = rows["close"].astype("float64")
+    panel = rows.pivot(index="timestamp", columns="company_id", values="close")
+    return panel.reindex(columns=codes).sort_index()
+
+
+def _read_panel(codes: list[str]) -> pandas.DataFrame:
+    return queries.get_price_panel(codes)["close"]
+
+
+READERS = {"values": _read_values, "copy_panel": _read_panel}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tickers", type=int, default=500)
+    parser.add_argument("--days", type=int, default=2520)
+    args = parser.parse_args()
+
+    codes = synthetic.synthetic_codes(args.tickers, prefix="BENCH")
+    industry, _ = models.IndustryGroup.objects.get_or_create(name="Benchmark")
+    models.Company.objects.bulk_create(
+        [
+            models.Company(trading_code=code, name=code, industry=industry)
+            for code in codes
+        ],
+        ignore_conflicts=True,
+    )
+    try:
+        dfs = downloader.handle_yf_dataframes(
+            synthetic.synthetic_yf_frame(codes, args.days),
+            [f"{code}.AX" for code in codes],
+        )
+        adaptors.PostGresCopyAdaptor.from_django_settings().export_model(
+            models.PriceRecord, dfs
+        )
+        del dfs
+        panels = {}
+        for name, reader in READERS.items():
+            start = time.perf_counter()
+            panels[name] = reader(codes)
+            elapsed = time.perf_counter() - start
+            print(f"{name:>12}: {panels[name].shape} panel in {elapsed:.2f}s")
+        values, panel = panels["values"], panels["copy_panel"]
+        assert values.shape == panel.shape
+        assert ((values.to_numpy() == panel.to_numpy()) | panel.isna().to_numpy()).all()
+    finally:
+        models.PriceRecord.objects.filter(company_id__in=codes).delete()
+        models.Company.objects.filter(trading_code__in=codes).delete()
+
+
+if __name__ == "__main__":
+    main()
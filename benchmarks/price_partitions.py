@@ -0,0 +1,118 @@
+"""
+Show the plans of common price queries against the partitioned
+`PriceRecord` table and an unpartitioned copy laid out as it was before
+migration 0009.
+
+    python -m benchmarks.price_partitions --tickers 200 --days 7500
+
+Runs against the database configured in `asx.settings`; the synthetic
+companies it creates, and the copy, are removed afterwards.
+"""
+
+import argparse
+import os
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "asx.settings")
+django.setup()
+
+from application.yfinance_adaptor import adaptors, downloader  # noqa: E402
+from data import models  # noqa: E402
+from django.db import connection, transaction  # noqa: E402
+
+from benchmarks import synthetic  # noqa: E402
+from domain import partitions  # noqa: E402
+
+UNPARTITIONED_TABLE = "benchmark_unpartitioned_pricerecord"
+
+QUERIES = {
+    "recent range": (
+        "SELECT count(*), avg(close) FROM {table} WHERE timestamp >= %(recent)s"
+    ),
+    "close series": (
+        "SELECT timestamp, close FROM {table} "
+        "WHERE company_id = %(code)s ORDER BY timestamp"
+    ),
+    "refresh delete": (
+        "DELETE FROM {table} "
+        "WHERE company_id = ANY(%(codes)s) AND timestamp >= %(recent)s"
+    ),
+}
+
+
+class _Rollback(Exception):
+    pass
+
+
+def explain(sql: str, params: dict) -> list[str]:
+    """`EXPLAIN ANALYZE` `sql`, rolling back what it changed"""
+    plan = []
+    try:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS, COSTS OFF) {sql}", params)
+            plan = [line for line, in cursor.fetchall()]
+            raise _Rollback
+    except _Rollback:
+        pass
+    return plan
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tickers", type=int, default=200)
+    parser.add_argument("--days", type=int, default=7500)
+    args = parser.parse_args()
+
+    codes = synthetic.synthetic_codes(args.tickers, prefix="BENCH")
+    industry, _ = models.IndustryGroup.objects.get_or_create(name="Benchmark")
+    models.Company.objects.bulk_create(
+        [
+            models.Company(trading_code=code, name=code, industry=industry)
+            for code in codes
+        ],
+        ignore_conflicts=True,
+    )
+    frame = synthetic.synthetic_yf_frame(codes, args.days)
+    partitions.ensure_partitions(range(frame.index[0].year, frame.index[-1].year + 1))
+    table = models.PriceRecord._meta.db_table
+    try:
+        adaptors.PostGresCopyAdaptor.from_django_settings().export_model(
+            models.PriceRecord,
+            downloader.handle_yf_dataframes(frame, [f"{code}.AX" for code in codes]),
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TABLE {UNPARTITIONED_TABLE} AS "
+                f'SELECT * FROM "{table}" WHERE company_id = ANY(%s)',
+                [codes],
+            )
+            cursor.execute(
+                f"CREATE UNIQUE INDEX ON {UNPARTITIONED_TABLE} (company_id, timestamp)"
+            )
+            cursor.execute(f"CREATE INDEX ON {UNPARTITIONED_TABLE} (company_id)")
+            # index only scans need an up to date visibility map
+            cursor.execute(f"VACUUM ANALYZE {UNPARTITIONED_TABLE}")
+            cursor.execute(f'VACUUM ANALYZE "{table}"')
+            cursor.execute(
+                f"SELECT max(timestamp) - interval '30 days' FROM {UNPARTITIONED_TABLE}"
+            )
+            (recent,) = cursor.fetchone()
+
+        params = {"recent": recent, "code": codes[0], "codes": codes[:10]}
+        for name, sql in QUERIES.items():
+            for label, table_name in (
+                ("before", UNPARTITIONED_TABLE),
+                ("after", f'"{table}"'),
+            ):
+                print(f"--- {name}, {label}")
+                print("\n".join(explain(sql.format(table=table_name), params)))
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {UNPARTITIONED_TABLE}")
+        models.PriceRecord.objects.filter(company_id__in=codes).delete()
+        models.Company.objects.filter(trading_code__in=codes).delete()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+import numpy
+import pandas
+
+FIELDS = ["Adj Close", "Close", "High", "Low", "Open", "Volume"]
+
+
+def synthetic_codes(n_tickers: int, prefix: str = "B") -> list[str]:
+    return [f"{prefix}{i:04d}" for i in range(n_tickers)]
+
+
+def synthetic_yf_frame(
+    tickers: list[str],
+    n_days: int,
+    start: str = "1990-01-01",
+    nan_ratio: float = 0.01,
+    seed: int = 0,
+) -> pandas.DataFrame:
+    """
+    Build a frame shaped like `yf.download(..., group_by="column")` output:
+    business-day index, `(field, ticker)` MultiIndex columns, a random walk
+    for prices and a sprinkle of NaN rows.
+    """
+    rng = numpy.random.default_rng(seed)
+    index = pandas.bdate_range(start=start, periods=n_days, name="Date")
+    n_tickers = len(tickers)
+    shape = (n_days, n_tickers)
+
+    close = 10 * numpy.exp(numpy.cumsum(rng.normal(0, 0.01, shape), axis=0))
+    spread = numpy.abs(rng.normal(0, 0.005, shape)) * close
+    data = {
+        "Adj Close": close * 0.98,
+        "Close": close,
+        "High": close + spread,
+        "Low": close - spread,
+        "Open": close + rng.normal(0, 0.002, shape) * close,
+        "Volume": rng.integers(1_000, 1_000_000, shape).astype("float64"),
+    }
+    missing = rng.random(shape) < nan_ratio
+    for values in data.values():
+        values[missing] = numpy.nan
+
+    columns = pandas.MultiIndex.from_product(
+        [FIELDS, [f"{ticker}.AX" for ticker in tickers]]
+    )
+    values = numpy.concatenate([data[field] for field in FIELDS], axis=1)
+    return pandas.DataFrame(values, index=index, columns=columns)
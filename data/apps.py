@@ -2,5 +2,5 @@ from django.apps import AppConfig
 
 
 class DataConfig(AppConfig):
-    default_auto_field = 'django.db.models.BigAutoField'
-    name = 'data'
+    default_auto_field = "django.db.models.BigAutoField"
+    name = "data"
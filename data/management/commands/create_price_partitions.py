@@ -0,0 +1,38 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from domain import partitions
+
+
+class Command(BaseCommand):
+    help = (
+        "Create the yearly price partitions up to a few years ahead, and for "
+        "the prices that ended up in the default partition"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-a",
+            "--years-ahead",
+            type=int,
+            default=1,
+            help="Years after the current one to create partitions for",
+        )
+        parser.add_argument(
+            "-f",
+            "--from-year",
+            type=int,
+            help="First year to create partitions for. Default to the current year",
+        )
+
+    def handle(self, *args, **options) -> None:
+        this_year = datetime.date.today().year
+        years = set(
+            range(
+                options["from_year"] or this_year,
+                this_year + options["years_ahead"] + 1,
+            )
+        )
+        years.update(partitions.get_default_partition_years())
+        created = partitions.ensure_partitions(years)
+        print(f"Created partitions: {', '.join(created) or 'none'}")
@@ -0,0 +1,52 @@
+import time
+
+from application.yfinance_adaptor import adaptors, enums
+from django.core.management.base import BaseCommand
+from domain import intraday, queries
+
+
+class Command(BaseCommand):
+    help = "Download recent intraday bars and refresh their rollups"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-c",
+            "--codes",
+            type=str,
+            help="Trading codes to be updated. Default to all active codes",
+        )
+        parser.add_argument(
+            "-i",
+            "--interval",
+            type=str,
+            default=enums.Interval.ONE_MINUTE.value,
+            choices=[
+                interval
+                for interval in intraday.INTERVAL_MINUTES
+                if interval not in intraday.ROLLUP_BUCKETS
+            ],
+            help="Interval of the downloaded bars, coarser ones are rolled up",
+        )
+
+    def handle(self, *args, **options) -> None:
+        codes = (
+            list(
+                queries.get_listing_companies(active_only=True).values_list(
+                    "trading_code", flat=True
+                )
+            )
+            if options["codes"] is None
+            else options["codes"].split(",")
+        )
+        start = time.time()
+        report = intraday.update_intraday_prices(
+            adaptors.PostGresCopyAdaptor.from_django_settings(),
+            codes=codes,
+            interval=enums.Interval(options["interval"]),
+        )
+        print(
+            f"Bars inserted: {report.counts.inserted}, "
+            f"updated: {report.counts.updated}, "
+            f"unchanged: {report.counts.unchanged}"
+        )
+        print(f"Updated in {time.time() - start}s")
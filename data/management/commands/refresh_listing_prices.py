@@ -1,9 +1,22 @@
+import cProfile
+import datetime
+import logging
 import time
 
 from django.db import transaction
-from application.yfinance_adaptor import adaptors
-from django.core.management.base import BaseCommand
-from domain import operations, queries
+from application import price_store
+from application.yfinance_adaptor import adaptors, cache, downloader
+from django.core.management.base import BaseCommand, CommandError
+from domain import indicators, operations
+from utils import metrics as metrics_
+
+logger = logging.getLogger(__name__)
+
+
+LOADERS = {
+    "bulk_create": adaptors.PostGresDjangoAdaptor,
+    "copy": adaptors.PostGresCopyAdaptor,
+}
 
 
 class Command(BaseCommand):
@@ -16,18 +29,152 @@ class Command(BaseCommand):
             type=str,
             help="Trading codes to be updated. Default to all codes",
         )
+        parser.add_argument(
+            "-l",
+            "--loader",
+            type=str,
+            choices=sorted(LOADERS),
+            default="bulk_create",
+            help="How downloaded prices are written to the database",
+        )
+        parser.add_argument(
+            "-m",
+            "--mode",
+            type=str,
+            choices=[mode.value for mode in operations.PriceUpdateMode],
+            default=operations.PriceUpdateMode.REPLACE.value,
+            help="Replace the refetched window, or upsert only changed rows",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=None,
+            help="Download tickers in shards of this size. Default to "
+            f"{downloader.DEFAULT_BATCH_SIZE}",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=1,
+            help="Number of download workers",
+        )
+        parser.add_argument(
+            "--cache-dir",
+            type=str,
+            default=None,
+            help="Keep downloads in this directory and only fetch what is missing",
+        )
+        parser.add_argument(
+            "--cache-ttl",
+            type=float,
+            default=None,
+            help="Hours before a cached download is evicted",
+        )
+        parser.add_argument(
+            "--replay",
+            action="store_true",
+            help="Only use cached downloads, never call Yahoo (needs --cache-dir)",
+        )
+        parser.add_argument(
+            "--price-store",
+            type=str,
+            default=None,
+            help="Append the updated prices to the columnar price store here",
+        )
+        parser.add_argument(
+            "--indicators",
+            action="store_true",
+            help="Bring the cached technical indicators up to date",
+        )
+        parser.add_argument(
+            "--metrics-file",
+            type=str,
+            default=None,
+            help="Write the stage metrics here in the Prometheus text format",
+        )
+        parser.add_argument(
+            "--profile",
+            type=str,
+            default=None,
+            help="Write a cProfile dump of the run here, e.g. for snakeviz or "
+            "flameprof",
+        )
+
+    @staticmethod
+    def get_download_options(options) -> dict:
+        download_options = {"concurrency": options["concurrency"]}
+        if options["batch_size"] is not None:
+            download_options["batch_size"] = options["batch_size"]
+        if options["cache_dir"] is not None:
+            download_options["cache"] = cache.DownloadCache(
+                options["cache_dir"],
+                ttl=(
+                    None
+                    if options["cache_ttl"] is None
+                    else datetime.timedelta(hours=options["cache_ttl"])
+                ),
+                replay_only=options["replay"],
+            )
+        elif options["replay"]:
+            raise CommandError("--replay requires --cache-dir")
+        return download_options
 
     def handle(self, *args, **options) -> None:
+        metrics = metrics_.Metrics()
+        profiler = None
+        if options["profile"] is not None:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        try:
+            self.refresh(metrics, options)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                profiler.dump_stats(options["profile"])
+            metrics.log(logger)
+            if options["metrics_file"] is not None:
+                metrics.write_prometheus(options["metrics_file"])
+
+    def refresh(self, metrics: metrics_.Metrics, options) -> None:
         codes = (
             options["codes"]
             if options["codes"] is None
             else options["codes"].split(",")
         )
         start = time.time()
-        operations.refresh_asx_company_list()
-        operations.update_prices(
-            adaptors.PostGresDjangoAdaptor.from_django_settings(), codes=codes
+        with metrics.stage("listing"):
+            operations.refresh_asx_company_list()
+        download_options = self.get_download_options(options)
+        report = operations.update_prices(
+            LOADERS[options["loader"]].from_django_settings(),
+            codes=codes,
+            mode=operations.PriceUpdateMode(options["mode"]),
+            download_options=download_options or None,
+            metrics=metrics,
+        )
+        print(
+            f"Prices inserted: {report.counts.inserted}, "
+            f"updated: {report.counts.updated}, "
+            f"unchanged: {report.counts.unchanged}, "
+            f"deleted: {report.counts.deleted}, "
+            f"adjusted: {report.adjusted}"
         )
-        for company in queries.get_listing_companies(active_only=True):
-            operations.organise_active_periods(company)
+        with metrics.stage("active_periods") as stage:
+            stage.add(rows=operations.bulk_organise_active_periods(report.codes))
+        if options["price_store"] is not None:
+            with metrics.stage("price_store") as stage:
+                store = price_store.PriceStore(options["price_store"], writable=True)
+                rows = operations.sync_price_store(store, report.codes)
+                stage.add(rows=rows)
+            print(f"Price store rows synced: {rows}")
+        if options["indicators"]:
+            with metrics.stage("indicators") as stage:
+                counts = indicators.sync_indicators(
+                    adaptors.PostGresCopyAdaptor.from_django_settings(), report.codes
+                )
+                stage.add(rows=counts.inserted + counts.updated)
+            print(
+                f"Indicator values inserted: {counts.inserted}, "
+                f"updated: {counts.updated}"
+            )
         print(f"Updated in {time.time() - start}s")
@@ -0,0 +1,37 @@
+import time
+
+from application import price_store
+from data import models
+from django.core.management.base import BaseCommand
+from domain import operations
+
+
+class Command(BaseCommand):
+    help = "Build or bring up to date the columnar price store used by simulations"
+
+    def add_arguments(self, parser):
+        parser.add_argument("directory", type=str, help="Price store directory")
+        parser.add_argument(
+            "-c",
+            "--codes",
+            type=str,
+            help="Trading codes to be synced. Default to all codes",
+        )
+        parser.add_argument(
+            "--compact",
+            action="store_true",
+            help="Reclaim the space left behind by relocated codes afterwards",
+        )
+
+    def handle(self, *args, **options) -> None:
+        codes = (
+            models.Company.objects.values_list("trading_code", flat=True)
+            if options["codes"] is None
+            else options["codes"].split(",")
+        )
+        start = time.time()
+        store = price_store.PriceStore(options["directory"], writable=True)
+        rows = operations.sync_price_store(store, codes)
+        if options["compact"]:
+            store.compact()
+        print(f"Synced {rows} rows in {time.time() - start}s")
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("data", "0004_alter_pricerecord_unique_together"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="holdings",
+            name="company",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="holdings",
+                to="data.company",
+            ),
+        ),
+        migrations.AddField(
+            model_name="holdings",
+            name="quantity",
+            field=models.IntegerField(default=0),
+        ),
+    ]
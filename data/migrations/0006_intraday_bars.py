@@ -0,0 +1,85 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# narrow rows: 4 byte prices, no surrogate key. Partitions are created as
+# bars arrive, see `domain.intraday.ensure_partitions`.
+CREATE_INTRADAY_BAR = """
+CREATE TABLE data_intradaybar (
+    company_id varchar(10) NOT NULL
+        REFERENCES data_company (trading_code) DEFERRABLE INITIALLY DEFERRED,
+    timestamp timestamptz NOT NULL,
+    open real NOT NULL,
+    high real NOT NULL,
+    low real NOT NULL,
+    close real NOT NULL,
+    volume bigint NOT NULL,
+    PRIMARY KEY (company_id, timestamp)
+) PARTITION BY RANGE (timestamp);
+CREATE INDEX data_intradaybar_timestamp_brin
+    ON data_intradaybar USING brin (timestamp);
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("data", "0005_holdings_company_quantity"),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_INTRADAY_BAR, "DROP TABLE data_intradaybar"),
+        migrations.CreateModel(
+            name="IntradayBar",
+            fields=[
+                ("timestamp", models.DateTimeField(primary_key=True, serialize=False)),
+                ("open", models.FloatField()),
+                ("high", models.FloatField()),
+                ("low", models.FloatField()),
+                ("close", models.FloatField()),
+                ("volume", models.BigIntegerField()),
+            ],
+            options={
+                "db_table": "data_intradaybar",
+                "managed": False,
+            },
+        ),
+        migrations.CreateModel(
+            name="IntradayRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("interval", models.CharField(max_length=8)),
+                ("timestamp", models.DateTimeField()),
+                ("open", models.FloatField()),
+                ("high", models.FloatField()),
+                ("low", models.FloatField()),
+                ("close", models.FloatField()),
+                ("volume", models.BigIntegerField()),
+                (
+                    "company",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="intraday_rollups",
+                        to="data.company",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("company", "interval", "timestamp"),
+                        name="unique_intraday_rollup",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("data", "0006_intraday_bars"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="IndicatorState",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("indicator", models.CharField(max_length=32)),
+                ("timestamp", models.DateTimeField()),
+                ("state", models.JSONField()),
+                (
+                    "company",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="indicator_states",
+                        to="data.company",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("company", "indicator")},
+            },
+        ),
+        migrations.CreateModel(
+            name="IndicatorValue",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("indicator", models.CharField(max_length=32)),
+                ("timestamp", models.DateTimeField()),
+                ("value", models.FloatField()),
+                (
+                    "company",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="indicator_values",
+                        to="data.company",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("company", "indicator", "timestamp")},
+            },
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("data", "0007_indicators"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CorporateAction",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("timestamp", models.DateTimeField()),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[("dividend", "Dividend"), ("split", "Split")],
+                        max_length=16,
+                    ),
+                ),
+                ("value", models.FloatField()),
+                ("factor", models.FloatField(null=True)),
+                (
+                    "company",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="corporate_actions",
+                        to="data.company",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("company", "timestamp", "kind")},
+            },
+        ),
+    ]
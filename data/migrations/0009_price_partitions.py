@@ -0,0 +1,151 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:48
+
+import datetime
+
+import django.contrib.postgres.indexes
+import django.db.models.deletion
+from django.db import migrations, models
+
+PRICE_COLUMNS = "id, timestamp, low, high, open, close, adj_close, volume, company_id"
+
+# the partition key has to be part of the primary key; ids come from a plain
+# sequence as older servers don't support identity columns on partitioned
+# tables
+CREATE_PARTITIONED_PRICES = """
+CREATE TABLE data_pricerecord (
+    id bigint NOT NULL,
+    timestamp timestamptz NOT NULL,
+    low numeric(10, 3) NOT NULL,
+    high numeric(10, 3) NOT NULL,
+    open numeric(10, 3) NOT NULL,
+    close numeric(10, 3) NOT NULL,
+    adj_close numeric(10, 3),
+    volume integer NOT NULL,
+    company_id varchar(10) NOT NULL,
+    CONSTRAINT data_pricerecord_pkey PRIMARY KEY (id, timestamp)
+) PARTITION BY RANGE (timestamp);
+CREATE TABLE data_pricerecord_default PARTITION OF data_pricerecord DEFAULT;
+"""
+
+CREATE_UNPARTITIONED_PRICES = """
+CREATE TABLE data_pricerecord (
+    id bigint GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    timestamp timestamptz NOT NULL,
+    low numeric(10, 3) NOT NULL,
+    high numeric(10, 3) NOT NULL,
+    open numeric(10, 3) NOT NULL,
+    close numeric(10, 3) NOT NULL,
+    adj_close numeric(10, 3),
+    volume integer NOT NULL,
+    company_id varchar(10) NOT NULL
+);
+"""
+
+ADD_COMPANY_FOREIGN_KEY = """
+ALTER TABLE data_pricerecord
+    ADD CONSTRAINT data_pricerecord_company_id_85892379_fk_data_comp
+    FOREIGN KEY (company_id) REFERENCES data_company (trading_code)
+    DEFERRABLE INITIALLY DEFERRED;
+"""
+
+
+def _copy_prices(schema_editor, create: str) -> list[int]:
+    """
+    Move the prices into a new `data_pricerecord` made by `create`, returns
+    the UTC years the prices span.
+    """
+    execute = schema_editor.execute
+    execute("ALTER TABLE data_pricerecord RENAME TO data_pricerecord_old")
+    execute(
+        "ALTER TABLE data_pricerecord_old "
+        "RENAME CONSTRAINT data_pricerecord_pkey TO data_pricerecord_old_pkey"
+    )
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT DISTINCT extract(year FROM timestamp AT TIME ZONE 'UTC')::int "
+            "FROM data_pricerecord_old"
+        )
+        years = sorted(year for year, in cursor.fetchall())
+    execute(create)
+    return years
+
+
+def partition_prices(apps, schema_editor):
+    execute = schema_editor.execute
+    this_year = datetime.date.today().year
+    years = _copy_prices(schema_editor, CREATE_PARTITIONED_PRICES)
+    for year in range(min(years, default=this_year), this_year + 2):
+        execute(
+            f"CREATE TABLE data_pricerecord_y{year} PARTITION OF data_pricerecord "
+            f"FOR VALUES FROM ('{year}-01-01 00:00+00') "
+            f"TO ('{year + 1}-01-01 00:00+00')"
+        )
+    execute(
+        f"INSERT INTO data_pricerecord ({PRICE_COLUMNS}) "
+        f"SELECT {PRICE_COLUMNS} FROM data_pricerecord_old"
+    )
+    # dropping the old table drops its identity sequence too
+    execute("DROP TABLE data_pricerecord_old")
+    execute("CREATE SEQUENCE data_pricerecord_id_seq OWNED BY data_pricerecord.id")
+    execute(
+        "SELECT setval('data_pricerecord_id_seq', "
+        "coalesce((SELECT max(id) FROM data_pricerecord), 0) + 1, false)"
+    )
+    execute(
+        "ALTER TABLE data_pricerecord "
+        "ALTER COLUMN id SET DEFAULT nextval('data_pricerecord_id_seq')"
+    )
+    execute(ADD_COMPANY_FOREIGN_KEY)
+
+
+def unpartition_prices(apps, schema_editor):
+    execute = schema_editor.execute
+    _copy_prices(schema_editor, CREATE_UNPARTITIONED_PRICES)
+    execute(
+        f"INSERT INTO data_pricerecord ({PRICE_COLUMNS}) "
+        f"SELECT {PRICE_COLUMNS} FROM data_pricerecord_old"
+    )
+    execute("DROP TABLE data_pricerecord_old")
+    execute(
+        "SELECT setval(pg_get_serial_sequence('data_pricerecord', 'id'), "
+        "coalesce((SELECT max(id) FROM data_pricerecord), 0) + 1, false)"
+    )
+    execute(ADD_COMPANY_FOREIGN_KEY)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("data", "0008_corporate_actions"),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name="pricerecord",
+            unique_together=set(),
+        ),
+        migrations.AlterField(
+            model_name="pricerecord",
+            name="company",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="prices",
+                to="data.company",
+            ),
+        ),
+        migrations.RunPython(partition_prices, unpartition_prices),
+        migrations.AddIndex(
+            model_name="pricerecord",
+            index=django.contrib.postgres.indexes.BrinIndex(
+                fields=["timestamp"], name="price_record_timestamp_brin"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="pricerecord",
+            constraint=models.UniqueConstraint(
+                fields=("company", "timestamp"),
+                include=("close", "adj_close", "volume"),
+                name="unique_price_record",
+            ),
+        ),
+    ]
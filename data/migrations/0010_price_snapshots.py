@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("data", "0009_price_partitions"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PriceSnapshot",
+            fields=[
+                (
+                    "company",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="price_snapshot",
+                        serialize=False,
+                        to="data.company",
+                    ),
+                ),
+                ("timestamp", models.DateTimeField()),
+                ("low", models.DecimalField(decimal_places=3, max_digits=10)),
+                ("high", models.DecimalField(decimal_places=3, max_digits=10)),
+                ("open", models.DecimalField(decimal_places=3, max_digits=10)),
+                ("close", models.DecimalField(decimal_places=3, max_digits=10)),
+                (
+                    "adj_close",
+                    models.DecimalField(decimal_places=3, max_digits=10, null=True),
+                ),
+                ("volume", models.IntegerField()),
+                ("high_52w", models.DecimalField(decimal_places=3, max_digits=10)),
+                ("low_52w", models.DecimalField(decimal_places=3, max_digits=10)),
+                ("average_volume_20d", models.FloatField()),
+                ("return_1d", models.FloatField(null=True)),
+                ("return_5d", models.FloatField(null=True)),
+                ("return_21d", models.FloatField(null=True)),
+                ("return_63d", models.FloatField(null=True)),
+                ("return_252d", models.FloatField(null=True)),
+            ],
+        ),
+    ]
@@ -2,6 +2,7 @@ import datetime
 
 from django.contrib.postgres.constraints import ExclusionConstraint
 from django.contrib.postgres.fields import DateRangeField, RangeBoundary, RangeOperators
+from django.contrib.postgres.indexes import BrinIndex
 from django.db import models
 from utils import industrytime
 
@@ -40,8 +41,19 @@ class Company(models.Model):
 
     # queries
     def is_active_at(self, at: datetime.datetime | None = None) -> bool:
+        """
+        Checks prefetched `active_periods` if there are, so looping over
+        `prefetch_related("active_periods")` companies costs no extra queries.
+        """
         if at is None:
             at = industrytime.industry_midnight(datetime.datetime.now())
+        if "active_periods" in getattr(self, "_prefetched_objects_cache", {}):
+            at_date = ActivePeriod._meta.get_field("start_date").to_python(at)
+            return any(
+                period.start_date <= at_date
+                and (period.end_date is None or period.end_date >= at_date)
+                for period in self.active_periods.all()
+            )
         return self.active_periods.filter(
             (models.Q(end_date__isnull=True) | models.Q(end_date__gte=at)),
             start_date__lte=at,
@@ -77,8 +89,16 @@ class ActivePeriod(models.Model):
 
 
 class PriceRecord(models.Model):
+    """
+    Daily bars. The table is range partitioned by year on `timestamp` (see
+    migration 0009 and `domain.partitions`), its primary key being
+    `(id, timestamp)` in the database. `(company, timestamp)` is unique and
+    its index covers the close series, so reading it needs no table access.
+    """
+
+    # the covering index leads with the company, no separate index needed
     company = models.ForeignKey(
-        Company, on_delete=models.CASCADE, related_name="prices"
+        Company, on_delete=models.CASCADE, related_name="prices", db_index=False
     )
     timestamp = models.DateTimeField()
     low = models.DecimalField(decimal_places=3, max_digits=10)
@@ -89,7 +109,14 @@ class PriceRecord(models.Model):
     volume = models.IntegerField()
 
     class Meta:
-        unique_together = ("company", "timestamp")
+        constraints = [
+            models.UniqueConstraint(
+                fields=["company", "timestamp"],
+                include=["close", "adj_close", "volume"],
+                name="unique_price_record",
+            )
+        ]
+        indexes = [BrinIndex(fields=["timestamp"], name="price_record_timestamp_brin")]
 
 
 class Portfolio(models.Model):
@@ -100,5 +127,138 @@ class Holdings(models.Model):
     portfolio = models.ForeignKey(
         Portfolio, on_delete=models.CASCADE, related_name="holdings"
     )
+    company = models.ForeignKey(
+        Company, null=True, on_delete=models.CASCADE, related_name="holdings"
+    )
+    quantity = models.IntegerField(default=0)
     purchased_price = models.DecimalField(decimal_places=3, max_digits=10)
     purchased_at = models.DateTimeField()
+
+
+class IntradayBar(models.Model):
+    """
+    Raw intraday bars, at the finest interval downloaded. The table is range
+    partitioned by month on `timestamp` (see migration 0006) and keyed on
+    `(company, timestamp)`.
+    """
+
+    pk = models.CompositePrimaryKey("company", "timestamp")
+
+    company = models.ForeignKey(
+        Company, on_delete=models.CASCADE, related_name="intraday_bars"
+    )
+    timestamp = models.DateTimeField()
+    open = models.FloatField()
+    high = models.FloatField()
+    low = models.FloatField()
+    close = models.FloatField()
+    volume = models.BigIntegerField()
+
+    class Meta:
+        managed = False
+        db_table = "data_intradaybar"
+
+
+class IntradayRollup(models.Model):
+    """Intraday bars aggregated into coarser intervals, see `domain.intraday`"""
+
+    company = models.ForeignKey(
+        Company, on_delete=models.CASCADE, related_name="intraday_rollups"
+    )
+    interval = models.CharField(max_length=8)
+    timestamp = models.DateTimeField()
+    open = models.FloatField()
+    high = models.FloatField()
+    low = models.FloatField()
+    close = models.FloatField()
+    volume = models.BigIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["company", "interval", "timestamp"],
+                name="unique_intraday_rollup",
+            )
+        ]
+
+
+class IndicatorState(models.Model):
+    """Where an indicator of a company was last checkpointed, see `domain.indicators`"""
+
+    company = models.ForeignKey(
+        Company, on_delete=models.CASCADE, related_name="indicator_states"
+    )
+    indicator = models.CharField(max_length=32)
+    timestamp = models.DateTimeField()
+    state = models.JSONField()
+
+    class Meta:
+        unique_together = ("company", "indicator")
+
+
+class IndicatorValue(models.Model):
+    company = models.ForeignKey(
+        Company, on_delete=models.CASCADE, related_name="indicator_values"
+    )
+    indicator = models.CharField(max_length=32)
+    timestamp = models.DateTimeField()
+    value = models.FloatField()
+
+    class Meta:
+        unique_together = ("company", "indicator", "timestamp")
+
+
+class CorporateAction(models.Model):
+    """
+    Dividends and splits, by ex-date. `factor` is what the prices before the
+    ex-date are multiplied by to adjust for the action, see
+    `domain.adjustments`.
+    """
+
+    DIVIDEND = "dividend"
+    SPLIT = "split"
+    KINDS = [(DIVIDEND, "Dividend"), (SPLIT, "Split")]
+
+    company = models.ForeignKey(
+        Company, on_delete=models.CASCADE, related_name="corporate_actions"
+    )
+    timestamp = models.DateTimeField()
+    kind = models.CharField(max_length=16, choices=KINDS)
+    # the dividend per share or the split ratio
+    value = models.FloatField()
+    factor = models.FloatField(null=True)
+
+    class Meta:
+        unique_together = ("company", "timestamp", "kind")
+
+
+class PriceSnapshot(models.Model):
+    """
+    The latest bar of each company and statistics of the bars leading to it,
+    kept up to date by `update_prices`, see `domain.snapshots`. Returns are
+    of the adjusted close, over the given number of bars.
+    """
+
+    company = models.OneToOneField(
+        Company,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="price_snapshot",
+    )
+    timestamp = models.DateTimeField()
+    low = models.DecimalField(decimal_places=3, max_digits=10)
+    high = models.DecimalField(decimal_places=3, max_digits=10)
+    open = models.DecimalField(decimal_places=3, max_digits=10)
+    close = models.DecimalField(decimal_places=3, max_digits=10)
+    adj_close = models.DecimalField(decimal_places=3, max_digits=10, null=True)
+    volume = models.IntegerField()
+    # over the year up to `timestamp`
+    high_52w = models.DecimalField(decimal_places=3, max_digits=10)
+    low_52w = models.DecimalField(decimal_places=3, max_digits=10)
+    average_volume_20d = models.FloatField()
+    # missing without enough history
+    return_1d = models.FloatField(null=True)
+    return_5d = models.FloatField(null=True)
+    return_21d = models.FloatField(null=True)
+    return_63d = models.FloatField(null=True)
+    return_252d = models.FloatField(null=True)
@@ -1,9 +1,67 @@
-from celery import shared_task
-from domain import operations
+import dataclasses
 
-app = Celery("tasks", broker="pyamqp://guest@localhost//")
+import requests
+from application.yfinance_adaptor import adaptors, pipeline
+from celery import chord, group, shared_task
+from django.db import OperationalError
+from domain import operations, queries
+
+PRICE_BATCH_SIZE = 50
+
+
+@shared_task(
+    autoretry_for=(requests.RequestException, OperationalError, OSError),
+    retry_backoff=True,
+    max_retries=5,
+    # per worker, to stay under Yahoo's throttling
+    rate_limit="30/m",
+    acks_late=True,
+)
+def update_price_batch(codes: list[str], mode: str = "upsert") -> dict:
+    """
+    Download, normalise and load the prices of `codes`. Each batch is loaded
+    from its own watermarks in a transaction, so a retry or redelivery
+    does not duplicate anything.
+    """
+    report = operations.update_prices(
+        adaptors.PostGresCopyAdaptor.from_django_settings(),
+        codes=codes,
+        mode=operations.PriceUpdateMode(mode),
+    )
+    return {"codes": report.codes, "counts": dataclasses.asdict(report.counts)}
+
+
+@shared_task(autoretry_for=(OperationalError,), retry_backoff=True, max_retries=5)
+def organise_active_periods(results: list[dict]) -> dict:
+    counts = adaptors.LoadCounts()
+    codes = []
+    for result in results:
+        codes.extend(result["codes"])
+        counts += adaptors.LoadCounts(**result["counts"])
+    operations.bulk_organise_active_periods(codes)
+    return {"codes": len(codes), "counts": dataclasses.asdict(counts)}
 
 
 @shared_task
-def update_price(trading_code: str) -> None:
-    operations.update_price(trading_code)
+def refresh_prices(
+    codes: list[str] | None = None,
+    batch_size: int = PRICE_BATCH_SIZE,
+    mode: str = "upsert",
+) -> str:
+    """
+    Refresh the listing, then fan the active codes out to workers in batches
+    and organise active periods once all of them are loaded.
+    """
+    operations.refresh_asx_company_list()
+    active_codes = set(
+        queries.get_listing_companies(active_only=True).values_list(
+            "trading_code", flat=True
+        )
+    )
+    if codes is not None:
+        active_codes &= set(codes)
+    batches = pipeline.shard(sorted(active_codes), batch_size)
+    result = chord(group(update_price_batch.s(batch, mode=mode) for batch in batches))(
+        organise_active_periods.s()
+    )
+    return result.id
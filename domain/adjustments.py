@@ -0,0 +1,256 @@
+import datetime
+from typing import Iterable
+
+import pandas
+from data import models
+from django.db import connection, transaction
+from utils.query_budget import QueryBudget
+
+PRICE_TABLE = models.PriceRecord._meta.db_table
+ACTION_TABLE = models.CorporateAction._meta.db_table
+
+
+@transaction.atomic
+def ingest_actions(dfs: Iterable[pandas.DataFrame]) -> set[str]:
+    """
+    Store the new and changed actions of `normalise_yf_actions` frames,
+    returns the codes whose actions changed.
+    """
+    dfs = [df for df in dfs if len(df)]
+    if not dfs:
+        return set()
+    actions = pandas.concat(dfs, ignore_index=True).drop_duplicates(
+        ["company_id", "timestamp", "kind"], keep="last"
+    )
+    stored = {
+        (code, timestamp, kind): value
+        for code, timestamp, kind, value in models.CorporateAction.objects.filter(
+            company_id__in=actions["company_id"].unique().tolist()
+        ).values_list("company_id", "timestamp", "kind", "value")
+    }
+    changed = [
+        models.CorporateAction(
+            company_id=code, timestamp=timestamp, kind=kind, value=value
+        )
+        for code, timestamp, kind, value in actions.itertuples(index=False)
+        if stored.get((code, timestamp.to_pydatetime(), kind)) != value
+    ]
+    if changed:
+        models.CorporateAction.objects.bulk_create(
+            changed,
+            update_conflicts=True,
+            unique_fields=["company", "timestamp", "kind"],
+            update_fields=["value", "factor"],
+        )
+    return {action.company_id for action in changed}
+
+
+def compute_factors(codes: Iterable[str]) -> set[str]:
+    """
+    Fill in the factors of actions that have none yet, returns the codes
+    whose factors were filled in.
+
+    A dividend scales earlier prices by `1 - dividend / close` of the last
+    close before its ex-date, like Yahoo's adjusted close. Yahoo serves
+    closes and dividends already adjusted for splits, so splits leave the
+    factor at 1. Dividends without an earlier close, or larger than it, keep
+    no factor and are tried again next time.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE "{ACTION_TABLE}" a SET factor = CASE a.kind '
+            "WHEN %(split)s THEN 1.0 "
+            "ELSE 1.0 - a.value / NULLIF(previous.close, 0) END "
+            f'FROM "{ACTION_TABLE}" original '
+            "LEFT JOIN LATERAL (SELECT p.close::float8 AS close "
+            f'FROM "{PRICE_TABLE}" p '
+            "WHERE p.company_id = original.company_id "
+            "AND p.timestamp < original.timestamp "
+            "ORDER BY p.timestamp DESC LIMIT 1) previous ON true "
+            "WHERE original.id = a.id AND a.factor IS NULL "
+            "AND a.company_id = ANY(%(codes)s) "
+            "AND (a.kind = %(split)s OR a.value < previous.close) "
+            "RETURNING a.company_id",
+            {"codes": list(codes), "split": models.CorporateAction.SPLIT},
+        )
+        return {code for code, in cursor.fetchall()}
+
+
+def _periods(actions: pandas.DataFrame) -> pandas.DataFrame:
+    """
+    The periods before each ex-date of `actions`, a frame of `company_id`,
+    `timestamp` and `factor` sorted by both of the first, with the product
+    of the factors of every later action.
+    """
+    # actions sharing an ex-date make a single period
+    actions = (
+        actions.groupby(["company_id", "timestamp"], sort=True)["factor"]
+        .prod()
+        .reset_index()
+    )
+    by_company = actions.groupby("company_id", sort=False)
+    return pandas.DataFrame(
+        {
+            "company_id": actions["company_id"],
+            "start": by_company["timestamp"].shift(1),
+            "end": actions["timestamp"],
+            "factor": by_company["factor"].transform(
+                lambda factors: factors[::-1].cumprod()
+            ),
+        }
+    )
+
+
+def _as_datetimes(values: pandas.Series) -> list:
+    return [
+        None if pandas.isna(value) else pandas.Timestamp(value).to_pydatetime()
+        for value in values
+    ]
+
+
+def adjustment_periods(codes: Iterable[str]) -> pandas.DataFrame:
+    """
+    The adjustment factor of each company between consecutive ex-dates:
+    `company_id`, `start`, `end` (missing for open ends) and `factor`, the
+    product of the factors of every later action.
+    """
+    codes = sorted(codes)
+    actions = pandas.DataFrame(
+        list(
+            models.CorporateAction.objects.filter(company_id__in=codes)
+            .order_by("company_id", "timestamp")
+            .values_list("company_id", "timestamp", "factor")
+        ),
+        columns=["company_id", "timestamp", "factor"],
+    )
+    actions["factor"] = actions["factor"].astype("float64").fillna(1.0)
+    actions["timestamp"] = pandas.to_datetime(actions["timestamp"], utc=True)
+    before = _periods(actions)
+    after = pandas.DataFrame(
+        {
+            "company_id": codes,
+            "start": before.groupby("company_id")["end"]
+            .max()
+            .reindex(codes)
+            .to_numpy(),
+            "end": None,
+            "factor": 1.0,
+        }
+    )
+    return pandas.concat([before, after], ignore_index=True)
+
+
+def rescale_splits(codes: Iterable[str], since: datetime.datetime | None) -> set[str]:
+    """
+    Divide the stored prices before the ex-date of new splits, those without
+    a factor yet, by the split ratio, and multiply their volume by it. Yahoo
+    serves prices already adjusted for splits, so only the prices stored
+    before `since`, the start of the download, need it. Returns the codes
+    whose prices were rescaled.
+    """
+    if since is None:
+        return set()
+    splits = pandas.DataFrame(
+        list(
+            models.CorporateAction.objects.filter(
+                company_id__in=sorted(codes),
+                kind=models.CorporateAction.SPLIT,
+                factor__isnull=True,
+            )
+            .order_by("company_id", "timestamp")
+            .values_list("company_id", "timestamp", "value")
+        ),
+        columns=["company_id", "timestamp", "factor"],
+    )
+    if splits.empty:
+        return set()
+    splits["factor"] = 1.0 / splits["factor"]
+    periods = _periods(splits)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'WITH rescaled AS (UPDATE "{PRICE_TABLE}" p SET '
+            + ", ".join(
+                f"{field} = round((p.{field} * a.factor)::numeric, 3)"
+                for field in ("low", "high", "open", "close")
+            )
+            + ", volume = round(p.volume / a.factor) "
+            "FROM unnest(%(codes)s::varchar[], %(starts)s::timestamptz[], "
+            "%(ends)s::timestamptz[], %(factors)s::float8[]) "
+            'a(code, start, "end", factor) '
+            "WHERE p.company_id = a.code "
+            "AND p.timestamp >= coalesce(a.start, '-infinity') "
+            'AND p.timestamp < a."end" AND p.timestamp < %(since)s '
+            "RETURNING p.company_id) "
+            "SELECT DISTINCT company_id FROM rescaled",
+            {
+                "codes": periods["company_id"].tolist(),
+                "starts": _as_datetimes(periods["start"]),
+                "ends": _as_datetimes(periods["end"]),
+                "factors": periods["factor"].tolist(),
+                "since": since,
+            },
+        )
+        return {code for code, in cursor.fetchall()}
+
+
+def apply_adjustments(
+    codes: Iterable[str], since: datetime.datetime | None = None
+) -> int:
+    """
+    Recompute `adj_close` from `close` and the adjustment factors, for the
+    prices from `since` on. Returns the number of prices changed.
+    """
+    periods = adjustment_periods(codes)
+    if periods.empty:
+        return 0
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE "{PRICE_TABLE}" p '
+            "SET adj_close = round((p.close * a.factor)::numeric, 3) "
+            "FROM unnest(%(codes)s::varchar[], %(starts)s::timestamptz[], "
+            "%(ends)s::timestamptz[], %(factors)s::float8[]) "
+            'a(code, start, "end", factor) '
+            "WHERE p.company_id = a.code "
+            "AND p.timestamp >= coalesce(a.start, '-infinity') "
+            "AND p.timestamp < coalesce(a.\"end\", 'infinity') "
+            "AND p.timestamp >= coalesce(%(since)s::timestamptz, '-infinity') "
+            "AND p.adj_close IS DISTINCT FROM "
+            "round((p.close * a.factor)::numeric, 3)",
+            {
+                "codes": periods["company_id"].tolist(),
+                "starts": _as_datetimes(periods["start"]),
+                "ends": _as_datetimes(periods["end"]),
+                "factors": periods["factor"].tolist(),
+                "since": since,
+            },
+        )
+        return cursor.rowcount
+
+
+@QueryBudget(15)
+@transaction.atomic
+def update_adjustments(
+    codes: Iterable[str],
+    actions: Iterable[pandas.DataFrame] = (),
+    since: datetime.datetime | None = None,
+) -> int:
+    """
+    Store downloaded `actions` and bring `adj_close` up to date: the whole
+    history of companies with new or changed actions is adjusted again, the
+    others only from `since`, the start of their download. Prices stored
+    before a new split are rescaled by its ratio first, and the indicators
+    of their companies computed again from scratch.
+    """
+    codes = set(codes)
+    changed = ingest_actions(actions)
+    rescaled = rescale_splits(codes | changed, since)
+    if rescaled:
+        # indicator checkpoints carry state from the prices before rescaling
+        models.IndicatorValue.objects.filter(company_id__in=rescaled).delete()
+        models.IndicatorState.objects.filter(company_id__in=rescaled).delete()
+    changed |= compute_factors(codes | changed)
+    adjusted = apply_adjustments(changed) if changed else 0
+    if codes - changed:
+        adjusted += apply_adjustments(codes - changed, since)
+    return adjusted
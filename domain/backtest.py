@@ -0,0 +1,156 @@
+import dataclasses
+
+import numpy
+import pandas
+from application import price_store
+from application.rates.commsec import SettleToBank, SettleWithCDIA
+from application.rates.commsec.data_models import CostSchema
+from data import models
+from django.db import transaction
+
+
+@dataclasses.dataclass
+class BacktestResult:
+    # per date
+    equity: pandas.Series
+    cash: pandas.Series
+    # per rebalance date
+    positions: pandas.DataFrame
+    turnover: pandas.Series
+    costs: pandas.Series
+
+    @property
+    def returns(self) -> pandas.Series:
+        return self.equity.pct_change().fillna(0.0)
+
+
+def load_closes(
+    store: price_store.PriceStore,
+    codes: list[str],
+    start=None,
+    end=None,
+    field: str = "close",
+) -> pandas.DataFrame:
+    """Dates x codes panel of `field` read from the columnar price store"""
+    columns = {}
+    for code in codes:
+        series = store.get_series(code, start, end)
+        columns[code] = pandas.Series(
+            getattr(series, field),
+            index=pandas.DatetimeIndex(series.datetimes).tz_localize("UTC"),
+        )
+    return pandas.DataFrame(columns).sort_index()
+
+
+def weights_from_signals(signals: pandas.DataFrame) -> pandas.DataFrame:
+    """Equal weights over the tickers with a positive signal on each date"""
+    held = signals.gt(0)
+    counts = held.sum(axis=1)
+    return held.div(counts.where(counts > 0), axis=0).fillna(0.0)
+
+
+def backtest(
+    closes: pandas.DataFrame,
+    weights: pandas.DataFrame,
+    initial_cash: float = 100_000,
+    buy_costs: CostSchema = SettleWithCDIA,
+    sell_costs: CostSchema = SettleToBank,
+) -> BacktestResult:
+    """
+    Rebalance to the target `weights` of equity on each date of its index,
+    trading whole shares at that day's close. Buys are charged `buy_costs`
+    and sells `sell_costs`, per trade; the brokerage is paid out of cash.
+
+    Tickers without a close on a rebalance date are not traded, and are
+    valued at their last close in between. Only rebalance dates are looped
+    over, everything else is vectorised over dates and tickers.
+    """
+    weights = weights.sort_index().reindex(columns=closes.columns).fillna(0.0)
+    rebalance_rows = closes.index.get_indexer(weights.index)
+    if (rebalance_rows < 0).any():
+        missing = weights.index[rebalance_rows < 0]
+        raise ValueError(f"No closes for rebalance dates: {list(missing)}")
+
+    prices = closes.to_numpy(dtype="float64")
+    valuation = closes.ffill().fillna(0.0).to_numpy(dtype="float64")
+    targets = weights.to_numpy(dtype="float64")
+    n_dates, n_tickers = prices.shape
+
+    equity = numpy.full(n_dates, float(initial_cash))
+    cash_by_date = numpy.full(n_dates, float(initial_cash))
+    positions = numpy.zeros((len(rebalance_rows), n_tickers))
+    traded = numpy.zeros(len(rebalance_rows))
+    costs = numpy.zeros(len(rebalance_rows))
+    rebalance_equity = numpy.zeros(len(rebalance_rows))
+
+    cash = float(initial_cash)
+    shares = numpy.zeros(n_tickers)
+    ends = list(rebalance_rows[1:]) + [n_dates]
+    for i, (row, end) in enumerate(zip(rebalance_rows, ends)):
+        price = prices[row]
+        tradable = price > 0
+        safe_price = numpy.where(tradable, price, 1.0)
+        value = cash + shares @ valuation[row]
+
+        wanted = numpy.where(
+            tradable, numpy.floor(targets[i] * value / safe_price), shares
+        )
+        delta = wanted - shares
+        trade_values = numpy.abs(delta) * safe_price
+        cost = (
+            buy_costs.total_many(trade_values[delta > 0]).sum()
+            + sell_costs.total_many(trade_values[delta < 0]).sum()
+        )
+        cash -= delta @ safe_price + cost
+        shares = wanted
+
+        rebalance_equity[i] = value
+        traded[i] = trade_values.sum()
+        costs[i] = cost
+        positions[i] = shares
+        equity[row:end] = cash + valuation[row:end] @ shares
+        cash_by_date[row:end] = cash
+
+    rebalance_dates = closes.index[rebalance_rows]
+    return BacktestResult(
+        equity=pandas.Series(equity, index=closes.index),
+        cash=pandas.Series(cash_by_date, index=closes.index),
+        positions=pandas.DataFrame(
+            positions, index=rebalance_dates, columns=closes.columns
+        ),
+        turnover=pandas.Series(
+            numpy.divide(
+                traded,
+                rebalance_equity,
+                out=numpy.zeros_like(traded),
+                where=rebalance_equity > 0,
+            ),
+            index=rebalance_dates,
+        ),
+        costs=pandas.Series(costs, index=rebalance_dates),
+    )
+
+
+@transaction.atomic
+def save_portfolio(
+    name: str, result: BacktestResult, closes: pandas.DataFrame
+) -> models.Portfolio:
+    """Replace the holdings of portfolio `name` with the final backtest positions"""
+    portfolio, _ = models.Portfolio.objects.get_or_create(name=name)
+    portfolio.holdings.all().delete()
+    if result.positions.empty:
+        return portfolio
+
+    purchased_at = result.positions.index[-1]
+    final = result.positions.iloc[-1]
+    models.Holdings.objects.bulk_create(
+        models.Holdings(
+            portfolio=portfolio,
+            company_id=code,
+            quantity=int(quantity),
+            purchased_price=round(closes.at[purchased_at, code], 3),
+            purchased_at=purchased_at,
+        )
+        for code, quantity in final[final > 0].items()
+    )
+    return portfolio
@@ -0,0 +1,287 @@
+import abc
+import datetime
+from typing import Callable, Iterable
+
+import numpy
+import pandas
+from application.yfinance_adaptor import adaptors
+from data import models
+from django.db import transaction
+
+from domain import operations, queries
+
+Bars = dict[str, numpy.ndarray]
+# state after the i-th bar of a computation, to carry on from later
+StateAt = Callable[[int], dict]
+
+
+def _tail(values: numpy.ndarray, end: int, size: int) -> list[float]:
+    return values[max(end - size, 0) : end].tolist() if size else []
+
+
+def _ewm(values: numpy.ndarray, alpha: float, seed: float | None) -> numpy.ndarray:
+    """Recursive exponential average, continuing from `seed` if given"""
+    if seed is None:
+        return pandas.Series(values).ewm(alpha=alpha, adjust=False).mean().to_numpy()
+    seeded = pandas.Series(numpy.concatenate([[seed], values]))
+    return seeded.ewm(alpha=alpha, adjust=False).mean().to_numpy()[1:]
+
+
+class Indicator(abc.ABC):
+    name: str
+
+    def __init__(self, window: int) -> None:
+        self.window = window
+
+    @property
+    def key(self) -> str:
+        return f"{self.name}_{self.window}"
+
+    @abc.abstractmethod
+    def compute(self, bars: Bars, state: dict | None) -> tuple[numpy.ndarray, StateAt]:
+        """
+        Values for each of `bars`, carrying on from `state`, the state after
+        the bar preceding them, or from scratch without one.
+        """
+        ...
+
+
+class SMA(Indicator):
+    name = "sma"
+
+    def compute(self, bars: Bars, state: dict | None) -> tuple[numpy.ndarray, StateAt]:
+        tail = state["closes"] if state else []
+        closes = numpy.concatenate([tail, bars["close"]])
+        sums = numpy.cumsum(numpy.concatenate([[0.0], closes]))
+        means = numpy.full(len(closes), numpy.nan)
+        means[self.window - 1 :] = (sums[self.window :] - sums[: -self.window]) / (
+            self.window
+        )
+
+        def state_at(i: int) -> dict:
+            return {"closes": _tail(closes, len(tail) + i + 1, self.window - 1)}
+
+        return means[len(tail) :], state_at
+
+
+class EMA(Indicator):
+    name = "ema"
+
+    def compute(self, bars: Bars, state: dict | None) -> tuple[numpy.ndarray, StateAt]:
+        ema = _ewm(bars["close"], 2 / (self.window + 1), state and state["ema"])
+        return ema, lambda i: {"ema": float(ema[i])}
+
+
+class RSI(Indicator):
+    """Wilder's relative strength index"""
+
+    name = "rsi"
+
+    def compute(self, bars: Bars, state: dict | None) -> tuple[numpy.ndarray, StateAt]:
+        closes = bars["close"]
+        previous = [state["close"]] if state else closes[:1]
+        changes = numpy.diff(closes, prepend=previous)
+        alpha = 1 / self.window
+        gains = _ewm(numpy.clip(changes, 0, None), alpha, state and state["gain"])
+        losses = _ewm(numpy.clip(-changes, 0, None), alpha, state and state["loss"])
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            rsi = numpy.where(losses > 0, 100 - 100 / (1 + gains / losses), 100.0)
+        rsi[(gains == 0) & (losses == 0)] = 50.0
+        if not state:
+            # no change to measure on the very first bar
+            rsi[0] = numpy.nan
+
+        def state_at(i: int) -> dict:
+            return {
+                "close": float(closes[i]),
+                "gain": float(gains[i]),
+                "loss": float(losses[i]),
+            }
+
+        return rsi, state_at
+
+
+class ATR(Indicator):
+    """Average true range, with Wilder's smoothing"""
+
+    name = "atr"
+
+    def compute(self, bars: Bars, state: dict | None) -> tuple[numpy.ndarray, StateAt]:
+        high, low, closes = bars["high"], bars["low"], bars["close"]
+        previous = numpy.concatenate(
+            [[state["close"]] if state else [numpy.nan], closes[:-1]]
+        )
+        true_range = numpy.fmax(
+            high - low,
+            numpy.fmax(numpy.abs(high - previous), numpy.abs(low - previous)),
+        )
+        atr = _ewm(true_range, 1 / self.window, state and state["atr"])
+        return atr, lambda i: {"close": float(closes[i]), "atr": float(atr[i])}
+
+
+class Volatility(Indicator):
+    """Annualised standard deviation of daily log returns"""
+
+    name = "volatility"
+
+    def compute(self, bars: Bars, state: dict | None) -> tuple[numpy.ndarray, StateAt]:
+        tail = state["closes"] if state else []
+        closes = numpy.concatenate([tail, bars["close"]])
+        returns = pandas.Series(numpy.diff(numpy.log(closes), prepend=numpy.nan))
+        volatility = returns.rolling(self.window).std().to_numpy() * numpy.sqrt(252)
+
+        def state_at(i: int) -> dict:
+            return {"closes": _tail(closes, len(tail) + i + 1, self.window)}
+
+        return volatility[len(tail) :], state_at
+
+
+DEFAULT_INDICATORS = [SMA(20), SMA(50), EMA(20), RSI(14), ATR(14), Volatility(20)]
+# indicator values saved per transaction
+SYNC_CHUNK_ROWS = 100_000
+
+
+def _as_timestamps(values: numpy.ndarray) -> pandas.DatetimeIndex:
+    return pandas.DatetimeIndex(values.astype("datetime64[ns]")).tz_localize("UTC")
+
+
+def _compute_code(
+    code: str,
+    bars: Bars,
+    states: dict[tuple[str, str], models.IndicatorState],
+    indicators: list[Indicator],
+) -> tuple[list[pandas.DataFrame], list[models.IndicatorState]]:
+    """New values of a company's indicators and their next checkpoints"""
+    cutoff = (
+        pandas.Timestamp(int(bars["timestamp"][-1]), tz="UTC")
+        - operations.PRICE_REVISION_WINDOW
+    )
+    frames, checkpoints = [], []
+    for indicator in indicators:
+        state = states.get((code, indicator.key))
+        start = 0
+        if state is not None:
+            start = int(
+                bars["timestamp"].searchsorted(
+                    pandas.Timestamp(state.timestamp).value, side="right"
+                )
+            )
+        new_bars = {field: values[start:] for field, values in bars.items()}
+        if not len(new_bars["timestamp"]):
+            continue
+        values, state_at = indicator.compute(new_bars, state and state.state)
+        timestamps = _as_timestamps(new_bars["timestamp"])
+        checkpoint = int(timestamps.searchsorted(cutoff, side="right")) - 1
+        if checkpoint >= 0:
+            checkpoints.append(
+                models.IndicatorState(
+                    company_id=code,
+                    indicator=indicator.key,
+                    timestamp=timestamps[checkpoint].to_pydatetime(),
+                    state=state_at(checkpoint),
+                )
+            )
+        valid = ~numpy.isnan(values)
+        frames.append(
+            pandas.DataFrame(
+                {
+                    "company_id": code,
+                    "indicator": indicator.key,
+                    "timestamp": timestamps[valid],
+                    "value": values[valid],
+                }
+            )
+        )
+    return frames, checkpoints
+
+
+def sync_indicators(
+    adaptor: adaptors.Adaptor,
+    codes: Iterable[str],
+    indicators: list[Indicator] = DEFAULT_INDICATORS,
+    chunk_rows: int = SYNC_CHUNK_ROWS,
+) -> adaptors.LoadCounts:
+    """
+    Compute the indicators of the price records added since each company's
+    checkpoint, from the state saved there. Checkpoints are placed before the
+    revision window of `update_prices`, so revised prices are picked up by
+    the next sync.
+
+    Values are saved for about `chunk_rows` at a time, each chunk committed
+    along with the checkpoints of its companies, so that a failure only
+    loses the chunk it happened in.
+    """
+    codes = sorted(codes)
+    keys = [indicator.key for indicator in indicators]
+    states = {
+        (state.company_id, state.indicator): state
+        for state in models.IndicatorState.objects.filter(
+            company_id__in=codes, indicator__in=keys
+        )
+    }
+    # read each company's prices from its earliest checkpoint
+    batches = {}
+    for code in codes:
+        checkpoints = [states.get((code, key)) for key in keys]
+        since = (
+            None
+            if None in checkpoints
+            else min(state.timestamp for state in checkpoints)
+        )
+        batches.setdefault(since, []).append(code)
+
+    counts = adaptors.LoadCounts()
+    frames, checkpoints = [], []
+
+    def save() -> None:
+        nonlocal counts
+        with transaction.atomic():
+            counts += adaptor.upsert_model(
+                models.IndicatorValue,
+                frames,
+                unique_fields=("company", "indicator", "timestamp"),
+            )
+            if checkpoints:
+                models.IndicatorState.objects.bulk_create(
+                    checkpoints,
+                    update_conflicts=True,
+                    unique_fields=["company", "indicator"],
+                    update_fields=["timestamp", "state"],
+                )
+        frames.clear()
+        checkpoints.clear()
+
+    for since, batch_codes in batches.items():
+        for code, bars in queries.iter_price_columns(batch_codes, since=since):
+            code_frames, code_checkpoints = _compute_code(
+                code, bars, states, indicators
+            )
+            frames.extend(code_frames)
+            checkpoints.extend(code_checkpoints)
+            if sum(len(df) for df in frames) >= chunk_rows:
+                save()
+    if frames or checkpoints:
+        save()
+    return counts
+
+
+def get_indicator_panel(
+    codes: list[str],
+    indicator: str,
+    start: datetime.datetime | None = None,
+    end: datetime.datetime | None = None,
+) -> pandas.DataFrame:
+    """Dates x codes panel of one indicator, NaN where a code has no value"""
+    queryset = models.IndicatorValue.objects.filter(
+        company_id__in=codes, indicator=indicator
+    )
+    if start is not None:
+        queryset = queryset.filter(timestamp__gte=start)
+    if end is not None:
+        queryset = queryset.filter(timestamp__lt=end)
+    rows = pandas.DataFrame(
+        list(queryset.values_list("timestamp", "company_id", "value")),
+        columns=["timestamp", "company_id", "value"],
+    )
+    panel = rows.pivot(index="timestamp", columns="company_id", values="value")
+    return panel.reindex(columns=codes).sort_index()
@@ -0,0 +1,200 @@
+import datetime
+from typing import Iterable
+
+import pandas
+from application import yfinance_adaptor
+from application.yfinance_adaptor import adaptors, enums
+from data import models
+from django.db import connection, transaction
+from django.db.models import QuerySet
+from utils import industrytime
+
+from domain import operations
+
+RAW_TABLE = models.IntradayBar._meta.db_table
+ROLLUP_TABLE = models.IntradayRollup._meta.db_table
+# Yahoo only serves 1 minute bars for the last week
+INTRADAY_HISTORY = datetime.timedelta(days=7)
+# raw bars loaded and rolled up per transaction
+LOAD_CHUNK_ROWS = 100_000
+
+INTERVAL_MINUTES = {
+    "1m": 1,
+    "2m": 2,
+    "5m": 5,
+    "15m": 15,
+    "30m": 30,
+    "60m": 60,
+    "90m": 90,
+    "1h": 60,
+    "1d": 24 * 60,
+}
+# rollup interval -> the bucket a timestamp `{column}` falls into. Each
+# rollup is aggregated from the previous one, the first from the raw bars.
+ROLLUP_BUCKETS = {
+    "5m": "date_bin('5 minutes', {column}, TIMESTAMPTZ '2000-01-01')",
+    "15m": "date_bin('15 minutes', {column}, TIMESTAMPTZ '2000-01-01')",
+    "1h": "date_bin('1 hour', {column}, TIMESTAMPTZ '2000-01-01')",
+    "1d": f"date_trunc('day', {{column}}, '{industrytime.INDUSTRY_TIMEZONE.zone}')",
+}
+
+
+def partition_name(month: datetime.date) -> str:
+    return f"{RAW_TABLE}_p{month:%Y%m}"
+
+
+def ensure_partitions(start: datetime.datetime, end: datetime.datetime) -> None:
+    """Create the monthly partitions of the raw bars covering `start` -> `end`"""
+    months = pandas.date_range(
+        pandas.Timestamp(start)
+        .tz_convert("UTC")
+        .tz_localize(None)
+        .to_period("M")
+        .start_time,
+        pandas.Timestamp(end).tz_convert("UTC").tz_localize(None),
+        freq="MS",
+    )
+    with connection.cursor() as cursor:
+        for month in months:
+            cursor.execute(
+                f'CREATE TABLE IF NOT EXISTS "{partition_name(month)}" '
+                f'PARTITION OF "{RAW_TABLE}" FOR VALUES FROM (%s) TO (%s)',
+                [
+                    month.tz_localize("UTC").to_pydatetime(),
+                    (month + pandas.offsets.MonthBegin())
+                    .tz_localize("UTC")
+                    .to_pydatetime(),
+                ],
+            )
+
+
+def _rollup_sql(interval: str, source: str | None) -> str:
+    bucket = ROLLUP_BUCKETS[interval]
+    if source is None:
+        bars = f'SELECT * FROM "{RAW_TABLE}"'
+    else:
+        bars = (
+            "SELECT company_id, timestamp, open, high, low, close, volume "
+            f'FROM "{ROLLUP_TABLE}" WHERE interval = %(source)s'
+        )
+    values = ("open", "high", "low", "close", "volume")
+    return (
+        f'INSERT INTO "{ROLLUP_TABLE}" '
+        "(company_id, interval, timestamp, open, high, low, close, volume) "
+        "SELECT company_id, %(interval)s, bucket, "
+        "(array_agg(open ORDER BY timestamp))[1], max(high), min(low), "
+        "(array_agg(close ORDER BY timestamp DESC))[1], sum(volume) "
+        f"FROM (SELECT *, {bucket.format(column='timestamp')} AS bucket "
+        f"FROM ({bars}) source "
+        "WHERE company_id = ANY(%(codes)s) "
+        f"AND timestamp >= {bucket.format(column='%(start)s::timestamptz')} "
+        "AND timestamp < %(end)s) bars "
+        "GROUP BY company_id, bucket "
+        "ON CONFLICT (company_id, interval, timestamp) DO UPDATE SET "
+        + ", ".join(f"{value} = EXCLUDED.{value}" for value in values)
+        + f' WHERE ("{ROLLUP_TABLE}".open, "{ROLLUP_TABLE}".high, '
+        f'"{ROLLUP_TABLE}".low, "{ROLLUP_TABLE}".close, "{ROLLUP_TABLE}".volume) '
+        "IS DISTINCT FROM (EXCLUDED.open, EXCLUDED.high, EXCLUDED.low, "
+        "EXCLUDED.close, EXCLUDED.volume)"
+    )
+
+
+@transaction.atomic
+def rollup(
+    codes: Iterable[str],
+    start: datetime.datetime,
+    end: datetime.datetime,
+    raw_interval: str = enums.Interval.ONE_MINUTE.value,
+) -> dict[str, int]:
+    """
+    Materialise the rollups of the raw bars from `start` to `end`. Every
+    bucket touching the range is aggregated again in full, so rolling up
+    after each load keeps them current without reading older bars. Returns
+    the number of rollup rows written per interval.
+    """
+    params = {"codes": list(codes), "start": start, "end": end, "source": None}
+    written = {}
+    with connection.cursor() as cursor:
+        for interval in ROLLUP_BUCKETS:
+            if INTERVAL_MINUTES[interval] <= INTERVAL_MINUTES[raw_interval]:
+                continue
+            cursor.execute(
+                _rollup_sql(interval, params["source"]),
+                {**params, "interval": interval},
+            )
+            written[interval] = cursor.rowcount
+            params["source"] = interval
+    return written
+
+
+def get_bars(
+    code: str,
+    interval: str,
+    start: datetime.datetime | None = None,
+    end: datetime.datetime | None = None,
+) -> QuerySet:
+    """Bars of `code` at `interval`, from the rollups unless it is the raw one"""
+    if interval in ROLLUP_BUCKETS:
+        queryset = models.IntradayRollup.objects.filter(interval=interval)
+    else:
+        queryset = models.IntradayBar.objects.all()
+    queryset = queryset.filter(company_id=code)
+    if start is not None:
+        queryset = queryset.filter(timestamp__gte=start)
+    if end is not None:
+        queryset = queryset.filter(timestamp__lt=end)
+    return queryset.order_by("timestamp")
+
+
+@transaction.atomic
+def _load_chunk(
+    adaptor: adaptors.Adaptor, dfs: list[pandas.DataFrame], raw_interval: str
+) -> adaptors.LoadCounts:
+    start = min(df["timestamp"].iloc[0] for df in dfs)
+    end = max(df["timestamp"].iloc[-1] for df in dfs)
+    codes = [df["company_id"].iloc[0] for df in dfs]
+    ensure_partitions(start, end)
+    counts = adaptor.upsert_model(
+        models.IntradayBar, dfs, unique_fields=("company", "timestamp")
+    )
+    rollup(codes, start, end + datetime.timedelta(minutes=1), raw_interval)
+    return counts
+
+
+def load_bars(
+    adaptor: adaptors.Adaptor,
+    dfs: Iterable[pandas.DataFrame],
+    raw_interval: str = enums.Interval.ONE_MINUTE.value,
+    chunk_rows: int = LOAD_CHUNK_ROWS,
+) -> adaptors.LoadCounts:
+    """
+    Upsert normalised intraday frames and roll them up, about `chunk_rows`
+    at a time as the frames stream in, each chunk in a transaction of its
+    own.
+    """
+    frames = (df.drop(columns=["adj_close"], errors="ignore") for df in dfs)
+    counts = adaptors.LoadCounts()
+    for chunk in adaptors.chunk_frames((df for df in frames if len(df)), chunk_rows):
+        counts += _load_chunk(adaptor, chunk, raw_interval)
+    return counts
+
+
+def update_intraday_prices(
+    adaptor: adaptors.Adaptor,
+    codes: list[str],
+    interval: enums.Interval = enums.Interval.ONE_MINUTE,
+    start: datetime.datetime | None = None,
+    download_options: dict | None = None,
+) -> operations.PriceUpdateReport:
+    if start is None:
+        start = industrytime.industry_midnight(
+            datetime.datetime.now(datetime.timezone.utc) - INTRADAY_HISTORY
+        )
+    downloader = yfinance_adaptor.YFDownloader(
+        tickers=[f"{code}.AX" for code in codes],
+        start=start,
+        interval=interval,
+        **(download_options or {}),
+    )
+    counts = load_bars(adaptor, downloader.get_dfs(), raw_interval=interval.value)
+    return operations.PriceUpdateReport(codes=list(codes), counts=counts)
@@ -1,13 +1,20 @@
+import csv
+import dataclasses
 import datetime
-
+import enum
+import io
 import logging
-from application import yfinance_adaptor
+from typing import Iterable
+
+from application import price_store, yfinance_adaptor
 from application.yfinance_adaptor import adaptors
 from data import models
-from django.db import transaction
+from django.db import connection, transaction
 from utils import asx, industrytime
+from utils import metrics as metrics_
+from utils.query_budget import QueryBudget
 
-from domain import queries
+from domain import adjustments, queries, snapshots
 
 logger = logging.getLogger()
 
@@ -24,78 +31,151 @@ def refresh_asx_industry_groups() -> None:
         models.IndustryGroup.objects.bulk_create(new_groups)
 
 
-def _handle_current_active_list() -> None:
-    industries = {
-        industry.name: industry for industry in models.IndustryGroup.objects.all()
-    }
-    current_company_list = {
-        comp_info.code: comp_info for comp_info in asx.get_current_companies()
-    }
-    existing_list = {
-        db_comp.trading_code: db_comp for db_comp in queries.get_listing_companies()
-    }
-    today = datetime.date.today()
-
-    new_companies = []
-    new_periods = []
-    for trading_code, comp_info in current_company_list.items():
-        if trading_code not in existing_list:
-            # new listing
-            company_info = current_company_list[trading_code]
-            industry = industries[company_info.group]
-            new_companies.append(
-                models.Company(
-                    name=company_info.name,
-                    trading_code=comp_info.code,
-                    industry=industry,
-                )
-            )
-            new_periods.append(
-                models.ActivePeriod(
-                    company=new_companies[-1], start_date=datetime.date(1900, 1, 1)
-                )
-            )
-        elif not existing_list[trading_code].active:
-            company = existing_list[trading_code]
-            new_periods.append(models.ActivePeriod(company=company, start_date=today))
+# start date given to companies first seen in the current listing
+FIRST_LISTING_DATE = datetime.date(1900, 1, 1)
 
-    if new_companies:
-        models.Company.objects.bulk_create(new_companies)
 
-    if new_periods:
-        models.ActivePeriod.objects.bulk_create(new_periods)
+def _load_current_listing(cursor) -> str:
+    """
+    Copy the current ASX listing into a temporary table, returns its name.
+    An empty listing, e.g. an error page served in its place, raises
+    `ListingUnavailable` rather than delisting every company.
+    """
+    companies = asx.get_current_companies()
+    if not companies:
+        raise asx.ListingUnavailable("The current listing has no companies")
+    table = "asx_current_listing"
+    cursor.execute(f'DROP TABLE IF EXISTS "{table}"')
+    cursor.execute(
+        f'CREATE TEMPORARY TABLE "{table}" '
+        "(code varchar(10), name varchar(128), industry varchar(128)) "
+        "ON COMMIT DROP"
+    )
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for company_info in companies:
+        writer.writerow([company_info.code, company_info.name, company_info.group])
+    buffer.seek(0)
+    cursor.copy_expert(f'COPY "{table}" FROM STDIN WITH (FORMAT csv)', buffer)
+    return table
 
 
-def _handle_deactivating_list() -> None:
+def _reconcile_listing() -> None:
+    """
+    Relist, list and delist companies against the current ASX listing with a
+    fixed number of statements, however many companies are known. A company
+    is active while it has an active period without an end date.
+    """
+    company = models.Company._meta.db_table
+    period = models.ActivePeriod._meta.db_table
+    industry = models.IndustryGroup._meta.db_table
     today = datetime.date.today()
-    current_company_list = {
-        comp_info.code: comp_info for comp_info in asx.get_current_companies()
-    }
-
-    ending_periods = []
-    for company in queries.get_listing_companies():
-        if not company.active:
-            continue
-        if company.trading_code not in current_company_list:
-            active_period = company.active_periods.latest("start_date")
-            active_period.end_date = today
-            ending_periods.append(active_period)
 
-    if ending_periods:
-        models.ActivePeriod.objects.bulk_update(ending_periods, ["end_date"])
+    with connection.cursor() as cursor:
+        listing = _load_current_listing(cursor)
+        # known companies back on the list
+        cursor.execute(
+            f'INSERT INTO "{period}" (company_id, start_date) '
+            f'SELECT DISTINCT c.trading_code, %s FROM "{company}" c '
+            f'JOIN "{listing}" l ON l.code = c.trading_code '
+            f'WHERE NOT EXISTS (SELECT 1 FROM "{period}" p '
+            "WHERE p.company_id = c.trading_code AND p.end_date IS NULL)",
+            [today],
+        )
+        # new listings
+        cursor.execute(
+            f'WITH new_company AS (INSERT INTO "{company}" '
+            "(trading_code, name, industry_id) "
+            "SELECT DISTINCT ON (l.code) l.code, l.name, g.id "
+            f'FROM "{listing}" l LEFT JOIN "{industry}" g ON g.name = l.industry '
+            f'WHERE NOT EXISTS (SELECT 1 FROM "{company}" c '
+            "WHERE c.trading_code = l.code) "
+            "ORDER BY l.code RETURNING trading_code) "
+            f'INSERT INTO "{period}" (company_id, start_date) '
+            "SELECT trading_code, %s FROM new_company",
+            [FIRST_LISTING_DATE],
+        )
+        # active companies no longer on the list
+        cursor.execute(
+            f'UPDATE "{period}" p SET end_date = %s WHERE p.end_date IS NULL '
+            f'AND NOT EXISTS (SELECT 1 FROM "{listing}" l '
+            "WHERE l.code = p.company_id)",
+            [today],
+        )
 
 
+@QueryBudget(11)
 @transaction.atomic
 def refresh_asx_company_list() -> None:
     refresh_asx_industry_groups()
 
-    _handle_current_active_list()
+    _reconcile_listing()
 
-    _handle_deactivating_list()
 
+# prices are fetched from this date for companies without any records
+PRICE_HISTORY_START = datetime.datetime(1980, 1, 1)
+# prices within this window before a company's latest record are refetched, in
+# case data like adjusted close gets updated.
+PRICE_REVISION_WINDOW = datetime.timedelta(days=7)
 
-@transaction.atomic
-def update_prices(adaptor: adaptors.Adaptor, codes: list[str] | None = None) -> None:
+
+@QueryBudget(1)
+def get_price_download_batches(
+    codes: Iterable[str],
+) -> dict[datetime.datetime, list[str]]:
+    """
+    Group trading codes by the timestamp their download should start from,
+    based on each company's own latest price record.
+    """
+    watermarks = queries.get_price_watermarks(codes)
+    batches = {}
+    for code in sorted(codes):
+        latest = watermarks.get(code)
+        if latest is None:
+            first_timestamp = industrytime.industry_midnight(PRICE_HISTORY_START)
+        else:
+            first_timestamp = (
+                industrytime.as_industry_time(latest) - PRICE_REVISION_WINDOW
+            )
+        batches.setdefault(first_timestamp, []).append(code)
+    return batches
+
+
+class PriceUpdateMode(enum.Enum):
+    # delete the refetched window and insert it again
+    REPLACE = "replace"
+    # only insert new rows and update rows whose values changed
+    UPSERT = "upsert"
+
+
+@dataclasses.dataclass
+class PriceUpdateReport:
+    codes: list[str] = dataclasses.field(default_factory=list)
+    counts: adaptors.LoadCounts = dataclasses.field(default_factory=adaptors.LoadCounts)
+    # prices whose adjusted close was recomputed
+    adjusted: int = 0
+    # companies whose price snapshot was refreshed
+    snapshots: int = 0
+
+
+def update_prices(
+    adaptor: adaptors.Adaptor,
+    codes: list[str] | None = None,
+    mode: PriceUpdateMode = PriceUpdateMode.REPLACE,
+    download_options: dict | None = None,
+    metrics: metrics_.Metrics | None = None,
+) -> PriceUpdateReport:
+    """
+    `download_options` are extra `YahooFinanceDownloadSpec` fields, e.g.
+    `batch_size`/`concurrency` to download in sharded, parallel batches.
+    `metrics` records the download, normalise, delete, insert/upsert,
+    adjust and snapshot stages.
+
+    Dividends and splits are downloaded along with the prices, and the
+    adjusted closes computed from them locally, see `domain.adjustments`.
+    The price snapshots of the updated codes are refreshed last, see
+    `domain.snapshots`.
+    """
     active_codes = set(
         queries.get_listing_companies(active_only=True).values_list(
             "trading_code", flat=True
@@ -104,43 +184,92 @@ def update_prices(adaptor: adaptors.Adaptor, codes: list[str] | None = None) ->
     if codes is not None:
         active_codes &= set(codes)
 
-    latest = (
-        models.PriceRecord.objects.filter(company__trading_code__in=active_codes)
-        .order_by("timestamp")
-        .last()
-    )
-    if latest is None:
-        # fetch from the beginning of the record date -> 1980-01-01
-        first_timestamp = industrytime.industry_midnight(datetime.datetime(1980, 1, 1))
+    download_options = {"actions": True, **(download_options or {})}
+    if metrics is None:
+        metrics = metrics_.Metrics()
     else:
-        # fetch for -7 days from the latest available record, in case data like adjusted close
-        # gets updated.
-        first_timestamp = industrytime.as_industry_time(
-            latest.timestamp
-        ) + datetime.timedelta(days=-7)
+        download_options["metrics"] = metrics
 
-    # print(f"Fetching codes: {active_codes}\n" f"Since {first_timestamp}")
+    report = PriceUpdateReport()
+    today = datetime.date.today()
+    batches = get_price_download_batches(active_codes)
+    for first_timestamp, batch_codes in sorted(batches.items()):
+        if first_timestamp.date() > today:
+            continue
 
-    if first_timestamp.date() > datetime.date.today():
-        return None
+        downloader = yfinance_adaptor.YFDownloader(
+            tickers=[f"{code}.AX" for code in batch_codes],
+            start=first_timestamp,
+            adaptor=adaptor,
+            **download_options,
+        )
+        if mode == PriceUpdateMode.UPSERT:
+            with metrics.stage("upsert") as stage:
+                counts = downloader.upsert(
+                    django_model=models.PriceRecord,
+                    unique_fields=("company", "timestamp"),
+                )
+                stage.add(rows=counts.inserted + counts.updated)
+            report.counts += counts
+        else:
+            with transaction.atomic():
+                # delete all later prices as we are going to update them with
+                # potentially newer revaised adj_close etc.
+                with metrics.stage("delete") as stage, QueryBudget(
+                    1, name="update_prices delete"
+                ):
+                    deleted, _ = models.PriceRecord.objects.filter(
+                        company_id__in=batch_codes, timestamp__gte=first_timestamp
+                    ).delete()
+                    stage.add(rows=deleted)
+                with metrics.stage("insert") as stage:
+                    inserted = downloader.export(django_model=models.PriceRecord)
+                    stage.add(rows=inserted)
+            report.counts += adaptors.LoadCounts(inserted=inserted, deleted=deleted)
+        with metrics.stage("adjust") as stage:
+            adjusted = adjustments.update_adjustments(
+                batch_codes, downloader.actions, since=first_timestamp
+            )
+            stage.add(rows=adjusted)
+        report.adjusted += adjusted
+        with metrics.stage("snapshot") as stage:
+            refreshed = snapshots.refresh_snapshots(batch_codes)
+            stage.add(rows=refreshed)
+        report.snapshots += refreshed
+        report.codes.extend(batch_codes)
+    return report
 
-    # print(f"Deleting prices: {active_codes}\n" f"Since {first_timestamp}")
-    # delete all later prices as we are going to update them with
-    # potentially newer revaised adj_close etc.
-    models.PriceRecord.objects.filter(
-        company__trading_code__in=active_codes, timestamp__gte=first_timestamp
-    ).delete()
-    # print("Deleting done")
-
-    downloader = yfinance_adaptor.YFDownloader(
-        tickers=[f"{code}.AX" for code in active_codes],
-        start=first_timestamp,
-        adaptor=adaptor,
-    )
-    # print("Exporting")
-    downloader.export(django_model=models.PriceRecord)
+
+def sync_price_store(store: price_store.PriceStore, codes: Iterable[str]) -> int:
+    """
+    Append the prices recorded since the store was last synced. Like
+    `update_prices`, the revision window before each code's latest stored
+    price is read again, so revised prices replace the stored ones.
+    """
+    batches = {}
+    for code in sorted(codes):
+        latest = store.latest(code)
+        since = None if latest is None else latest - PRICE_REVISION_WINDOW
+        batches.setdefault(since, []).append(code)
+
+    rows = 0
+    for since, batch_codes in batches.items():
+        synced = set()
+        for code, columns in queries.iter_price_columns(batch_codes, since=since):
+            store.append(code, columns, replace_from=since)
+            synced.add(code)
+            rows += len(columns["timestamp"])
+        if since is not None:
+            # prices removed from the database since the last sync
+            for code in set(batch_codes) - synced:
+                store.append(
+                    code, price_store.PriceStore.empty_columns(), replace_from=since
+                )
+    store.flush()
+    return rows
 
 
+@QueryBudget(4)
 def organise_active_periods(company: models.Company) -> None:
     """
     Use the earliest price's timestamp to determine the listing date of a company
@@ -159,3 +288,35 @@ def organise_active_periods(company: models.Company) -> None:
     else:
         earliest_active_period.start_date = listing_date
         earliest_active_period.save()
+
+
+@QueryBudget(6)
+@transaction.atomic
+def bulk_organise_active_periods(codes: Iterable[str]) -> int:
+    """
+    `organise_active_periods` for many companies with a fixed number of
+    queries. Only periods whose start date changes are written, returns how
+    many were created or updated.
+    """
+    codes = list(codes)
+    earliest_prices = queries.get_earliest_prices(codes)
+    earliest_periods = queries.get_earliest_active_periods(earliest_prices)
+
+    new_periods = []
+    changed_periods = []
+    for code, earliest_price in earliest_prices.items():
+        listing_date = industrytime.as_industry_time(earliest_price).date()
+        period = earliest_periods.get(code)
+        if period is None:
+            new_periods.append(
+                models.ActivePeriod(company_id=code, start_date=listing_date)
+            )
+        elif period.start_date != listing_date:
+            period.start_date = listing_date
+            changed_periods.append(period)
+
+    if new_periods:
+        models.ActivePeriod.objects.bulk_create(new_periods)
+    if changed_periods:
+        models.ActivePeriod.objects.bulk_update(changed_periods, ["start_date"])
+    return len(new_periods) + len(changed_periods)
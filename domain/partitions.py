@@ -0,0 +1,76 @@
+import datetime
+from typing import Iterable
+
+from data import models
+from django.db import connection, transaction
+
+PRICE_TABLE = models.PriceRecord._meta.db_table
+# prices of years without a partition of their own land here
+DEFAULT_PARTITION = f"{PRICE_TABLE}_default"
+
+
+def partition_name(year: int) -> str:
+    return f"{PRICE_TABLE}_y{year}"
+
+
+def _year_bounds(year: int) -> tuple[datetime.datetime, datetime.datetime]:
+    return (
+        datetime.datetime(year, 1, 1, tzinfo=datetime.timezone.utc),
+        datetime.datetime(year + 1, 1, 1, tzinfo=datetime.timezone.utc),
+    )
+
+
+def get_partitions() -> list[str]:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE pg_inherits.inhparent = %s::regclass ORDER BY child.relname",
+            [f'"{PRICE_TABLE}"'],
+        )
+        return [name for name, in cursor.fetchall()]
+
+
+def get_default_partition_years() -> list[int]:
+    """UTC years of the prices left in the default partition"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT DISTINCT extract(year FROM timestamp AT TIME ZONE 'UTC')::int "
+            f'FROM "{DEFAULT_PARTITION}" ORDER BY 1'
+        )
+        return [year for year, in cursor.fetchall()]
+
+
+@transaction.atomic
+def ensure_partitions(years: Iterable[int]) -> list[str]:
+    """
+    Create the yearly price partitions missing for `years`, returns their
+    names. Prices of those years already in the default partition are moved
+    to the new partition before it is attached.
+    """
+    existing = set(get_partitions())
+    created = []
+    with connection.cursor() as cursor:
+        for year in sorted(set(years)):
+            name = partition_name(year)
+            if name in existing:
+                continue
+            bounds = _year_bounds(year)
+            cursor.execute(
+                f'CREATE TABLE "{name}" '
+                f'(LIKE "{PRICE_TABLE}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'
+            )
+            cursor.execute(
+                f'WITH moved AS (DELETE FROM "{DEFAULT_PARTITION}" '
+                "WHERE timestamp >= %s AND timestamp < %s RETURNING *) "
+                f'INSERT INTO "{name}" SELECT * FROM moved',
+                bounds,
+            )
+            # attaching builds the partition's share of the table's indexes
+            cursor.execute(
+                f'ALTER TABLE "{PRICE_TABLE}" ATTACH PARTITION "{name}" '
+                "FOR VALUES FROM (%s) TO (%s)",
+                bounds,
+            )
+            created.append(name)
+    return created
@@ -1,7 +1,15 @@
 import datetime
+import io
+import itertools
+import operator
+from typing import Iterable, Iterator
 
+import numpy
+import pandas
 from data import models
-from django.db.models import Exists, OuterRef, Q, QuerySet
+from django.db import connection
+from django.db.models import Exists, FloatField, Max, Min, OuterRef, Q, QuerySet
+from django.db.models.functions import Cast
 
 
 def get_listing_companies(active_only: bool = False) -> QuerySet:
@@ -15,3 +23,167 @@ def get_listing_companies(active_only: bool = False) -> QuerySet:
     if active_only:
         queryset = queryset.filter(active=active_only)
     return queryset
+
+
+def get_price_watermarks(codes: Iterable[str]) -> dict[str, datetime.datetime]:
+    """Latest stored price timestamp per trading code, in one grouped query"""
+    return dict(
+        models.PriceRecord.objects.filter(company_id__in=codes)
+        .values("company_id")
+        .annotate(latest=Max("timestamp"))
+        .values_list("company_id", "latest")
+    )
+
+
+def get_earliest_prices(codes: Iterable[str]) -> dict[str, datetime.datetime]:
+    """Earliest stored price timestamp per trading code, in one grouped query"""
+    return dict(
+        models.PriceRecord.objects.filter(company_id__in=codes)
+        .values("company_id")
+        .annotate(earliest=Min("timestamp"))
+        .values_list("company_id", "earliest")
+    )
+
+
+def get_earliest_active_periods(codes: Iterable[str]) -> dict[str, models.ActivePeriod]:
+    return {
+        period.company_id: period
+        for period in models.ActivePeriod.objects.filter(company_id__in=codes)
+        .order_by("company_id", "start_date")
+        .distinct("company_id")
+    }
+
+
+def get_price_snapshots(codes: Iterable[str] | None = None) -> pandas.DataFrame:
+    """
+    The latest bar and recent statistics of each company, by trading code,
+    read from the snapshots `update_prices` keeps rather than the prices.
+    """
+    queryset = models.PriceSnapshot.objects.all()
+    if codes is not None:
+        queryset = queryset.filter(company_id__in=codes)
+    columns = [field.attname for field in models.PriceSnapshot._meta.concrete_fields]
+    return pandas.DataFrame(
+        list(queryset.values_list(*columns)), columns=columns
+    ).set_index("company_id")
+
+
+PRICE_VALUE_FIELDS = ("open", "high", "low", "close", "adj_close")
+
+
+def iter_price_columns(
+    codes: Iterable[str], since: datetime.datetime | None = None
+) -> Iterator[tuple[str, dict[str, numpy.ndarray]]]:
+    """
+    Prices of each trading code as numpy columns sorted by timestamp, streamed
+    from a single query. Timestamps are epoch nanoseconds and prices floats,
+    skipping `Decimal` and model instances altogether.
+    """
+    queryset = models.PriceRecord.objects.filter(company_id__in=codes)
+    if since is not None:
+        queryset = queryset.filter(timestamp__gte=since)
+    rows = (
+        queryset.order_by("company_id", "timestamp")
+        .values_list(
+            "company_id",
+            "timestamp",
+            *(Cast(field, FloatField()) for field in PRICE_VALUE_FIELDS),
+            "volume",
+        )
+        .iterator(chunk_size=10000)
+    )
+    for code, group in itertools.groupby(rows, key=operator.itemgetter(0)):
+        _, timestamps, *values, volumes = zip(*group)
+        columns = {
+            "timestamp": pandas.DatetimeIndex(timestamps).as_unit("ns").asi8,
+            "volume": numpy.array(volumes, dtype="int64"),
+        }
+        for field, value in zip(PRICE_VALUE_FIELDS, values):
+            columns[field] = numpy.array(value, dtype="float64")
+        yield code, columns
+
+
+PANEL_FIELDS = (*PRICE_VALUE_FIELDS, "volume")
+# COPY binary file header: signature, flags and header extension length
+_COPY_HEADER_SIZE = 19
+_PG_EPOCH_US = 946_684_800_000_000
+
+
+def get_price_arrays(
+    codes: list[str],
+    start: datetime.datetime | None = None,
+    end: datetime.datetime | None = None,
+    fields: Iterable[str] = ("close",),
+) -> tuple[numpy.ndarray, dict[str, numpy.ndarray]]:
+    """
+    Prices of `codes` from `start` to `end` (exclusive) as dates x codes
+    float arrays per field, NaN where a code has no price, and the UTC
+    datetime64 dates. Rows are read with a binary `COPY ... TO STDOUT` whose
+    columns are all fixed width, so they decode straight into a numpy
+    structured array.
+    """
+    fields = list(fields)
+    unknown = set(fields) - set(PANEL_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown price fields: {sorted(unknown)}")
+    table = models.PriceRecord._meta.db_table
+    values = "".join(f", coalesce(p.{field}::float8, 'NaN')" for field in fields)
+    with connection.cursor() as cursor:
+        query = cursor.mogrify(
+            f"SELECT k.position::int4 - 1, p.timestamp{values} "
+            f'FROM "{table}" p JOIN unnest(%s::varchar[]) WITH ORDINALITY '
+            "k(code, position) ON p.company_id = k.code "
+            "WHERE p.timestamp >= coalesce(%s::timestamptz, '-infinity') "
+            "AND p.timestamp < coalesce(%s::timestamptz, 'infinity')",
+            [list(codes), start, end],
+        ).decode()
+        buffer = io.BytesIO()
+        cursor.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT binary)", buffer)
+
+    dtype = numpy.dtype(
+        [
+            ("count", ">i2"),
+            ("code_length", ">i4"),
+            ("code", ">i4"),
+            ("timestamp_length", ">i4"),
+            ("timestamp", ">i8"),
+            *itertools.chain.from_iterable(
+                [(f"{field}_length", ">i4"), (field, ">f8")] for field in fields
+            ),
+        ]
+    )
+    data = buffer.getbuffer()
+    # the trailer is a field count of -1
+    rows = numpy.frombuffer(
+        data,
+        dtype=dtype,
+        count=(len(data) - _COPY_HEADER_SIZE - 2) // dtype.itemsize,
+        offset=_COPY_HEADER_SIZE,
+    )
+    timestamps, date_rows = numpy.unique(rows["timestamp"], return_inverse=True)
+    panels = {}
+    for field in fields:
+        panel = numpy.full((len(timestamps), len(codes)), numpy.nan)
+        panel[date_rows, rows["code"]] = rows[field]
+        panels[field] = panel
+    dates = (timestamps.astype("int64") + _PG_EPOCH_US).astype("datetime64[us]")
+    return dates.astype("datetime64[ns]"), panels
+
+
+def get_price_panel(
+    codes: list[str],
+    start: datetime.datetime | None = None,
+    end: datetime.datetime | None = None,
+    fields: Iterable[str] = ("close",),
+) -> pandas.DataFrame:
+    """
+    `get_price_arrays` as a frame of dates rows and `(field, code)` columns,
+    `panel["close"]` being the dates x codes closes.
+    """
+    fields = list(fields)
+    dates, panels = get_price_arrays(codes, start, end, fields)
+    return pandas.DataFrame(
+        numpy.concatenate([panels[field] for field in fields], axis=1),
+        index=pandas.DatetimeIndex(dates).tz_localize("UTC"),
+        columns=pandas.MultiIndex.from_product([fields, list(codes)]),
+    )
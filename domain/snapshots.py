@@ -0,0 +1,87 @@
+from typing import Iterable
+
+from data import models
+from django.db import connection, transaction
+from utils.query_budget import QueryBudget
+
+PRICE_TABLE = models.PriceRecord._meta.db_table
+SNAPSHOT_TABLE = models.PriceSnapshot._meta.db_table
+
+# snapshot column -> bars the return is over
+RETURN_BARS = {
+    "return_1d": 1,
+    "return_5d": 5,
+    "return_21d": 21,
+    "return_63d": 63,
+    "return_252d": 252,
+}
+AVERAGE_VOLUME_BARS = 20
+# enough bars for a year of trading days and the longest return
+SNAPSHOT_BARS = 262
+
+BAR_FIELDS = ("timestamp", "low", "high", "open", "close", "adj_close", "volume")
+# bars within a year of each company's latest one, for the 52 week range
+LAST_YEAR = "bars.timestamp > bars.latest - interval '1 year'"
+
+
+def _snapshot_sql() -> str:
+    latest = [f"max(bars.{field}) FILTER (WHERE bars.age = 0)" for field in BAR_FIELDS]
+    returns = [
+        "max(bars.adjusted) FILTER (WHERE bars.age = 0) / NULLIF(max(bars.adjusted) "
+        f"FILTER (WHERE bars.age = {count}), 0) - 1"
+        for count in RETURN_BARS.values()
+    ]
+    columns = [
+        *BAR_FIELDS,
+        "high_52w",
+        "low_52w",
+        "average_volume_20d",
+        *RETURN_BARS,
+    ]
+    return (
+        f'INSERT INTO "{SNAPSHOT_TABLE}" (company_id, {", ".join(columns)}) '
+        f"SELECT bars.company_id, {', '.join(latest)}, "
+        f"max(bars.high) FILTER (WHERE {LAST_YEAR}), "
+        f"min(bars.low) FILTER (WHERE {LAST_YEAR}), "
+        f"avg(bars.volume) FILTER (WHERE bars.age < {AVERAGE_VOLUME_BARS}), "
+        f"{', '.join(returns)} "
+        # the latest bars of each company, newest first
+        "FROM (SELECT code.code AS company_id, recent.*, "
+        "coalesce(recent.adj_close, recent.close)::float8 AS adjusted, "
+        "row_number() OVER companies - 1 AS age, "
+        "max(recent.timestamp) OVER companies AS latest "
+        "FROM unnest(%(codes)s::varchar[]) code(code) "
+        "CROSS JOIN LATERAL (SELECT p.timestamp, p.low, p.high, p.open, p.close, "
+        f'p.adj_close, p.volume FROM "{PRICE_TABLE}" p '
+        "WHERE p.company_id = code.code "
+        f"ORDER BY p.timestamp DESC LIMIT {SNAPSHOT_BARS}) recent "
+        "WINDOW companies AS (PARTITION BY code.code ORDER BY recent.timestamp DESC "
+        "ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING)) bars "
+        "GROUP BY bars.company_id "
+        "ON CONFLICT (company_id) DO UPDATE SET "
+        f"{', '.join(f'{column} = EXCLUDED.{column}' for column in columns)} "
+        "RETURNING company_id"
+    )
+
+
+SNAPSHOT_SQL = _snapshot_sql()
+
+
+@QueryBudget(4)
+@transaction.atomic
+def refresh_snapshots(codes: Iterable[str]) -> int:
+    """
+    Recompute the snapshots of `codes` from their latest stored prices,
+    removing those of codes without any. Returns the snapshots written.
+    """
+    codes = sorted(set(codes))
+    if not codes:
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(SNAPSHOT_SQL, {"codes": codes})
+        refreshed = {code for code, in cursor.fetchall()}
+    if len(refreshed) < len(codes):
+        models.PriceSnapshot.objects.filter(
+            company_id__in=set(codes) - refreshed
+        ).delete()
+    return len(refreshed)
@@ -0,0 +1,141 @@
+import datetime
+import decimal
+
+import numpy
+import pandas
+import pytest
+from application.yfinance_adaptor import adaptors, downloader
+from data import models
+from tests import factories
+from utils import industrytime
+
+
+def _wide_frame(closes: list[float], start="2020-01-01"):
+    index = pandas.DatetimeIndex(
+        pandas.date_range(start=start, periods=len(closes), freq="D")
+    )
+    values = {
+        "Adj Close": closes,
+        "Close": closes,
+        "High": closes,
+        "Low": closes,
+        "Open": closes,
+        "Volume": [1000.0] * len(closes),
+    }
+    return pandas.DataFrame(values, index=index)
+
+
+def _price_frame(code: str, closes: list[float], start="2020-01-01"):
+    return downloader.get_database_ready_df(_wide_frame(closes, start), f"{code}.AX")
+
+
+@pytest.mark.django_db
+class TestPostGresCopyAdaptor:
+    def test_export_model_loads_all_rows(self):
+        factories.CompanyFactory(trading_code="AAA")
+        factories.CompanyFactory(trading_code="BBBB")
+        dfs = [
+            _price_frame("AAA", [1.5, 2.25, 3.125]),
+            _price_frame("BBBB", [10.0, 11.0]),
+        ]
+        adaptors.PostGresCopyAdaptor().export_model(models.PriceRecord, dfs)
+
+        assert models.PriceRecord.objects.filter(company_id="AAA").count() == 3
+        assert models.PriceRecord.objects.filter(company_id="BBBB").count() == 2
+        record = models.PriceRecord.objects.get(
+            company_id="AAA",
+            timestamp=industrytime.industry_midnight(datetime.datetime(2020, 1, 2)),
+        )
+        assert record.close == decimal.Decimal("2.250")
+        assert record.volume == 1000
+
+    def test_export_compact_frames(self):
+        factories.CompanyFactory(trading_code="AAA")
+        factories.CompanyFactory(trading_code="BBBB")
+        wide = pandas.concat(
+            {"AAA.AX": _wide_frame([1.1, 2.25]), "BBBB.AX": _wide_frame([10.0, 11.0])},
+            axis=1,
+        ).swaplevel(axis=1)
+        dfs = downloader.handle_yf_dataframes(
+            wide, ["AAA.AX", "BBBB.AX"], compact=True, price_dtype="float32"
+        )
+        adaptors.PostGresCopyAdaptor().export_model(
+            models.PriceRecord, map(downloader.to_database_frame, dfs)
+        )
+
+        record = models.PriceRecord.objects.get(
+            company_id="AAA",
+            timestamp=industrytime.industry_midnight(datetime.datetime(2020, 1, 1)),
+        )
+        assert record.close == decimal.Decimal("1.100")
+        assert models.PriceRecord.objects.filter(company_id="BBBB").count() == 2
+
+    def test_missing_adj_close_is_stored_as_null(self):
+        factories.CompanyFactory(trading_code="AAA")
+        df = _price_frame("AAA", [1.0, 2.0])
+        df["adj_close"] = [numpy.nan, 2.0]
+        adaptors.PostGresCopyAdaptor().export_model(models.PriceRecord, [df])
+
+        assert models.PriceRecord.objects.filter(adj_close__isnull=True).count() == 1
+
+    def test_export_model_without_rows_is_noop(self):
+        adaptors.PostGresCopyAdaptor().export_model(
+            models.PriceRecord, [_price_frame("AAA", [1.0]).iloc[:0]]
+        )
+        assert not models.PriceRecord.objects.exists()
+
+    def test_upsert_model_only_touches_new_and_changed_rows(self):
+        factories.CompanyFactory(trading_code="AAA")
+        adaptor = adaptors.PostGresCopyAdaptor()
+        adaptor.export_model(models.PriceRecord, [_price_frame("AAA", [1.0, 2.0])])
+
+        counts = adaptor.upsert_model(
+            models.PriceRecord,
+            [_price_frame("AAA", [1.0, 2.5, 3.0])],
+            unique_fields=("company", "timestamp"),
+        )
+
+        assert counts == adaptors.LoadCounts(inserted=1, updated=1, unchanged=1)
+        assert list(
+            models.PriceRecord.objects.order_by("timestamp").values_list(
+                "close", flat=True
+            )
+        ) == [decimal.Decimal("1"), decimal.Decimal("2.5"), decimal.Decimal("3")]
+
+    def test_upsert_model_is_idempotent(self):
+        factories.CompanyFactory(trading_code="AAA")
+        adaptor = adaptors.PostGresCopyAdaptor()
+        for _ in range(2):
+            counts = adaptor.upsert_model(
+                models.PriceRecord,
+                [_price_frame("AAA", [1.0, 2.0])],
+                unique_fields=("company", "timestamp"),
+            )
+        assert counts == adaptors.LoadCounts(unchanged=2)
+
+
+@pytest.mark.django_db
+class TestPostGresDjangoAdaptor:
+    def test_upsert_model_only_touches_new_and_changed_rows(self):
+        factories.CompanyFactory(trading_code="AAA")
+        adaptor = adaptors.PostGresDjangoAdaptor.from_django_settings()
+        adaptor.export_model(models.PriceRecord, [_price_frame("AAA", [1.0, 2.0])])
+
+        counts = adaptor.upsert_model(
+            models.PriceRecord,
+            [_price_frame("AAA", [1.0, 2.5, 3.0])],
+            unique_fields=("company", "timestamp"),
+        )
+
+        assert counts == adaptors.LoadCounts(inserted=1, updated=1, unchanged=1)
+        assert list(
+            models.PriceRecord.objects.order_by("timestamp").values_list(
+                "close", flat=True
+            )
+        ) == [decimal.Decimal("1"), decimal.Decimal("2.5"), decimal.Decimal("3")]
+        counts = adaptor.upsert_model(
+            models.PriceRecord,
+            [_price_frame("AAA", [1.0, 2.5, 3.0])],
+            unique_fields=("company", "timestamp"),
+        )
+        assert counts == adaptors.LoadCounts(unchanged=3)
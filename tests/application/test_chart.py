@@ -0,0 +1,105 @@
+import pandas
+import pytest
+
+from application.yfinance_adaptor import chart, downloader
+from benchmarks import chart_stub
+
+
+@pytest.fixture
+def client():
+    with chart.ChartClient(concurrency=2, backoff=0.01) as client:
+        yield client
+
+
+def test_chart_frames_normalise_like_yf_download(client):
+    tickers = ["AAA.AX", "BBB.AX", "CCC.AX", "DDD.AX"]
+    with chart_stub.ChartStubServer() as server:
+        client.url = server.url
+        result = client.fetch(tickers, "2023-01-01", "2023-01-11")
+
+    assert result.errors == {}
+    assert result.bytes_downloaded > 0
+    assert list(result.frame.columns.get_level_values(1).unique()) == tickers
+    dfs = downloader.handle_yf_dataframes(result.frame, tickers)
+    assert [df["company_id"].iloc[0] for df in dfs] == ["AAA", "BBB", "CCC", "DDD"]
+    assert all(len(df) == 10 for df in dfs)
+    assert dfs[0]["timestamp"].iloc[0] == pandas.Timestamp(
+        "2023-01-01", tz="Australia/Melbourne"
+    )
+    # pooled keep-alive connections
+    assert server.connections <= client.concurrency < server.requests
+
+
+def test_connections_are_kept_across_fetches(client):
+    with chart_stub.ChartStubServer() as server:
+        client.url = server.url
+        for tickers in (["AAA.AX", "BBB.AX"], ["CCC.AX", "DDD.AX"], ["EEE.AX"]):
+            assert client.fetch(tickers, "2023-01-01", "2023-01-11").errors == {}
+    assert server.connections <= client.concurrency < server.requests == 5
+
+
+def test_failures_are_retried_and_reported_per_ticker(client):
+    tickers = ["AAA.AX", "FLAKY.AX", "GONE.AX"]
+    with chart_stub.ChartStubServer(
+        missing={"GONE.AX"}, failures={"FLAKY.AX": 2}
+    ) as server:
+        client.url = server.url
+        result = client.fetch(tickers, "2023-01-01", "2023-01-11")
+
+    assert list(result.errors) == ["GONE.AX"]
+    dfs = downloader.handle_yf_dataframes(result.frame, tickers)
+    assert [len(df) for df in dfs] == [10, 10, 0]
+
+
+def test_retries_give_up(client):
+    client.max_retries = 1
+    with chart_stub.ChartStubServer(failures={"AAA.AX": 5}) as server:
+        client.url = server.url
+        result = client.fetch(["AAA.AX"], "2023-01-01", "2023-01-11")
+    assert "HTTP 503" in result.errors["AAA.AX"]
+    assert server.requests == 2
+
+
+def test_downloader_uses_chart_client(client):
+    with chart_stub.ChartStubServer(missing={"GONE.AX"}) as server:
+        client.url = server.url
+        fetcher = downloader.YFDownloader(
+            ["AAA.AX", "GONE.AX"], start="2023-01-01", end="2023-01-11", client=client
+        )
+        dfs = list(fetcher.get_dfs())
+    assert [len(df) for df in dfs] == [10, 0]
+    download = fetcher.metrics.stages["download"]
+    assert download.rows == 10 and download.bytes_downloaded > 0
+    assert fetcher.metrics.stages["normalise"].rows == 10
+    assert list(fetcher.errors) == ["GONE.AX"]
+
+
+def test_parse_chart_actions():
+    day = 86_400
+    payload = {
+        "chart": {
+            "result": [
+                {
+                    "meta": {"exchangeTimezoneName": "UTC"},
+                    "timestamp": [0, day, 2 * day],
+                    "indicators": {
+                        "quote": [{field: [1, 1, 1] for field in chart.QUOTE_FIELDS}]
+                    },
+                    "events": {
+                        "dividends": {str(day): {"amount": 0.1, "date": day}},
+                        "splits": {
+                            str(2 * day): {
+                                "date": 2 * day,
+                                "numerator": 3,
+                                "denominator": 2,
+                            }
+                        },
+                    },
+                }
+            ]
+        }
+    }
+    assert "Dividends" not in chart.parse_chart(payload).columns
+    frame = chart.parse_chart(payload, actions=True)
+    assert frame["Dividends"].tolist() == [0, 0.1, 0]
+    assert frame["Stock Splits"].tolist() == [0, 0, 1.5]
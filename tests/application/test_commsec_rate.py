@@ -1,6 +1,8 @@
+import numpy
 import pytest
 
-from application.rates.commsec import SettleToBank, SettleWithCDIA
+from application.rates.commsec import SettleToBank, SettleWithCDIA, rate
+from application.rates.commsec.data_models import CostSchema
 
 
 class TestSettleWithCDIA:
@@ -24,3 +26,29 @@ class TestSettleToBank:
     )
     def test_settle_to_bank(self, transaction_amount, expected_overhead):
         assert SettleToBank.total(transaction_amount) == expected_overhead
+
+
+@pytest.mark.parametrize(
+    "schema",
+    [value for value in vars(rate).values() if isinstance(value, CostSchema)],
+    ids=lambda schema: schema.name,
+)
+def test_total_many_matches_total(schema):
+    generator = numpy.random.default_rng(0)
+    boundaries = [bound for step in schema.steps for bound in (step.lower, step.upper)]
+    values = numpy.concatenate(
+        [
+            numpy.array([bound for bound in boundaries if bound is not None]),
+            numpy.nextafter(
+                [bound for bound in boundaries if bound is not None], numpy.inf
+            ),
+            # amounts whose relative cost is exactly half a cent
+            numpy.array([step.rate for step in schema.steps]) ** -1 * 0.005 * 7,
+            numpy.round(generator.uniform(-10, 2_000_000, 20_000), 2),
+        ]
+    )
+    expected = [schema.total(value) for value in values]
+    numpy.testing.assert_array_equal(
+        schema.total_many(values),
+        numpy.array([numpy.nan if cost is None else cost for cost in expected]),
+    )
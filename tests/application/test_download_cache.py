@@ -0,0 +1,146 @@
+import datetime
+
+import pandas
+import pytest
+import time_machine
+
+from application.yfinance_adaptor import cache, downloader
+from benchmarks import synthetic
+
+UTC = datetime.timezone.utc
+
+
+class FakeYahoo:
+    """Stand-in for yf.download over a fixed synthetic history"""
+
+    def __init__(self, codes, days=30):
+        self.history = synthetic.synthetic_yf_frame(
+            codes, days, start="2020-01-01", nan_ratio=0
+        )
+        self.calls = []
+
+    def __call__(self, tickers, start):
+        self.calls.append((tickers, pandas.Timestamp(start)))
+        columns = [column for column in self.history.columns if column[1] in tickers]
+        return self.history.loc[self.history.index >= start, columns]
+
+
+def _spec(tickers, start, end):
+    return downloader.YahooFinanceDownloadSpec(tickers=tickers, start=start, end=end)
+
+
+class TestDownloadCache:
+    tickers = ["AAA.AX", "BBB.AX"]
+
+    @pytest.fixture
+    def yahoo(self):
+        return FakeYahoo(["AAA", "BBB", "CCC"])
+
+    def test_repeated_download_is_served_from_disk(self, tmp_path, yahoo):
+        spec = _spec(self.tickers, "2020-01-01", "2020-02-01")
+        first = cache.DownloadCache(tmp_path).download(self.tickers, spec, yahoo)
+        second = cache.DownloadCache(tmp_path).download(self.tickers, spec, yahoo)
+
+        assert len(yahoo.calls) == 1
+        pandas.testing.assert_frame_equal(first, second, check_freq=False)
+        assert len(downloader.handle_yf_dataframes(second, self.tickers)) == 2
+
+    def test_partial_hit_only_fetches_the_tail(self, tmp_path, yahoo):
+        download_cache = cache.DownloadCache(tmp_path)
+        download_cache.download(
+            self.tickers, _spec(self.tickers, "2020-01-01", "2020-01-20"), yahoo
+        )
+        merged = download_cache.download(
+            self.tickers, _spec(self.tickers, "2020-01-18", "2020-02-01"), yahoo
+        )
+
+        last_cached = pandas.Timestamp("2020-01-17")
+        assert yahoo.calls[-1] == (self.tickers, last_cached)
+        expected = yahoo.history.loc[
+            (yahoo.history.index >= "2020-01-18")
+            & (yahoo.history.index < "2020-02-01"),
+            [column for column in yahoo.history.columns if column[1] in self.tickers],
+        ]
+        pandas.testing.assert_frame_equal(
+            merged, expected, check_freq=False, check_names=False
+        )
+
+    def test_partial_hit_refetches_revised_bars_from_the_requested_start(
+        self, tmp_path, yahoo
+    ):
+        download_cache = cache.DownloadCache(tmp_path)
+        download_cache.download(
+            self.tickers, _spec(self.tickers, "2020-01-01", "2020-01-20"), yahoo
+        )
+        revised = pandas.Timestamp("2020-01-14")
+        yahoo.history.loc[revised, ("Close", "AAA.AX")] = 1234.0
+
+        # asking again from a revision window before the last cached bar
+        merged = download_cache.download(
+            self.tickers, _spec(self.tickers, "2020-01-13", "2020-02-01"), yahoo
+        )
+
+        assert yahoo.calls[-1] == (self.tickers, pandas.Timestamp("2020-01-13"))
+        assert merged.loc[revised, ("Close", "AAA.AX")] == 1234.0
+        # the revision is cached as well
+        cached = download_cache.download(
+            self.tickers, _spec(self.tickers, "2020-01-01", "2020-02-01"), yahoo
+        )
+        assert cached.loc[revised, ("Close", "AAA.AX")] == 1234.0
+        assert len(yahoo.calls) == 2
+
+    def test_requests_without_an_end_run_to_the_last_complete_bar(
+        self, tmp_path, yahoo
+    ):
+        spec = downloader.YahooFinanceDownloadSpec(
+            tickers=self.tickers, start="2020-01-01"
+        )
+        # Tuesday 2am in Melbourne, Monday's bar is the last complete one
+        with time_machine.travel(datetime.datetime(2020, 1, 20, 15, tzinfo=UTC)):
+            first = cache.DownloadCache(tmp_path).download(self.tickers, spec, yahoo)
+            # a new process within the same bar replays it
+            replay = cache.DownloadCache(tmp_path, replay_only=True)
+            replayed = replay.download(self.tickers, spec, yahoo)
+
+        assert first.index.max() == pandas.Timestamp("2020-01-20")
+        pandas.testing.assert_frame_equal(first, replayed, check_freq=False)
+        assert len(yahoo.calls) == 1
+
+        # a day later only the revision window before the last bar is fetched
+        with time_machine.travel(datetime.datetime(2020, 1, 21, 15, tzinfo=UTC)):
+            later = cache.DownloadCache(tmp_path).download(self.tickers, spec, yahoo)
+        assert yahoo.calls[-1] == (self.tickers, pandas.Timestamp("2020-01-13"))
+        assert later.index.max() == pandas.Timestamp("2020-01-21")
+
+    def test_replay_only_never_downloads(self, tmp_path, yahoo):
+        spec = _spec(self.tickers, "2020-01-01", "2020-01-20")
+        cache.DownloadCache(tmp_path).download(self.tickers, spec, yahoo)
+        replay = cache.DownloadCache(tmp_path, replay_only=True)
+
+        replay.download(self.tickers, spec, yahoo)
+        with pytest.raises(cache.CacheMiss):
+            replay.download(
+                self.tickers, _spec(self.tickers, "2020-01-01", "2020-02-01"), yahoo
+            )
+        assert len(yahoo.calls) == 1
+
+    def test_expired_entries_are_fetched_again(self, tmp_path, yahoo):
+        spec = _spec(self.tickers, "2020-01-01", "2020-01-20")
+        download_cache = cache.DownloadCache(tmp_path, ttl=datetime.timedelta(hours=1))
+        download_cache.download(self.tickers, spec, yahoo)
+        with time_machine.travel(datetime.datetime.now() + datetime.timedelta(hours=2)):
+            download_cache.download(self.tickers, spec, yahoo)
+        assert len(yahoo.calls) == 2
+
+    def test_size_eviction_drops_least_recently_used(self, tmp_path, yahoo):
+        download_cache = cache.DownloadCache(tmp_path)
+        spec = _spec(self.tickers, "2020-01-01", "2020-01-20")
+        download_cache.download(self.tickers, spec, yahoo)
+        entry_size = sum(path.stat().st_size for path in tmp_path.iterdir()) // 2
+
+        # room for a single entry
+        download_cache.max_bytes = int(entry_size * 1.5)
+        download_cache.download(
+            ["CCC.AX"], _spec(["CCC.AX"], "2020-01-01", "2020-01-20"), yahoo
+        )
+        assert len(list(tmp_path.glob("*.parquet"))) == 1
@@ -0,0 +1,79 @@
+import threading
+import time
+from unittest import mock
+
+import pytest
+
+from application.yfinance_adaptor import downloader, pipeline
+from benchmarks import synthetic
+
+
+class TestRunSharded:
+    def test_yields_every_shard_result(self):
+        results = pipeline.run_sharded(
+            pipeline.shard(list(range(10)), 3), sum, concurrency=3
+        )
+        assert sorted(results) == [3, 9, 12, 21]
+
+    def test_worker_error_is_raised_to_consumer(self):
+        def work(shard):
+            if 4 in shard:
+                raise ValueError("boom")
+            return shard
+
+        with pytest.raises(ValueError, match="boom"):
+            list(pipeline.run_sharded(pipeline.shard(list(range(10)), 2), work))
+
+    def test_pending_results_are_bounded(self):
+        alive = 0
+        peak = 0
+        lock = threading.Lock()
+
+        def work(shard):
+            nonlocal alive, peak
+            with lock:
+                alive += 1
+                peak = max(peak, alive)
+            return shard
+
+        for _ in pipeline.run_sharded(
+            [[i] for i in range(20)], work, concurrency=2, max_pending=1
+        ):
+            # slow sink
+            time.sleep(0.01)
+            with lock:
+                alive -= 1
+
+        # one being consumed, one queued and one held by each blocked worker
+        assert peak <= 1 + 1 + 2
+
+
+class TestShardedDownload:
+    def test_get_dfs_downloads_in_batches(self):
+        codes = synthetic.synthetic_codes(5)
+        tickers = [f"{code}.AX" for code in codes]
+
+        def download_tickers(batch):
+            return synthetic.synthetic_yf_frame(
+                [ticker.replace(".AX", "") for ticker in batch], 10, nan_ratio=0
+            )
+
+        fetcher = downloader.YFDownloader(tickers, batch_size=2, concurrency=2)
+        with mock.patch.object(
+            fetcher, "download_tickers", side_effect=download_tickers
+        ) as mock_download:
+            dfs = list(fetcher.get_dfs())
+
+        assert sorted(call.args[0] for call in mock_download.call_args_list) == [
+            tickers[:2],
+            tickers[2:4],
+            tickers[4:],
+        ]
+        assert sorted(df["company_id"].iloc[0] for df in dfs) == codes
+        assert all(len(df) == 10 for df in dfs)
+
+    def test_pipeline_fields_are_not_passed_to_yfinance(self):
+        spec = downloader.YahooFinanceDownloadSpec(
+            tickers=["ASX.AX"], batch_size=10, concurrency=4
+        )
+        assert not downloader.PIPELINE_FIELDS & set(spec.serialize())
@@ -0,0 +1,69 @@
+import numpy
+import pandas
+import pytest
+
+from application import price_store
+
+DAY = 86_400 * 10**9
+
+
+def _columns(first_day, days, close=1.0):
+    timestamps = numpy.arange(first_day, first_day + days, dtype="int64") * DAY
+    return {
+        "timestamp": timestamps,
+        "open": numpy.full(days, close),
+        "high": numpy.full(days, close),
+        "low": numpy.full(days, close),
+        "close": numpy.full(days, close),
+        "adj_close": numpy.full(days, close),
+        "volume": numpy.arange(days, dtype="int64"),
+    }
+
+
+class TestPriceStore:
+    def test_get_series_is_a_view_of_the_mapped_file(self, tmp_path):
+        store = price_store.PriceStore(tmp_path, writable=True)
+        store.append("AAA", _columns(0, 10))
+        store.append("BBB", _columns(0, 5, close=2.0))
+        store.flush()
+
+        reader = price_store.PriceStore(tmp_path)
+        series = reader.get_series(
+            "AAA", start=pandas.Timestamp(2 * DAY), end=pandas.Timestamp(5 * DAY)
+        )
+        assert list(series.volume) == [2, 3, 4]
+        assert isinstance(series.close.base, numpy.memmap)
+        assert not series.close.flags.writeable
+        assert list(reader.get_series("BBB").close) == [2.0] * 5
+        assert reader.latest("AAA") == pandas.Timestamp(9 * DAY, tz="UTC")
+
+    def test_append_replaces_overlapping_rows(self, tmp_path):
+        store = price_store.PriceStore(tmp_path, writable=True)
+        store.append("AAA", _columns(0, 10))
+        store.append("AAA", _columns(7, 5, close=3.0))
+
+        series = store.get_series("AAA")
+        assert len(series) == 12
+        assert list(series.close) == [1.0] * 7 + [3.0] * 5
+        assert numpy.all(numpy.diff(series.timestamp) == DAY)
+
+    def test_full_slot_moves_to_the_end_and_compacts(self, tmp_path):
+        store = price_store.PriceStore(tmp_path, writable=True)
+        store.append("AAA", _columns(0, 10))
+        store.append("BBB", _columns(0, 10, close=2.0))
+        store.append("AAA", _columns(10, price_store.store.MIN_HEADROOM * 2))
+        assert store.slots["AAA"].offset > store.slots["BBB"].offset
+        store.flush()
+
+        before = {code: store.get_series(code).as_columns() for code in store.codes}
+        end = store.end
+        store.compact()
+        assert store.end < end
+        for code, columns in before.items():
+            for field, values in store.get_series(code).as_columns().items():
+                numpy.testing.assert_array_equal(values, columns[field])
+
+    def test_read_only_store_rejects_appends(self, tmp_path):
+        price_store.PriceStore(tmp_path, writable=True).flush()
+        with pytest.raises(PermissionError):
+            price_store.PriceStore(tmp_path).append("AAA", _columns(0, 1))
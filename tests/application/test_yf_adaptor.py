@@ -1,9 +1,12 @@
 import datetime
 import itertools
+import tracemalloc
 
+import numpy
 import pandas
 
-from application.yfinance_adaptor import downloader
+from application.yfinance_adaptor import adaptors, downloader
+from benchmarks import synthetic
 
 
 class TestDownloader:
@@ -39,3 +42,135 @@ class TestDownloader:
             list(itertools.product(self.fields, ["ASX.AX", "CBA.AX"]))
         )
         assert expected_fields == set(data_frame.columns)
+
+    def test_handle_single_code_dataframe(self):
+        df = self._generate_dataframe(
+            [[1, 2, 3, 0.5, 1.5, 100], [1, 2, 3, 0.5, None, 200]], codes="ASX.AX"
+        )
+        (normalised,) = downloader.handle_yf_dataframes(df, ["ASX.AX"])
+
+        assert list(normalised.columns) == [
+            "timestamp",
+            "open",
+            "close",
+            "high",
+            "low",
+            "adj_close",
+            "volume",
+            "company_id",
+        ]
+        assert normalised["company_id"].tolist() == ["ASX", "ASX"]
+        # missing adj_close falls back to close
+        assert normalised["adj_close"].tolist() == [1.5, 2]
+        assert str(normalised["timestamp"].dt.tz) == "Australia/Melbourne"
+
+    def test_handle_multiple_codes_dataframe(self):
+        codes = ["ASX.AX", "CBA.AX"]
+        df = self._generate_dataframe(
+            [
+                # each field for ASX then CBA: open, close, high, low,
+                # adj close, volume
+                [1, 1, 2, 2, 3, 3, 0.5, 0.5, 100, 1, 10, 10],
+                [None, 1, 2, 2, 3, 3, 0.5, 0.5, 1, 1, 10, 10],
+            ],
+            codes=codes,
+        )
+        df.columns = pandas.MultiIndex.from_tuples(df.columns)
+        asx, cba = downloader.handle_yf_dataframes(df, codes)
+
+        # rows missing any of open/close/high/low/volume are dropped
+        assert len(asx) == 1
+        assert len(cba) == 2
+        assert cba["company_id"].unique().tolist() == ["CBA"]
+        # adjusted close far above close is replaced by close
+        assert asx["adj_close"].tolist() == [2]
+
+    def test_actions_are_split_from_prices(self):
+        codes = ["ASX.AX", "CBA.AX"]
+        index = pandas.DatetimeIndex(["1990-01-01", "1990-01-02"])
+        df = pandas.DataFrame(
+            {
+                **{
+                    (field, code): [1.0, 1.0] for field in self.fields for code in codes
+                },
+                ("Dividends", "ASX.AX"): [0.0, 0.25],
+                ("Dividends", "CBA.AX"): [0.0, 0.0],
+                ("Stock Splits", "ASX.AX"): [0.0, 0.0],
+                ("Stock Splits", "CBA.AX"): [2.0, 0.0],
+            },
+            index=index,
+        )
+
+        asx, cba = downloader.handle_yf_dataframes(df, codes)
+        assert "Dividends" not in asx.columns and len(cba) == 2
+
+        actions = downloader.normalise_yf_actions(df, codes)
+        assert actions[["company_id", "kind", "value"]].values.tolist() == [
+            ["ASX", "dividend", 0.25],
+            ["CBA", "split", 2.0],
+        ]
+        assert actions["timestamp"].tolist() == [
+            pandas.Timestamp("1990-01-02", tz="Australia/Melbourne"),
+            pandas.Timestamp("1990-01-01", tz="Australia/Melbourne"),
+        ]
+
+    def test_compact_frames(self):
+        frame = synthetic.synthetic_yf_frame(["AAA", "BBB"], 50)
+        tickers = ["AAA.AX", "BBB.AX"]
+        full = downloader.normalise_yf_dataframe(frame, tickers)
+        compact = downloader.normalise_yf_dataframe(
+            frame, tickers, compact=True, price_dtype="float32"
+        )
+
+        assert compact["timestamp"].dtype == "int64"
+        assert compact["close"].dtype == "float32"
+        assert compact["volume"].dtype == "int64"
+        assert compact["company_id"].cat.categories.tolist() == ["AAA", "BBB"]
+        assert (
+            compact.memory_usage(deep=True).sum()
+            < full.memory_usage(deep=True).sum() * 0.6
+        )
+
+        expanded = downloader.to_database_frame(compact)
+        assert (expanded["timestamp"] == full["timestamp"]).all()
+        assert (expanded["company_id"] == full["company_id"]).all()
+        numpy.testing.assert_allclose(expanded["close"], full["close"], rtol=1e-6)
+
+
+class _CountingAdaptor(adaptors.Adaptor):
+    def __init__(self):
+        self.rows = 0
+
+    def export(self, table_name, df):
+        ...
+
+    def export_model(self, django_model, dfs):
+        rows = sum(len(df) for df in dfs)
+        self.rows += rows
+        return rows
+
+
+def _export_peak(n_tickers, days=250):
+    codes = synthetic.synthetic_codes(n_tickers)
+    adaptor = _CountingAdaptor()
+    fetcher = downloader.YFDownloader([f"{code}.AX" for code in codes], adaptor=adaptor)
+    fetcher.export_chunk_rows = 10_000
+    fetcher.fetch = lambda tickers, start=None: synthetic.synthetic_yf_frame(
+        [ticker[:-3] for ticker in tickers], days
+    )
+    tracemalloc.start()
+    try:
+        rows = fetcher.export(None)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert rows == adaptor.rows > n_tickers * days * 0.95
+    return peak
+
+
+def test_streaming_export_memory_is_flat():
+    # by default tickers are downloaded in shards, a few of them alive at once
+    small = _export_peak(4 * downloader.DEFAULT_BATCH_SIZE)
+    large = _export_peak(20 * downloader.DEFAULT_BATCH_SIZE)
+    # 5 times the tickers, not 5 times the memory
+    assert large < small * 1.5
@@ -1,3 +1,21 @@
 import os
 
-os.environ.setdefault("DJANGO_SETTINGS_MODULE", "asx.settings")
\ No newline at end of file
+import pytest
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "asx.settings")
+
+
+@pytest.fixture(autouse=True, scope="session")
+def eager_celery_tasks():
+    """Run the pipeline's tasks in process, without a broker"""
+    from django.conf import settings
+
+    # read by the Celery app once it is first used
+    settings.CELERY_TASK_ALWAYS_EAGER = True
+    settings.CELERY_BROKER_URL = "memory://"
+    settings.CELERY_RESULT_BACKEND = "cache+memory://"
+
+
+@pytest.fixture(autouse=True)
+def enforce_query_budgets(settings):
+    settings.QUERY_BUDGETS_ENFORCED = True
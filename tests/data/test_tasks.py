@@ -0,0 +1,57 @@
+import datetime
+from unittest import mock
+
+import pytest
+from application import yfinance_adaptor
+from application.yfinance_adaptor import adaptors
+from data import tasks
+from tests import factories
+from utils import asx
+
+from domain import operations
+
+
+@pytest.mark.django_db
+@mock.patch.object(operations, "bulk_organise_active_periods")
+@mock.patch.object(yfinance_adaptor, "YFDownloader")
+@mock.patch.object(asx, "get_current_companies")
+def test_refresh_prices_fans_out_batches_and_organises_once(
+    mock_get_current_companies, mock_yf_downloader, mock_organise
+):
+    codes = ["AAA", "BBB", "CCC"]
+    mock_get_current_companies.return_value = [
+        asx.CompanyInfo(name=code, code=code, group="TEST") for code in codes
+    ]
+    for code in codes:
+        company = factories.CompanyFactory(trading_code=code)
+        factories.ActivePeriodFactory(
+            company=company, start_date=datetime.date(1980, 1, 1)
+        )
+    mock_yf_downloader.return_value.upsert.return_value = adaptors.LoadCounts(
+        inserted=1
+    )
+
+    result_id = tasks.refresh_prices.apply(kwargs={"batch_size": 2}).get()
+
+    assert result_id
+    assert sorted(
+        call.kwargs["tickers"] for call in mock_yf_downloader.call_args_list
+    ) == [["AAA.AX", "BBB.AX"], ["CCC.AX"]]
+    mock_organise.assert_called_once_with(codes)
+
+
+@mock.patch.object(operations, "bulk_organise_active_periods")
+def test_organise_active_periods_sums_batch_counts(mock_organise):
+    results = [
+        {
+            "codes": ["AAA"],
+            "counts": {"inserted": 1, "updated": 0, "unchanged": 0, "deleted": 0},
+        },
+        {
+            "codes": ["BBB"],
+            "counts": {"inserted": 2, "updated": 1, "unchanged": 0, "deleted": 0},
+        },
+    ]
+    summary = tasks.organise_active_periods(results)
+    assert summary["counts"]["inserted"] == 3
+    mock_organise.assert_called_once_with(["AAA", "BBB"])
@@ -0,0 +1,122 @@
+import datetime
+
+import pandas
+import pytest
+from data import models
+from tests import factories
+from utils import industrytime
+
+from domain import adjustments
+
+DAYS = [
+    industrytime.industry_midnight(datetime.datetime(2022, 1, 3))
+    + datetime.timedelta(days=day)
+    for day in range(10)
+]
+
+
+def _actions(code, *actions):
+    return pandas.DataFrame(
+        [(code, DAYS[day], kind, value) for day, kind, value in actions],
+        columns=["company_id", "timestamp", "kind", "value"],
+    )
+
+
+def _adj_closes(code):
+    return [
+        float(value)
+        for value in models.PriceRecord.objects.filter(company_id=code)
+        .order_by("timestamp")
+        .values_list("adj_close", flat=True)
+    ]
+
+
+@pytest.fixture
+def companies():
+    for code in ("AAA", "BBB"):
+        company = factories.CompanyFactory(trading_code=code)
+        for day in DAYS:
+            factories.PriceFactory(company=company, timestamp=day, close=10)
+
+
+@pytest.mark.django_db
+def test_dividends_adjust_earlier_closes(companies):
+    adjusted = adjustments.update_adjustments(
+        ["AAA", "BBB"],
+        [_actions("AAA", (5, "dividend", 1.0), (7, "split", 2.0))],
+    )
+
+    assert _adj_closes("AAA") == [9.0] * 5 + [10.0] * 5
+    assert _adj_closes("BBB") == [10.0] * 10
+    assert adjusted == 20
+    factors = dict(models.CorporateAction.objects.values_list("kind", "factor"))
+    assert factors == {"dividend": pytest.approx(0.9), "split": 1.0}
+
+
+@pytest.mark.django_db
+def test_new_actions_readjust_only_their_company(companies):
+    adjustments.update_adjustments(
+        ["AAA", "BBB"], [_actions("AAA", (5, "dividend", 1.0))]
+    )
+    # unchanged actions are downloaded again with every refresh
+    assert (
+        adjustments.update_adjustments(
+            ["AAA", "BBB"], [_actions("AAA", (5, "dividend", 1.0))], since=DAYS[8]
+        )
+        == 0
+    )
+
+    models.PriceRecord.objects.filter(company_id="BBB").update(adj_close=1)
+    adjusted = adjustments.update_adjustments(
+        ["AAA", "BBB"],
+        [_actions("AAA", (5, "dividend", 1.0), (8, "dividend", 0.5))],
+        since=DAYS[8],
+    )
+
+    assert _adj_closes("AAA") == [8.55] * 5 + [9.5] * 3 + [10.0] * 2
+    # BBB only from the start of its download
+    assert _adj_closes("BBB") == [1.0] * 8 + [10.0] * 2
+    assert adjusted == 8 + 2
+
+
+@pytest.mark.django_db
+def test_new_splits_rescale_the_prices_stored_before_them():
+    company = factories.CompanyFactory(trading_code="AAA")
+    for day in DAYS:
+        price = 10 if day < DAYS[7] else 5
+        factories.PriceFactory(
+            company=company,
+            timestamp=day,
+            low=price,
+            high=price,
+            open=price,
+            close=price,
+            adj_close=price,
+            volume=100 if day < DAYS[7] else 200,
+        )
+    factories.CompanyFactory(trading_code="BBB")
+    for code in ("AAA", "BBB"):
+        models.IndicatorState.objects.create(
+            company_id=code, indicator="sma_20", timestamp=DAYS[6], state={}
+        )
+        models.IndicatorValue.objects.create(
+            company_id=code, indicator="sma_20", timestamp=DAYS[6], value=10
+        )
+    # the refresh downloaded the prices from DAYS[8] on, split adjusted
+    for _ in range(2):
+        adjustments.update_adjustments(
+            ["AAA"], [_actions("AAA", (7, "split", 2.0))], since=DAYS[8]
+        )
+
+    assert _adj_closes("AAA") == [5.0] * 10
+    prices = models.PriceRecord.objects.filter(company_id="AAA")
+    assert {
+        float(value)
+        for field in ("low", "high", "open", "close")
+        for value in prices.values_list(field, flat=True)
+    } == {5.0}
+    assert set(prices.values_list("volume", flat=True)) == {200}
+    # indicators start over from the rescaled prices, other companies' stay
+    for indicator_model in (models.IndicatorState, models.IndicatorValue):
+        codes = indicator_model.objects.values_list("company_id", flat=True)
+        assert list(codes) == ["BBB"]
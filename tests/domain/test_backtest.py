@@ -0,0 +1,70 @@
+import numpy
+import pandas
+import pytest
+from application.rates.commsec import SettleToBank, SettleWithCDIA
+from data import models
+from tests import factories
+
+from domain import backtest
+
+
+@pytest.fixture
+def closes():
+    return pandas.DataFrame(
+        {"AAA": [10.0, 11.0, 12.0, 12.0], "BBB": [20.0, numpy.nan, 25.0, 30.0]},
+        index=pandas.date_range("2023-01-02", periods=4, tz="UTC"),
+    )
+
+
+def test_rebalance_charges_brokerage_and_values_holdings(closes):
+    weights = pandas.DataFrame(
+        {"AAA": [0.4, 0.0], "BBB": [0.4, 0.5]}, index=closes.index[[0, 2]]
+    )
+    result = backtest.backtest(closes, weights, initial_cash=10_000)
+
+    # buy 400 AAA @ 10 and 200 BBB @ 20
+    buy_costs = 2 * SettleWithCDIA.total(4000)
+    cash = 10_000 - 4000 - 4000 - buy_costs
+    assert result.cash.iloc[0] == pytest.approx(cash)
+    # BBB has no close on the second day, it keeps its last value
+    assert result.equity.iloc[1] == pytest.approx(cash + 400 * 11 + 200 * 20)
+
+    # sell 400 AAA @ 12, BBB stays at floor(0.5 * equity / 25) shares
+    equity = cash + 400 * 12 + 200 * 25
+    wanted_bbb = numpy.floor(0.5 * equity / 25)
+    assert result.positions.iloc[1].tolist() == [0, wanted_bbb]
+    costs = SettleToBank.total(4800) + SettleWithCDIA.total((wanted_bbb - 200) * 25)
+    assert result.costs.iloc[1] == pytest.approx(costs)
+    assert result.turnover.iloc[1] == pytest.approx(
+        (4800 + (wanted_bbb - 200) * 25) / equity
+    )
+    assert result.equity.iloc[3] == pytest.approx(result.cash.iloc[3] + wanted_bbb * 30)
+
+
+def test_rebalance_dates_need_closes(closes):
+    weights = pandas.DataFrame(
+        {"AAA": [1.0]}, index=[pandas.Timestamp("2022-01-01", tz="UTC")]
+    )
+    with pytest.raises(ValueError):
+        backtest.backtest(closes, weights)
+
+
+def test_weights_from_signals():
+    signals = pandas.DataFrame({"AAA": [1, 1, -1], "BBB": [2, -1, numpy.nan]})
+    weights = backtest.weights_from_signals(signals)
+    assert weights.to_numpy().tolist() == [[0.5, 0.5], [1.0, 0.0], [0.0, 0.0]]
+
+
+@pytest.mark.django_db
+def test_save_portfolio_keeps_final_positions(closes):
+    for code in closes.columns:
+        factories.CompanyFactory(trading_code=code)
+    weights = pandas.DataFrame({"AAA": [0.9]}, index=closes.index[[2]])
+    result = backtest.backtest(closes, weights, initial_cash=10_000)
+
+    backtest.save_portfolio("test", result, closes)
+    holding = models.Portfolio.objects.get(name="test").holdings.get()
+    assert holding.company_id == "AAA"
+    assert holding.quantity == 750
+    assert holding.purchased_price == 12
+    assert holding.purchased_at == closes.index[2]
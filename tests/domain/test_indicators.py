@@ -0,0 +1,126 @@
+import datetime
+
+import numpy
+import pandas
+import pytest
+from application.yfinance_adaptor import adaptors
+from data import models
+from tests import factories
+from utils import industrytime
+
+from domain import indicators
+
+
+def _bars(days, seed=0):
+    generator = numpy.random.default_rng(seed)
+    close = 10 * numpy.exp(numpy.cumsum(generator.normal(0, 0.02, days)))
+    return {
+        "timestamp": numpy.arange(days, dtype="int64") * 86_400 * 10**9,
+        "high": close * 1.01,
+        "low": close * 0.99,
+        "close": close,
+    }
+
+
+@pytest.mark.parametrize(
+    "indicator", indicators.DEFAULT_INDICATORS, ids=lambda indicator: indicator.key
+)
+def test_carrying_on_from_state_matches_full_computation(indicator):
+    bars = _bars(120)
+    full, _ = indicator.compute(bars, None)
+
+    head, state_at = indicator.compute({k: v[:70] for k, v in bars.items()}, None)
+    tail, _ = indicator.compute({k: v[70:] for k, v in bars.items()}, state_at(69))
+    numpy.testing.assert_allclose(numpy.concatenate([head, tail]), full)
+
+
+def test_reference_values():
+    bars = _bars(60)
+    close = pandas.Series(bars["close"])
+    numpy.testing.assert_allclose(
+        indicators.SMA(20).compute(bars, None)[0], close.rolling(20).mean()
+    )
+    numpy.testing.assert_allclose(
+        indicators.EMA(20).compute(bars, None)[0],
+        close.ewm(span=20, adjust=False).mean(),
+    )
+    rsi = indicators.RSI(14).compute(bars, None)[0]
+    assert numpy.isnan(rsi[0]) and numpy.all((rsi[1:] >= 0) & (rsi[1:] <= 100))
+
+
+@pytest.mark.django_db
+def test_sync_only_computes_new_prices_and_builds_panels():
+    days = [
+        industrytime.industry_midnight(datetime.datetime(2022, 1, 1))
+        + datetime.timedelta(days=day)
+        for day in range(60)
+    ]
+    for code in ("AAA", "BBB"):
+        company = factories.CompanyFactory(trading_code=code)
+        for day, close in zip(days[:40], _bars(40)["close"]):
+            factories.PriceFactory(
+                company=company, timestamp=day, close=round(close, 3)
+            )
+    adaptor = adaptors.PostGresCopyAdaptor()
+    sma = indicators.SMA(20)
+
+    indicators.sync_indicators(adaptor, ["AAA", "BBB"], [sma])
+    state = models.IndicatorState.objects.get(company_id="AAA", indicator=sma.key)
+    # checkpointed before the revision window
+    assert state.timestamp == days[32]
+    assert len(state.state["closes"]) == 19
+
+    for day in days[40:]:
+        factories.PriceFactory(company_id="AAA", timestamp=day, close=1)
+    counts = indicators.sync_indicators(adaptor, ["AAA", "BBB"], [sma])
+    # the new prices, plus the revision window of both companies recomputed
+    assert counts.inserted == 20
+    assert counts.updated + counts.unchanged == 14
+
+    panel = indicators.get_indicator_panel(["AAA", "BBB"], sma.key)
+    assert list(panel.columns) == ["AAA", "BBB"]
+    assert len(panel) == 60 - 19
+    assert panel["BBB"].isna().sum() == 20
+    prices = pandas.Series(
+        models.PriceRecord.objects.filter(company_id="AAA")
+        .order_by("timestamp")
+        .values_list("close", flat=True)
+    ).astype(float)
+    numpy.testing.assert_allclose(panel["AAA"], prices.rolling(20).mean().dropna())
+
+
+class _FailingAdaptor(adaptors.PostGresCopyAdaptor):
+    def __init__(self, failing_code: str):
+        super().__init__()
+        self.failing_code = failing_code
+
+    def upsert_model(self, django_model, dfs, unique_fields=None):
+        dfs = list(dfs)
+        if any((df["company_id"] == self.failing_code).any() for df in dfs):
+            raise RuntimeError(self.failing_code)
+        return super().upsert_model(django_model, dfs, unique_fields)
+
+
+@pytest.mark.django_db
+def test_sync_commits_values_with_their_checkpoints_per_chunk():
+    days = [
+        industrytime.industry_midnight(datetime.datetime(2022, 1, 1))
+        + datetime.timedelta(days=day)
+        for day in range(40)
+    ]
+    for code in ("AAA", "BBB"):
+        company = factories.CompanyFactory(trading_code=code)
+        for day, close in zip(days, _bars(40)["close"]):
+            factories.PriceFactory(
+                company=company, timestamp=day, close=round(close, 3)
+            )
+    sma = indicators.SMA(20)
+
+    with pytest.raises(RuntimeError):
+        indicators.sync_indicators(_FailingAdaptor("BBB"), ["AAA", "BBB"], [sma], 1)
+
+    # the first chunk is kept, values and checkpoint alike
+    assert models.IndicatorValue.objects.filter(company_id="AAA").count() == 21
+    assert models.IndicatorState.objects.filter(company_id="AAA").exists()
+    assert not models.IndicatorValue.objects.filter(company_id="BBB").exists()
+    assert not models.IndicatorState.objects.filter(company_id="BBB").exists()
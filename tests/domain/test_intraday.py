@@ -0,0 +1,130 @@
+import datetime
+
+import pandas
+import pytest
+from application.yfinance_adaptor import adaptors
+from data import models
+from django.db import connection
+from tests import factories
+
+from domain import intraday
+
+
+def _bars(code, start, minutes, close=None):
+    timestamps = pandas.date_range(
+        start, periods=minutes, freq="min", tz="Australia/Melbourne"
+    )
+    closes = (
+        [float(i) for i in range(1, minutes + 1)]
+        if close is None
+        else [close] * minutes
+    )
+    return pandas.DataFrame(
+        {
+            "timestamp": timestamps,
+            "open": closes,
+            "high": [value + 1 for value in closes],
+            "low": [value - 1 for value in closes],
+            "close": closes,
+            "adj_close": closes,
+            "volume": [10] * minutes,
+            "company_id": [code] * minutes,
+        }
+    )
+
+
+@pytest.mark.django_db
+class TestIntradayRollups:
+    @pytest.fixture(autouse=True)
+    def company(self):
+        return factories.CompanyFactory(trading_code="AAA")
+
+    def test_bars_are_rolled_up_per_interval(self):
+        # 10:00 -> 11:30, crossing a month boundary in UTC
+        counts = intraday.load_bars(
+            adaptors.PostGresCopyAdaptor(), [_bars("AAA", "2023-02-01 10:00", 90)]
+        )
+        assert counts.inserted == 90
+
+        five_minutes = list(intraday.get_bars("AAA", "5m"))
+        assert len(five_minutes) == 18
+        assert (five_minutes[0].open, five_minutes[0].close) == (1, 5)
+        assert (five_minutes[0].high, five_minutes[0].low) == (6, 0)
+        assert five_minutes[0].volume == 50
+
+        hours = list(intraday.get_bars("AAA", "1h"))
+        assert [bar.volume for bar in hours] == [600, 300]
+        (day,) = intraday.get_bars("AAA", "1d")
+        assert (day.open, day.close, day.high, day.low) == (1, 90, 91, 0)
+        assert day.timestamp == pandas.Timestamp("2023-02-01", tz="Australia/Melbourne")
+
+    def test_later_loads_only_update_touched_buckets(self):
+        adaptor = adaptors.PostGresCopyAdaptor()
+        intraday.load_bars(adaptor, [_bars("AAA", "2023-02-01 10:00", 62)])
+        # a revised last minute and the minutes after it
+        intraday.load_bars(adaptor, [_bars("AAA", "2023-02-01 11:01", 5, close=100)])
+
+        hours = list(intraday.get_bars("AAA", "1h"))
+        assert [bar.close for bar in hours] == [60, 100]
+        assert hours[1].volume == 60
+        (day,) = intraday.get_bars("AAA", "1d")
+        assert (day.close, day.high, day.volume) == (100, 101, 660)
+        assert models.IntradayBar.objects.filter(company_id="AAA").count() == 66
+
+    def test_bars_are_keyed_on_company_and_timestamp(self):
+        factories.CompanyFactory(trading_code="BBB")
+        intraday.load_bars(
+            adaptors.PostGresCopyAdaptor(),
+            [_bars("AAA", "2023-02-01 10:00", 2), _bars("BBB", "2023-02-01 10:00", 2)],
+        )
+        bar = models.IntradayBar.objects.filter(company_id="AAA").earliest("timestamp")
+        assert models.IntradayBar.objects.get(pk=bar.pk).company_id == "AAA"
+
+        timestamp = bar.timestamp
+        bar.delete()
+        assert sorted(
+            models.IntradayBar.objects.filter(timestamp=timestamp).values_list(
+                "company_id", flat=True
+            )
+        ) == ["BBB"]
+        assert models.IntradayBar.objects.count() == 3
+
+    def test_bars_are_loaded_and_rolled_up_chunk_by_chunk(self):
+        factories.CompanyFactory(trading_code="BBB")
+
+        def frames():
+            yield _bars("AAA", "2023-02-01 10:00", 60)
+            # the first chunk is in before the next frame is read
+            assert models.IntradayRollup.objects.filter(company_id="AAA").exists()
+            yield _bars("BBB", "2023-02-01 10:00", 60)
+
+        counts = intraday.load_bars(
+            adaptors.PostGresCopyAdaptor(), frames(), chunk_rows=60
+        )
+
+        assert counts.inserted == 120
+        assert [bar.volume for bar in intraday.get_bars("BBB", "1h")] == [600]
+
+    def test_deleting_a_company_deletes_its_bars(self, company):
+        intraday.load_bars(
+            adaptors.PostGresCopyAdaptor(), [_bars("AAA", "2023-02-01 10:00", 2)]
+        )
+        company.delete()
+        assert not models.IntradayBar.objects.exists()
+
+    def test_partitions_are_created_per_month(self):
+        intraday.ensure_partitions(
+            datetime.datetime(2023, 1, 15, tzinfo=datetime.timezone.utc),
+            datetime.datetime(2023, 3, 1, tzinfo=datetime.timezone.utc),
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT relname FROM pg_class WHERE relkind = 'r' "
+                "AND relname LIKE 'data_intradaybar_p%%' "
+                "ORDER BY relname"
+            )
+            assert [row[0] for row in cursor.fetchall()] == [
+                "data_intradaybar_p202301",
+                "data_intradaybar_p202302",
+                "data_intradaybar_p202303",
+            ]
@@ -1,10 +1,12 @@
 import datetime
 from unittest import mock
 
+import numpy
 import pytest
 import time_machine
-from application import yfinance_adaptor
+from application import price_store, yfinance_adaptor
 from application.yfinance_adaptor import adaptors
+from benchmarks import synthetic
 from data import models
 from django.db import connection
 from tests import factories
@@ -48,7 +50,9 @@ class TestListing:
 
     @time_machine.travel("2023-01-01", tick=False)
     def test_retiring_listing_company(self, mock_get_current_companies):
-        mock_get_current_companies.return_value = []
+        mock_get_current_companies.return_value = [
+            asx.CompanyInfo(name="OTHER", code="OTHER", group="TEST")
+        ]
         test_company = factories.CompanyFactory()
         factories.ActivePeriodFactory(company=test_company, start_date="2022-01-01")
         operations.refresh_asx_company_list()
@@ -69,6 +73,38 @@ class TestListing:
         ).start_date == datetime.date(2022, 1, 1)
         assert test_company.active_periods.latest("start_date").end_date is None
 
+    def test_empty_listing_delists_nothing(self, mock_get_current_companies):
+        mock_get_current_companies.return_value = []
+        company = factories.CompanyFactory(trading_code="TEST")
+        factories.ActivePeriodFactory(company=company, start_date="2022-01-01")
+
+        with pytest.raises(asx.ListingUnavailable):
+            operations.refresh_asx_company_list()
+        assert company.active_periods.get().end_date is None
+
+    @time_machine.travel("2023-01-01", tick=False)
+    def test_round_trips_do_not_grow_with_companies(
+        self, mock_get_current_companies, django_assert_num_queries
+    ):
+        mock_get_current_companies.return_value = [
+            asx.CompanyInfo(name=code, code=code, group="TEST")
+            for code in ("NEW", "KEEP")
+        ]
+        for i in range(20):
+            company = factories.CompanyFactory(trading_code=f"D{i:02d}")
+            factories.ActivePeriodFactory(company=company, start_date="2022-01-01")
+        keep = factories.CompanyFactory(trading_code="KEEP")
+        factories.ActivePeriodFactory(company=keep, start_date="2022-01-01")
+
+        with django_assert_num_queries(12):
+            operations.refresh_asx_company_list()
+
+        assert not models.ActivePeriod.objects.filter(
+            company__trading_code__startswith="D", end_date__isnull=True
+        ).exists()
+        assert keep.active_periods.get().end_date is None
+        assert models.Company.objects.get(trading_code="NEW").industry.name == "TEST"
+
 
 @pytest.mark.django_db
 @time_machine.travel("2023-01-01", tick=False)
@@ -92,6 +128,7 @@ def test_fetch_prices(mock_yf_downloader, django_db_setup, django_db_blocker):
         tickers=[f"{test_trading_code}.AX"],
         start=start_datetime,
         adaptor=postgre_adaptor,
+        actions=True,
     )
     price_count = test_company.prices.count()
     assert price_count != 0
@@ -108,6 +145,7 @@ def test_fetch_prices(mock_yf_downloader, django_db_setup, django_db_blocker):
         tickers=[f"{test_trading_code}.AX"],
         start=missing_from + datetime.timedelta(days=-7),
         adaptor=postgre_adaptor,
+        actions=True,
     )
     assert test_company.prices.count() == price_count
 
@@ -125,3 +163,154 @@ def test_organise_active_period():
     operations.organise_active_periods(test_company)
     test_period.refresh_from_db()
     assert test_period.start_date == datetime.date(1979, 1, 1)
+
+
+@pytest.mark.django_db
+@time_machine.travel("2023-01-01", tick=False)
+@mock.patch.object(yfinance_adaptor, "YFDownloader")
+def test_update_prices_batches_codes_by_their_own_watermark(mock_yf_downloader):
+    recent = industrytime.industry_midnight(datetime.datetime(2022, 12, 20))
+    for code, latest in [("AAA", recent), ("BBB", recent), ("CCC", None)]:
+        company = factories.CompanyFactory(trading_code=code)
+        factories.ActivePeriodFactory(
+            company=company, start_date=datetime.date(1980, 1, 1)
+        )
+        if latest is not None:
+            factories.PriceFactory(company=company, timestamp=latest)
+    mock_yf_downloader.return_value.actions = []
+
+    operations.update_prices(
+        adaptors.PostGresCopyAdaptor(), codes=["AAA", "BBB", "CCC"]
+    )
+
+    assert mock_yf_downloader.call_args_list == [
+        mock.call(
+            tickers=["CCC.AX"],
+            start=industrytime.industry_midnight(datetime.datetime(1980, 1, 1)),
+            adaptor=mock.ANY,
+            actions=True,
+        ),
+        mock.call(
+            tickers=["AAA.AX", "BBB.AX"],
+            start=recent + datetime.timedelta(days=-7),
+            adaptor=mock.ANY,
+            actions=True,
+        ),
+    ]
+    # the revision window is cleared before being downloaded again
+    assert not models.PriceRecord.objects.filter(company_id__in=["AAA", "BBB"]).exists()
+
+
+@pytest.mark.django_db
+@time_machine.travel("2023-01-01", tick=False)
+@mock.patch.object(yfinance_adaptor, "YFDownloader")
+def test_update_prices_upsert_mode_keeps_existing_prices(mock_yf_downloader):
+    company = factories.CompanyFactory(trading_code="AAA")
+    factories.ActivePeriodFactory(company=company, start_date=datetime.date(1980, 1, 1))
+    factories.PriceFactory(
+        company=company,
+        timestamp=industrytime.industry_midnight(datetime.datetime(2022, 12, 20)),
+    )
+    mock_yf_downloader.return_value.upsert.return_value = adaptors.LoadCounts(
+        inserted=3, unchanged=5
+    )
+    mock_yf_downloader.return_value.actions = []
+
+    report = operations.update_prices(
+        adaptors.PostGresCopyAdaptor(),
+        codes=["AAA"],
+        mode=operations.PriceUpdateMode.UPSERT,
+    )
+
+    assert report.codes == ["AAA"]
+    assert report.counts == adaptors.LoadCounts(inserted=3, unchanged=5)
+    assert report.snapshots == 1
+    assert company.price_snapshot.timestamp == company.prices.get().timestamp
+    mock_yf_downloader.return_value.export.assert_not_called()
+    assert company.prices.count() == 1
+
+
+@pytest.mark.django_db
+@time_machine.travel("2023-01-01", tick=False)
+@pytest.mark.parametrize("mode", list(operations.PriceUpdateMode))
+def test_update_prices_budgets_a_batch_of_many_codes_on_the_orm_loader(mode):
+    codes = synthetic.synthetic_codes(40)
+    for code in codes:
+        company = factories.CompanyFactory(trading_code=code)
+        factories.ActivePeriodFactory(
+            company=company, start_date=datetime.date(1980, 1, 1)
+        )
+        factories.PriceFactory(
+            company=company,
+            timestamp=industrytime.industry_midnight(datetime.datetime(2022, 12, 1)),
+        )
+    frame = synthetic.synthetic_yf_frame(codes, 20, start="2022-12-01", nan_ratio=0)
+
+    # budgets are enforced in the tests, a statement per code would exceed them
+    with mock.patch.object(
+        yfinance_adaptor.YFDownloader,
+        "fetch",
+        lambda self, tickers, start=None: frame,
+    ):
+        report = operations.update_prices(
+            adaptors.PostGresDjangoAdaptor.from_django_settings(), codes, mode
+        )
+
+    assert sorted(report.codes) == codes
+    assert models.PriceRecord.objects.filter(company_id__in=codes).count() == 40 * 20
+    assert report.snapshots == 40
+
+
+@pytest.mark.django_db
+def test_sync_price_store_appends_and_revises_recent_prices(tmp_path):
+    company = factories.CompanyFactory(trading_code="AAA")
+    timestamps = [
+        industrytime.industry_midnight(datetime.datetime(2022, 12, day))
+        for day in range(1, 21)
+    ]
+    for timestamp in timestamps[:10]:
+        factories.PriceFactory(company=company, timestamp=timestamp)
+    store = price_store.PriceStore(tmp_path, writable=True)
+    assert operations.sync_price_store(store, ["AAA"]) == 10
+
+    company.prices.filter(timestamp=timestamps[8]).update(close=2)
+    for timestamp in timestamps[10:]:
+        factories.PriceFactory(company=company, timestamp=timestamp)
+    # the revision window is read again
+    assert operations.sync_price_store(store, ["AAA"]) == 18
+
+    series = price_store.PriceStore(tmp_path).get_series("AAA")
+    assert list(series.datetimes) == [
+        numpy.datetime64(
+            timestamp.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        )
+        for timestamp in timestamps
+    ]
+    assert series.close[8] == 2
+
+
+@pytest.mark.django_db
+def test_bulk_organise_active_periods(django_assert_max_num_queries):
+    listed = industrytime.industry_midnight(datetime.datetime(1979, 1, 1))
+    unlisted = factories.CompanyFactory(trading_code="AAA")
+    moved = factories.CompanyFactory(trading_code="BBB")
+    unchanged = factories.CompanyFactory(trading_code="CCC")
+    factories.ActivePeriodFactory(
+        company=moved,
+        start_date=datetime.date(1980, 1, 1),
+        end_date=datetime.date(1985, 1, 1),
+    )
+    factories.ActivePeriodFactory(company=moved, start_date=datetime.date(1990, 1, 1))
+    factories.ActivePeriodFactory(company=unchanged, start_date=listed.date())
+    for company in (unlisted, moved, unchanged):
+        factories.PriceFactory(company=company, timestamp=listed)
+
+    with django_assert_max_num_queries(6):
+        touched = operations.bulk_organise_active_periods(["AAA", "BBB", "CCC"])
+
+    assert touched == 2
+    for company in (unlisted, moved, unchanged):
+        assert company.active_periods.earliest("start_date").start_date == listed.date()
+    assert moved.active_periods.latest("start_date").start_date == datetime.date(
+        1990, 1, 1
+    )
@@ -0,0 +1,50 @@
+import datetime
+
+import pytest
+from data import models
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from tests import factories
+
+from domain import partitions
+
+
+def _partition_of(price: models.PriceRecord) -> str:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT tableoid::regclass::text FROM "{partitions.PRICE_TABLE}" '
+            "WHERE id = %s",
+            [price.id],
+        )
+        return cursor.fetchone()[0]
+
+
+@pytest.mark.django_db
+def test_prices_are_moved_out_of_the_default_partition():
+    price = factories.PriceFactory(
+        company=factories.CompanyFactory(),
+        timestamp=datetime.datetime(1999, 6, 1, tzinfo=datetime.timezone.utc),
+    )
+    assert _partition_of(price) == partitions.DEFAULT_PARTITION
+    assert partitions.get_default_partition_years() == [1999]
+
+    assert partitions.ensure_partitions([1999, 2000]) == [
+        "data_pricerecord_y1999",
+        "data_pricerecord_y2000",
+    ]
+    assert partitions.ensure_partitions([1999]) == []
+    assert _partition_of(price) == "data_pricerecord_y1999"
+    assert partitions.get_default_partition_years() == []
+    # the partition is indexed like the table
+    with pytest.raises(IntegrityError), transaction.atomic():
+        factories.PriceFactory(company=price.company, timestamp=price.timestamp)
+
+
+@pytest.mark.django_db
+def test_command_creates_future_partitions(capsys):
+    this_year = datetime.date.today().year
+    call_command("create_price_partitions", years_ahead=3)
+    names = partitions.get_partitions()
+    for year in range(this_year, this_year + 4):
+        assert partitions.partition_name(year) in names
+    assert partitions.partition_name(this_year + 3) in capsys.readouterr().out
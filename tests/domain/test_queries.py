@@ -0,0 +1,67 @@
+import datetime
+
+import numpy
+import pandas
+import pytest
+from data import models
+from tests import factories
+from utils import industrytime
+
+from domain import queries
+
+
+@pytest.mark.django_db
+def test_price_panel_matches_orm_values():
+    days = [
+        industrytime.industry_midnight(datetime.datetime(2022, 1, 3))
+        + datetime.timedelta(days=day)
+        for day in range(5)
+    ]
+    for code, count in (("AAA", 5), ("BBB", 3)):
+        company = factories.CompanyFactory(trading_code=code)
+        for close, day in enumerate(days[5 - count :], start=1):
+            factories.PriceFactory(company=company, timestamp=day, close=close)
+    models.PriceRecord.objects.filter(company_id="AAA", timestamp=days[0]).update(
+        adj_close=None
+    )
+
+    panel = queries.get_price_panel(
+        ["BBB", "AAA", "ZZZ"], fields=["close", "adj_close"]
+    )
+    assert list(panel.columns.get_level_values(0).unique()) == ["close", "adj_close"]
+    assert list(panel["close"].columns) == ["BBB", "AAA", "ZZZ"]
+    assert list(panel.index) == [pandas.Timestamp(day) for day in days]
+    assert panel["close"]["BBB"].isna().tolist() == [True, True, False, False, False]
+    assert panel["close"]["ZZZ"].isna().all()
+    assert numpy.isnan(panel["adj_close"].loc[pandas.Timestamp(days[0]), "AAA"])
+
+    expected = (
+        pandas.DataFrame(
+            list(
+                models.PriceRecord.objects.filter(company_id="AAA").values(
+                    "timestamp", "close"
+                )
+            )
+        )
+        .set_index("timestamp")["close"]
+        .astype(float)
+        .sort_index()
+    )
+    numpy.testing.assert_allclose(panel["close"]["AAA"], expected)
+
+    dates, arrays = queries.get_price_arrays(["AAA", "BBB"], start=days[1], end=days[4])
+    assert list(arrays) == ["close"]
+    assert arrays["close"].shape == (3, 2)
+    assert (
+        pandas.DatetimeIndex(dates)
+        .tz_localize("UTC")
+        .equals(pandas.DatetimeIndex(days[1:4]).tz_convert("UTC"))
+    )
+
+
+@pytest.mark.django_db
+def test_price_panel_without_prices_or_with_unknown_fields():
+    panel = queries.get_price_panel(["AAA"])
+    assert panel.empty and list(panel.columns) == [("close", "AAA")]
+    with pytest.raises(ValueError):
+        queries.get_price_arrays(["AAA"], fields=["price"])
@@ -0,0 +1,96 @@
+import datetime
+from unittest import mock
+
+import pytest
+from data import models
+from tests import factories
+from utils import asx, industrytime
+from utils.query_budget import QueryBudget, QueryBudgetExceeded
+
+from domain import adjustments, operations
+
+
+def _companies(prefix, n):
+    codes = [f"{prefix}{i:03d}" for i in range(n)]
+    models.IndustryGroup.objects.get_or_create(name="Listed")
+    for code in codes:
+        company = factories.CompanyFactory(trading_code=code)
+        factories.ActivePeriodFactory(
+            company=company,
+            start_date=datetime.date(2000, 1, 1),
+            end_date=datetime.date(2010, 1, 1),
+        )
+        factories.ActivePeriodFactory(
+            company=company, start_date=datetime.date(2011, 1, 1)
+        )
+        factories.PriceFactory(
+            company=company,
+            timestamp=industrytime.industry_midnight(datetime.datetime(1999, 1, 1)),
+        )
+    return codes
+
+
+def _refresh_listing(codes):
+    listing = [asx.CompanyInfo(name=code, code=code, group="Listed") for code in codes]
+    with mock.patch.object(asx, "get_current_companies", return_value=listing):
+        operations.refresh_asx_company_list()
+
+
+def _active_at(codes):
+    at = industrytime.industry_midnight(datetime.datetime(2010, 6, 1))
+    companies = models.Company.objects.filter(trading_code__in=codes)
+    assert not any(
+        company.is_active_at(at)
+        for company in companies.prefetch_related("active_periods")
+    )
+
+
+def _organise_one(codes):
+    operations.organise_active_periods(
+        models.Company.objects.get(trading_code=codes[0])
+    )
+
+
+OPERATIONS = {
+    "refresh_asx_company_list": _refresh_listing,
+    "get_price_download_batches": operations.get_price_download_batches,
+    "organise_active_periods": _organise_one,
+    "bulk_organise_active_periods": operations.bulk_organise_active_periods,
+    "update_adjustments": adjustments.update_adjustments,
+    "is_active_at": _active_at,
+}
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("operation", OPERATIONS)
+def test_queries_do_not_grow_with_companies(operation):
+    counts = []
+    for prefix, n in [("A", 1), ("B", 8)]:
+        codes = _companies(prefix, n)
+        with QueryBudget() as budget:
+            OPERATIONS[operation](codes)
+        counts.append(budget.queries)
+    assert counts[0] == counts[1]
+
+
+@pytest.mark.django_db
+def test_budget_exceeded():
+    @QueryBudget(1)
+    def count_twice():
+        models.Company.objects.count()
+        models.Company.objects.count()
+
+    with pytest.raises(QueryBudgetExceeded, match="count_twice ran 2 queries"):
+        count_twice()
+
+    with QueryBudget(2) as budget:
+        count_twice.__wrapped__()
+    assert budget.queries == 2 and budget.seconds > 0
+
+
+@pytest.mark.django_db
+def test_budget_only_warns_unless_enforced(settings, caplog):
+    settings.QUERY_BUDGETS_ENFORCED = False
+    with QueryBudget(0, name="listing"):
+        models.Company.objects.count()
+    assert "listing ran 1 queries" in caplog.text
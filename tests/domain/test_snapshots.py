@@ -0,0 +1,85 @@
+import datetime
+
+import numpy
+import pandas
+import pytest
+from data import models
+from tests import factories
+from utils import industrytime
+
+from domain import queries, snapshots
+
+
+def _prices(code, closes, start=datetime.datetime(2022, 1, 3)):
+    company = factories.CompanyFactory(trading_code=code)
+    days = pandas.bdate_range(start, periods=len(closes))
+    models.PriceRecord.objects.bulk_create(
+        models.PriceRecord(
+            company=company,
+            timestamp=industrytime.industry_midnight(day.to_pydatetime()),
+            open=close,
+            high=close + 1,
+            low=close - 1,
+            close=close,
+            adj_close=close / 2,
+            volume=index,
+        )
+        for index, (day, close) in enumerate(zip(days, closes))
+    )
+    return company
+
+
+@pytest.mark.django_db
+def test_snapshots_of_touched_codes(django_assert_max_num_queries):
+    closes = numpy.round(numpy.linspace(10, 40, 300) + numpy.sin(range(300)), 3)
+    _prices("AAA", closes)
+    _prices("BBB", [5.0, 6.0, 7.5])
+    stale = factories.CompanyFactory(trading_code="CCC")
+    models.PriceSnapshot.objects.create(
+        company=stale,
+        timestamp=datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc),
+        low=1,
+        high=1,
+        open=1,
+        close=1,
+        volume=1,
+        high_52w=1,
+        low_52w=1,
+        average_volume_20d=1,
+    )
+
+    with django_assert_max_num_queries(4):
+        assert snapshots.refresh_snapshots(["AAA", "BBB", "CCC"]) == 2
+    panel = queries.get_price_snapshots()
+    assert sorted(panel.index) == ["AAA", "BBB"]
+
+    aaa = panel.loc["AAA"]
+    assert float(aaa["close"]) == pytest.approx(closes[-1])
+    assert aaa["volume"] == 299
+    assert aaa["average_volume_20d"] == pytest.approx(numpy.mean(range(280, 300)))
+    # a year of business days back from the latest bar
+    year = closes[-261:]
+    assert float(aaa["high_52w"]) == pytest.approx(year.max() + 1)
+    assert float(aaa["low_52w"]) == pytest.approx(year.min() - 1)
+    adjusted = numpy.round(closes / 2, 3)
+    for column, bars in snapshots.RETURN_BARS.items():
+        assert aaa[column] == pytest.approx(adjusted[-1] / adjusted[-1 - bars] - 1)
+
+    bbb = panel.loc["BBB"]
+    assert bbb["return_1d"] == pytest.approx(0.25)
+    assert numpy.isnan(bbb["return_5d"])
+
+
+@pytest.mark.django_db
+def test_refreshing_follows_new_prices():
+    _prices("AAA", [10.0, 11.0])
+    snapshots.refresh_snapshots(["AAA"])
+    models.PriceRecord.objects.filter(company_id="AAA").order_by(
+        "-timestamp"
+    ).first().delete()
+    snapshots.refresh_snapshots(["AAA"])
+
+    snapshot = models.PriceSnapshot.objects.get(company_id="AAA")
+    assert float(snapshot.close) == 10.0
+    assert snapshot.return_1d is None
+    assert snapshots.refresh_snapshots([]) == 0
@@ -0,0 +1,139 @@
+import datetime
+import os
+from unittest import mock
+
+import pytest
+import requests
+
+from utils import asx
+
+LISTING = """ASX listed companies as at Sun Jan 01 00:00:00 AEDT 2023
+
+Company name,ASX code,GICS industry group
+"MOQ LIMITED",MOQ,"Software & Services"
+"1414 DEGREES LIMITED",14D,"Capital Goods"
+"""
+
+
+@pytest.fixture
+def listing_file(tmp_path):
+    path = tmp_path / "ASXListedCompanies.csv"
+    path.write_text(LISTING)
+    return path
+
+
+def _cache(tmp_path, source, ttl=datetime.timedelta(hours=1)):
+    return asx.ListingCache(source, directory=tmp_path / "cache", ttl=ttl)
+
+
+def test_parse_listing():
+    assert list(asx.parse_listing(LISTING.splitlines())) == [
+        asx.CompanyInfo(name="MOQ LIMITED", code="MOQ", group="Software & Services"),
+        asx.CompanyInfo(name="1414 DEGREES LIMITED", code="14D", group="Capital Goods"),
+    ]
+
+
+@pytest.mark.parametrize(
+    "body",
+    ["<html><body>Service unavailable</body></html>", LISTING.split('\n"MOQ')[0]],
+    ids=["no header", "no companies"],
+)
+def test_parse_listing_rejects_what_is_not_a_listing(body):
+    with pytest.raises(asx.ListingUnavailable):
+        list(asx.parse_listing(body.splitlines()))
+
+
+class TestListingCache:
+    def test_served_from_memory_within_ttl(self, tmp_path, listing_file):
+        source = asx.FileListingSource(listing_file)
+        listing = _cache(tmp_path, source)
+        assert listing.get() is listing.get()
+        assert source.fetches == 1
+
+    def test_unchanged_listing_is_not_downloaded_again(self, tmp_path, listing_file):
+        source = asx.FileListingSource(listing_file)
+        listing = _cache(tmp_path, source, ttl=datetime.timedelta(0))
+        companies = listing.get()
+        with mock.patch.object(asx.ListingCache, "_store") as mock_store:
+            assert listing.get() is companies
+            # a new process starts from the copy on disk
+            assert _cache(tmp_path, source).get() == companies
+        assert source.fetches == 3
+        mock_store.assert_not_called()
+
+    def test_invalidate_picks_up_changes(self, tmp_path, listing_file):
+        source = asx.FileListingSource(listing_file)
+        listing = _cache(tmp_path, source)
+        assert len(listing.get()) == 2
+
+        listing_file.write_text(LISTING + '"NEW LIMITED",NEW,"Banks"\n')
+        os.utime(listing_file, ns=(0, 0))
+        assert len(listing.get()) == 2
+        listing.invalidate()
+        assert listing.get()[-1].code == "NEW"
+
+    def test_disk_copy_is_used_when_the_source_fails(self, tmp_path, listing_file):
+        source = asx.FileListingSource(listing_file)
+        _cache(tmp_path, source).get()
+        listing_file.unlink()
+        assert len(_cache(tmp_path, source).get()) == 2
+
+    def test_disk_copy_is_used_when_the_body_fails_midway(self, tmp_path, listing_file):
+        listing = _cache(tmp_path, asx.FileListingSource(listing_file))
+        listing.get()
+
+        def broken_body():
+            yield b"Company name,ASX code"
+            raise requests.exceptions.ChunkedEncodingError("connection reset")
+
+        source = mock.Mock(spec=asx.ListingSource)
+        source.fetch.return_value = asx.ListingResponse(
+            modified=True, chunks=broken_body(), etag='"new"'
+        )
+        assert len(_cache(tmp_path, source).get()) == 2
+        assert sorted(path.name for path in (tmp_path / "cache").iterdir()) == [
+            "listing.csv",
+            "listing.json",
+        ]
+
+    def test_disk_copy_is_kept_when_served_something_else(self, tmp_path, listing_file):
+        _cache(tmp_path, asx.FileListingSource(listing_file)).get()
+
+        source = mock.Mock(spec=asx.ListingSource)
+        source.fetch.return_value = asx.ListingResponse(
+            modified=True, chunks=[b"<html>Service unavailable</html>"], etag='"new"'
+        )
+        assert len(_cache(tmp_path, source).get()) == 2
+        # and asked for again next time, the validators being unchanged
+        assert _cache(tmp_path, source)._validators() == (None, mock.ANY)
+
+    def test_unavailable_without_disk_copy(self, tmp_path):
+        source = asx.FileListingSource(tmp_path / "missing.csv")
+        with pytest.raises(asx.ListingUnavailable):
+            _cache(tmp_path, source).get()
+
+
+class TestHttpListingSource:
+    @mock.patch.object(requests, "get")
+    def test_conditional_request(self, mock_get):
+        mock_get.return_value.status_code = 304
+        response = asx.HttpListingSource(timeout=(1, 2)).fetch(
+            etag='"abc"', last_modified="Sun, 01 Jan 2023 00:00:00 GMT"
+        )
+        assert not response.modified
+        mock_get.assert_called_once_with(
+            asx.ListingCompanies,
+            headers={
+                "If-None-Match": '"abc"',
+                "If-Modified-Since": "Sun, 01 Jan 2023 00:00:00 GMT",
+            },
+            timeout=(1, 2),
+            stream=True,
+        )
+
+    @mock.patch.object(requests, "get")
+    def test_error_responses_raise(self, mock_get):
+        mock_get.return_value.status_code = 503
+        mock_get.return_value.raise_for_status.side_effect = requests.HTTPError
+        with pytest.raises(requests.HTTPError):
+            asx.HttpListingSource().fetch()
@@ -0,0 +1,41 @@
+import time
+
+import pytest
+from data import models
+from django.db import connection
+
+from utils import metrics as metrics_
+
+
+@pytest.mark.django_db
+def test_nested_stages_and_queries():
+    metrics = metrics_.Metrics()
+    with metrics.stage("outer") as outer:
+        models.Company.objects.count()
+        with metrics.stage("inner") as inner:
+            time.sleep(0.05)
+            models.Company.objects.count()
+            models.Company.objects.count()
+            inner.add(rows=3)
+        outer.add(rows=1, bytes_downloaded=10)
+    with metrics.stage("inner"):
+        pass
+
+    assert (outer.queries, inner.queries) == (1, 2)
+    assert (outer.rows, inner.rows, outer.bytes_downloaded) == (1, 3, 10)
+    assert inner.calls == 2
+    # the nested stage's time is not counted twice
+    assert inner.seconds >= 0.05 > outer.seconds
+    assert not connection.execute_wrappers
+
+
+def test_prometheus_text():
+    metrics = metrics_.Metrics()
+    with metrics.stage("download") as stage:
+        stage.add(rows=5, bytes_downloaded=100)
+
+    text = metrics.to_prometheus()
+    assert "# TYPE asx_refresh_stage_rows gauge" in text
+    assert 'asx_refresh_stage_rows{stage="download"} 5' in text
+    assert 'asx_refresh_stage_bytes_downloaded{stage="download"} 100' in text
+    assert "asx_refresh_last_run_timestamp_seconds" in text
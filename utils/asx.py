@@ -1,10 +1,22 @@
+from __future__ import annotations
+
+import abc
 import csv
 import dataclasses
-import io
-from functools import lru_cache
+import datetime
+import json
+import logging
+import os
+import pathlib
+import tempfile
+import threading
+import time
+from typing import Iterable, Iterator
 
 import requests
 
+logger = logging.getLogger(__name__)
+
 ListingCompanies = "https://www.asx.com.au/asx/research/ASXListedCompanies.csv"
 
 
@@ -15,27 +27,215 @@ class CompanyInfo:
     group: str
 
 
-@lru_cache
+class ListingUnavailable(Exception):
+    """
+    Raised when the listing can be neither downloaded nor read from disk, or
+    what was read is not a listing
+    """
+
+
+CSV_MAPPING = {
+    "Company name": "name",
+    "ASX code": "code",
+    "GICS industry group": "group",
+}
+
+
+def parse_listing(lines: Iterable[str]) -> Iterator[CompanyInfo]:
+    """
+    Parse the listing CSV line by line. The file starts with a title and a
+    blank line before the header, anything before the header is skipped.
+    Raises `ListingUnavailable` without a header or any company after it.
+    """
+    lines = iter(lines)
+    for line in lines:
+        if "ASX code" in line:
+            fields = next(csv.reader([line]))
+            break
+    else:
+        raise ListingUnavailable("No header in the listing")
+    companies = 0
+    for row in csv.DictReader(lines, fieldnames=fields):
+        if not row.get("ASX code"):
+            continue
+        companies += 1
+        yield CompanyInfo(
+            **{
+                mapping_to: row[mapping_from]
+                for mapping_from, mapping_to in CSV_MAPPING.items()
+            }
+        )
+    if not companies:
+        raise ListingUnavailable("No companies in the listing")
+
+
+@dataclasses.dataclass
+class ListingResponse:
+    modified: bool
+    chunks: Iterable[bytes] = ()
+    etag: str | None = None
+    last_modified: str | None = None
+
+
+class ListingSource(abc.ABC):
+    @abc.abstractmethod
+    def fetch(
+        self, etag: str | None = None, last_modified: str | None = None
+    ) -> ListingResponse:
+        """Listing content, unless unchanged since the given validators"""
+
+
+class HttpListingSource(ListingSource):
+    def __init__(
+        self, url: str = ListingCompanies, timeout: tuple[float, float] = (5, 30)
+    ) -> None:
+        self.url = url
+        self.timeout = timeout
+
+    def fetch(
+        self, etag: str | None = None, last_modified: str | None = None
+    ) -> ListingResponse:
+        headers = {}
+        if etag is not None:
+            headers["If-None-Match"] = etag
+        if last_modified is not None:
+            headers["If-Modified-Since"] = last_modified
+        response = requests.get(
+            self.url, headers=headers, timeout=self.timeout, stream=True
+        )
+        if response.status_code == 304:
+            return ListingResponse(modified=False)
+        response.raise_for_status()
+        return ListingResponse(
+            modified=True,
+            chunks=response.iter_content(chunk_size=1 << 16),
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+        )
+
+
+class FileListingSource(ListingSource):
+    """Listing read from a local CSV, its mtime standing in for Last-Modified"""
+
+    def __init__(self, path: str | os.PathLike) -> None:
+        self.path = pathlib.Path(path)
+        self.fetches = 0
+
+    def fetch(
+        self, etag: str | None = None, last_modified: str | None = None
+    ) -> ListingResponse:
+        self.fetches += 1
+        modified_at = str(self.path.stat().st_mtime_ns)
+        if modified_at == last_modified:
+            return ListingResponse(modified=False)
+        return ListingResponse(
+            modified=True, chunks=[self.path.read_bytes()], last_modified=modified_at
+        )
+
+
+class ListingCache(object):
+    """
+    Current listing kept in process for `ttl`, and on disk with the validators
+    it was served with. Once the TTL is up the source is asked for the listing
+    only if it changed; a new process starts from the disk copy the same way.
+    Should the source fail, or serve something that is not a listing, the
+    disk copy is kept and used if there is one.
+    """
+
+    def __init__(
+        self,
+        source: ListingSource,
+        directory: str | os.PathLike | None = None,
+        ttl: datetime.timedelta = datetime.timedelta(hours=1),
+    ) -> None:
+        self.source = source
+        self.directory = pathlib.Path(
+            directory
+            or os.environ.get("ASX_LISTING_DIR")
+            or pathlib.Path(tempfile.gettempdir()) / "asx-listing"
+        )
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._companies: list[CompanyInfo] | None = None
+        self._loaded_at: float | None = None
+
+    @property
+    def data_path(self) -> pathlib.Path:
+        return self.directory / "listing.csv"
+
+    @property
+    def meta_path(self) -> pathlib.Path:
+        return self.directory / "listing.json"
+
+    def invalidate(self) -> None:
+        """Revalidate against the source on the next `get`"""
+        with self._lock:
+            self._loaded_at = None
+
+    def _is_fresh(self) -> bool:
+        return (
+            self._loaded_at is not None
+            and time.monotonic() - self._loaded_at < self.ttl.total_seconds()
+        )
+
+    def _validators(self) -> tuple[str | None, str | None]:
+        if not (self.data_path.exists() and self.meta_path.exists()):
+            return None, None
+        meta = json.loads(self.meta_path.read_text())
+        return meta.get("etag"), meta.get("last_modified")
+
+    def _store(self, response: ListingResponse) -> list[CompanyInfo]:
+        """Replace the disk copy with the response, once parsed, returns it"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        temp_path = self.data_path.with_suffix(".tmp")
+        try:
+            # the body is streamed, reading it may fail midway
+            with open(temp_path, "wb") as file:
+                for chunk in response.chunks:
+                    file.write(chunk)
+            companies = self._read(temp_path)
+            os.replace(temp_path, self.data_path)
+        finally:
+            temp_path.unlink(missing_ok=True)
+        self.meta_path.write_text(
+            json.dumps({"etag": response.etag, "last_modified": response.last_modified})
+        )
+        return companies
+
+    def _read(self, path: pathlib.Path | None = None) -> list[CompanyInfo]:
+        with open(path or self.data_path, encoding="utf-8", errors="replace") as file:
+            return list(parse_listing(file))
+
+    def get(self) -> list[CompanyInfo]:
+        with self._lock:
+            if self._companies is not None and self._is_fresh():
+                return self._companies
+
+            etag, last_modified = self._validators()
+            companies = None
+            try:
+                response = self.source.fetch(etag, last_modified)
+                if response.modified:
+                    companies = self._store(response)
+            except (requests.RequestException, OSError, ListingUnavailable) as error:
+                if not self.data_path.exists():
+                    raise ListingUnavailable(str(error)) from error
+                logger.warning("Using the listing on disk: %s", error)
+            else:
+                if not response.modified and self._companies is not None:
+                    self._loaded_at = time.monotonic()
+                    return self._companies
+
+            self._companies = companies if companies is not None else self._read()
+            self._loaded_at = time.monotonic()
+            return self._companies
+
+
+listing = ListingCache(HttpListingSource())
+
+
 def get_current_companies() -> list[CompanyInfo]:
-    mapping = {
-        "Company name": "name",
-        "ASX code": "code",
-        "GICS industry group": "group",
-    }
-    response = requests.get(ListingCompanies)
-    if response.status_code == 200:
-        data = response.text.split("\n", 1)[1]
-        _, header, data = data.split("\n", 2)
-        fields = header.split(",")
-        return [
-            CompanyInfo(
-                **{
-                    mapping_to: row[mapping_from]
-                    for mapping_from, mapping_to in mapping.items()
-                }
-            )
-            for row in csv.DictReader(io.StringIO(data), fieldnames=fields)
-        ]
+    return listing.get()
 
 
 def get_industry_groups() -> set[str]:
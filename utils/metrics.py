@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import contextlib
+import dataclasses
+import json
+import logging
+import os
+import pathlib
+import threading
+import time
+from typing import Iterator
+
+from django.db import connection
+
+
+@dataclasses.dataclass
+class StageMetrics:
+    name: str
+    # time spent in the stage itself, not in the stages nested in it
+    seconds: float = 0.0
+    calls: int = 0
+    rows: int = 0
+    queries: int = 0
+    query_seconds: float = 0.0
+    bytes_downloaded: int = 0
+    _lock: threading.Lock = dataclasses.field(
+        default_factory=threading.Lock, repr=False, compare=False
+    )
+
+    def add(self, rows: int = 0, bytes_downloaded: int = 0) -> None:
+        with self._lock:
+            self.rows += rows
+            self.bytes_downloaded += bytes_downloaded
+
+    def as_dict(self) -> dict:
+        return {
+            field.name: getattr(self, field.name)
+            for field in dataclasses.fields(self)
+            if not field.name.startswith("_")
+        }
+
+
+PROMETHEUS_METRICS = {
+    "seconds": "Wall time spent in the stage, excluding nested stages",
+    "calls": "Times the stage ran",
+    "rows": "Rows the stage processed",
+    "queries": "SQL queries the stage ran",
+    "query_seconds": "Time the stage spent running SQL queries",
+    "bytes_downloaded": "Bytes the stage downloaded",
+}
+
+
+class Metrics(object):
+    """
+    Collects per stage metrics of a run. Stages of the same name accumulate,
+    and may nest or run on several threads; queries on Django's connection
+    are counted against the innermost stage of the thread running them.
+    """
+
+    def __init__(self) -> None:
+        self.stages: dict[str, StageMetrics] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _stack(self) -> list[StageMetrics]:
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def _record_query(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            stack = self._stack()
+            if stack:
+                with stack[-1]._lock:
+                    stack[-1].queries += 1
+                    stack[-1].query_seconds += time.perf_counter() - start
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[StageMetrics]:
+        with self._lock:
+            stage = self.stages.setdefault(name, StageMetrics(name))
+        stack = self._stack()
+        stack.append(stage)
+        wrapper = (
+            connection.execute_wrapper(self._record_query)
+            if len(stack) == 1
+            else contextlib.nullcontext()
+        )
+        start = time.perf_counter()
+        try:
+            with wrapper:
+                yield stage
+        finally:
+            elapsed = time.perf_counter() - start
+            stack.pop()
+            with stage._lock:
+                stage.seconds += elapsed
+                stage.calls += 1
+            if stack:
+                with stack[-1]._lock:
+                    stack[-1].seconds -= elapsed
+
+    def log(self, logger: logging.Logger) -> None:
+        """One structured record per stage, its metrics in `extra` and the message"""
+        for stage in self.stages.values():
+            metrics = stage.as_dict()
+            logger.info(
+                "refresh stage %s", json.dumps(metrics), extra={"metrics": metrics}
+            )
+
+    def to_prometheus(self, prefix: str = "asx_refresh") -> str:
+        lines = []
+        for metric, description in PROMETHEUS_METRICS.items():
+            name = f"{prefix}_stage_{metric}"
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} gauge")
+            for stage in self.stages.values():
+                lines.append(f'{name}{{stage="{stage.name}"}} {getattr(stage, metric)}')
+        lines.append(f"# HELP {prefix}_last_run_timestamp_seconds When the run ended")
+        lines.append(f"# TYPE {prefix}_last_run_timestamp_seconds gauge")
+        lines.append(f"{prefix}_last_run_timestamp_seconds {time.time()}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(
+        self, path: str | os.PathLike, prefix: str = "asx_refresh"
+    ) -> None:
+        """Write the text format atomically, for node exporter's textfile collector"""
+        path = pathlib.Path(path)
+        temp_path = path.with_suffix(path.suffix + ".tmp")
+        temp_path.write_text(self.to_prometheus(prefix))
+        os.replace(temp_path, path)
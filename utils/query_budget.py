@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import contextlib
+import logging
+import time
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised when a block runs more SQL statements than its budget"""
+
+
+class QueryBudget(contextlib.ContextDecorator):
+    """
+    Count and time the SQL statements run on a connection, as a context
+    manager or a decorator. Going over `max_queries` raises
+    `QueryBudgetExceeded` when `settings.QUERY_BUDGETS_ENFORCED` is set, as
+    in the tests, and logs a warning otherwise.
+
+    Budgets are fixed numbers: an operation whose query count grows with
+    the number of companies it is given will eventually exceed its budget.
+    """
+
+    def __init__(
+        self, max_queries: int | None = None, name: str = "", using: str = "default"
+    ) -> None:
+        self.max_queries = max_queries
+        self.name = name
+        self.using = using
+        self.queries = 0
+        self.seconds = 0.0
+        self.statements: list[str] = []
+        self._wrapper: contextlib.AbstractContextManager | None = None
+
+    def __call__(self, function):
+        if not self.name:
+            self.name = function.__qualname__
+        return super().__call__(function)
+
+    def _recreate_cm(self) -> "QueryBudget":
+        # a fresh count for each call of a decorated function
+        return QueryBudget(self.max_queries, self.name, self.using)
+
+    def _record(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.queries += 1
+            self.statements.append(sql)
+
+    def __enter__(self) -> "QueryBudget":
+        self._wrapper = connections[self.using].execute_wrapper(self._record)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> bool:
+        self._wrapper.__exit__(exc_type, exc_value, traceback)
+        self._wrapper = None
+        if exc_type is not None or self.max_queries is None:
+            return False
+        if self.queries > self.max_queries:
+            message = (
+                f"{self.name or 'Block'} ran {self.queries} queries "
+                f"in {self.seconds:.3f}s, over its budget of {self.max_queries}"
+            )
+            if getattr(settings, "QUERY_BUDGETS_ENFORCED", False):
+                raise QueryBudgetExceeded(
+                    "\n".join([message, *(f"  {sql}" for sql in self.statements)])
+                )
+            logger.warning(message)
+        return False